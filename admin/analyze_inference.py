@@ -0,0 +1,433 @@
+"""Summarize AI Gateway inference-table exports offline.
+
+``configure_gateway`` logs every request to ``main.claude_gateway_logs``. Export that
+table as Parquet or JSON Lines and this reports, per user, per endpoint and per hour:
+latency percentiles, input/output tokens and output tokens per second, the share of
+429s and errors, and request/response payload sizes.
+
+Files are streamed in record batches, reading only the columns it uses, so memory
+stays bounded by one batch however large the export. Each batch is reduced with
+Arrow compute kernels and NumPy (``bincount`` per group) rather than per-row Python.
+Percentiles come from per-group log-spaced latency histograms (buckets 5% wide), so
+they are accurate to within about 2.5% and cost the same memory for any row count.
+
+    uv run python -m admin.analyze_inference export/*.parquet [--output report.json]
+
+Needs the ``analytics`` extra (``numpy`` and ``pyarrow``).
+"""
+
+import csv
+import json
+import math
+import sys
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pajson
+import pyarrow.parquet as pq
+
+DEFAULT_BATCH_ROWS = 8192
+JSON_BLOCK_BYTES = 16 << 20
+UNKNOWN = "unknown"
+
+# The first column of each list that is present is used
+TIME_COLUMNS = ("request_time", "timestamp_ms")
+USER_COLUMNS = ("requester",)
+ENDPOINT_COLUMNS = ("endpoint_name", "served_entity_id")
+LATENCY_COLUMNS = ("execution_duration_ms", "execution_time_ms")
+STATUS_COLUMNS = ("status_code",)
+REQUEST_COLUMNS = ("request",)
+RESPONSE_COLUMNS = ("response",)
+
+# Types for JSON Lines, where nothing else says what a column holds
+JSON_SCHEMA = pa.schema(
+    [
+        ("request_time", pa.timestamp("ms")),
+        ("timestamp_ms", pa.int64()),
+        ("requester", pa.string()),
+        ("endpoint_name", pa.string()),
+        ("served_entity_id", pa.string()),
+        ("execution_duration_ms", pa.float64()),
+        ("execution_time_ms", pa.float64()),
+        ("status_code", pa.int64()),
+        ("request", pa.string()),
+        ("response", pa.string()),
+    ]
+)
+
+# Anthropic ``usage`` (and OpenAI-style chat usage). A streamed response repeats
+# ``output_tokens`` as it goes, so the last one is the total.
+INPUT_TOKENS_PATTERN = r'"(?:input|prompt)_tokens"\s*:\s*(?P<n>\d+)'
+OUTPUT_TOKENS_PATTERN = r'(?s).*"(?:output|completion)_tokens"\s*:\s*(?P<n>\d+)'
+
+LATENCY_BUCKET_GROWTH = 1.05
+LATENCY_BUCKETS = 320  # 1 ms up to ~1.5 hours; slower requests land in the last bucket
+PERCENTILES = (0.5, 0.9, 0.99)
+
+SUM_FIELDS = (
+    "requests",
+    "ok",
+    "throttled",
+    "errors",
+    "latency_ms",
+    "input_tokens",
+    "output_tokens",
+    "request_bytes",
+    "response_bytes",
+)
+MAX_FIELDS = ("latency_ms", "request_bytes", "response_bytes")
+DIMENSIONS = ("user", "endpoint", "hour")
+
+CSV_FIELDS = (
+    "dimension",
+    "key",
+    "requests",
+    "ok",
+    "throttled",
+    "errors",
+    "rate_429",
+    "error_rate",
+    "p50_ms",
+    "p90_ms",
+    "p99_ms",
+    "mean_ms",
+    "max_ms",
+    "input_tokens",
+    "output_tokens",
+    "output_tokens_per_second",
+    "mean_request_bytes",
+    "max_request_bytes",
+    "mean_response_bytes",
+    "max_response_bytes",
+)
+
+
+class _Groups:
+    """Running sums, maxima and latency histograms for the keys of one dimension."""
+
+    def __init__(self):
+        self.keys: list = []
+        self._index: dict = {}
+        self.sums = np.zeros((0, len(SUM_FIELDS)))
+        self.maxes = np.zeros((0, len(MAX_FIELDS)))
+        self.hist = np.zeros((0, LATENCY_BUCKETS), dtype=np.int64)
+
+    def ids(self, values: list, codes: np.ndarray) -> np.ndarray:
+        """Map per-batch codes into ``values`` to group ids, adding any new keys."""
+        for value in values:
+            if value not in self._index:
+                self._index[value] = len(self.keys)
+                self.keys.append(value)
+        grow = len(self.keys) - len(self.sums)
+        if grow:
+            self.sums = np.vstack([self.sums, np.zeros((grow, len(SUM_FIELDS)))])
+            self.maxes = np.vstack([self.maxes, np.zeros((grow, len(MAX_FIELDS)))])
+            self.hist = np.vstack(
+                [self.hist, np.zeros((grow, LATENCY_BUCKETS), dtype=np.int64)]
+            )
+        mapping = np.fromiter((self._index[v] for v in values), np.int64, len(values))
+        return mapping[codes]
+
+    def add(self, ids: np.ndarray, columns: dict[str, np.ndarray]) -> None:
+        n = len(self.keys)
+        for i, field in enumerate(SUM_FIELDS):
+            self.sums[:, i] += np.bincount(ids, weights=columns[field], minlength=n)
+        for i, field in enumerate(MAX_FIELDS):
+            np.maximum.at(self.maxes[:, i], ids, columns[field])
+        timed = columns["timed"]
+        flat = ids[timed] * LATENCY_BUCKETS + columns["bucket"][timed]
+        self.hist += np.bincount(flat, minlength=n * LATENCY_BUCKETS).reshape(
+            n, LATENCY_BUCKETS
+        )
+
+
+def _first(batch: pa.RecordBatch, names: tuple[str, ...]) -> pa.Array | None:
+    """The first of ``names`` that the batch has and that is not entirely null."""
+    for name in names:
+        index = batch.schema.get_field_index(name)
+        if index >= 0 and batch.column(index).null_count < len(batch):
+            return batch.column(index)
+    return None
+
+
+def _numbers(array: pa.Array | None, rows: int, fill: float = 0.0) -> np.ndarray:
+    if array is None:
+        return np.full(rows, fill)
+    return pc.fill_null(array.cast(pa.float64()), fill).to_numpy(zero_copy_only=False)
+
+
+def _byte_lengths(array: pa.Array | None, rows: int) -> np.ndarray:
+    if array is None:
+        return np.zeros(rows)
+    return _numbers(pc.binary_length(array.cast(pa.string())), rows)
+
+
+def _tokens(array: pa.Array | None, pattern: str, rows: int) -> np.ndarray:
+    if array is None:
+        return np.zeros(rows)
+    matches = pc.extract_regex(array.cast(pa.string()), pattern)
+    return _numbers(pc.struct_field(matches, "n"), rows)
+
+
+def _hours(array: pa.Array | None, rows: int) -> tuple[list, np.ndarray]:
+    """Hour keys (epoch hours, ``-1`` when unknown) and each row's index into them."""
+    if array is None:
+        return [-1], np.zeros(rows, dtype=np.int64)
+    if pa.types.is_timestamp(array.type):
+        array = array.cast(pa.timestamp("ms", array.type.tz), safe=False).cast(pa.int64())
+    millis = pc.fill_null(array.cast(pa.int64()), -3_600_000).to_numpy(zero_copy_only=False)
+    values, codes = np.unique(millis // 3_600_000, return_inverse=True)
+    return values.tolist(), codes
+
+
+def _labels(array: pa.Array | None, rows: int) -> tuple[list, np.ndarray]:
+    """Distinct string keys and each row's index into them."""
+    if array is None:
+        return [UNKNOWN], np.zeros(rows, dtype=np.int64)
+    if not pa.types.is_dictionary(array.type):
+        array = pc.dictionary_encode(pc.fill_null(array.cast(pa.string()), UNKNOWN))
+    values = [UNKNOWN if v is None else v for v in array.dictionary.to_pylist()]
+    codes = pc.fill_null(array.indices, 0).to_numpy(zero_copy_only=False).astype(np.int64)
+    if array.null_count:
+        values.append(UNKNOWN)
+        codes[pc.is_null(array).to_numpy(zero_copy_only=False)] = len(values) - 1
+    return values, codes
+
+
+def batch_columns(batch: pa.RecordBatch) -> tuple[dict[str, tuple[list, np.ndarray]], dict]:
+    """Group keys per dimension and the per-row numbers that are summed for them."""
+    rows = len(batch)
+    status = _numbers(_first(batch, STATUS_COLUMNS), rows)
+    latency = _numbers(_first(batch, LATENCY_COLUMNS), rows, fill=np.nan)
+    ok = (status >= 200) & (status < 300)
+    throttled = status == 429
+    timed = ok & ~np.isnan(latency)
+    ok_latency = np.where(timed, latency, 0.0)
+    bucket = np.log(np.maximum(ok_latency, 1.0)) / math.log(LATENCY_BUCKET_GROWTH)
+    request_bytes = _byte_lengths(_first(batch, REQUEST_COLUMNS), rows)
+    response = _first(batch, RESPONSE_COLUMNS)
+    columns = {
+        "requests": np.ones(rows),
+        "ok": ok.astype(np.float64),
+        "throttled": throttled.astype(np.float64),
+        "errors": (~ok & ~throttled).astype(np.float64),
+        "latency_ms": ok_latency,
+        "input_tokens": np.where(ok, _tokens(response, INPUT_TOKENS_PATTERN, rows), 0.0),
+        "output_tokens": np.where(timed, _tokens(response, OUTPUT_TOKENS_PATTERN, rows), 0.0),
+        "request_bytes": request_bytes,
+        "response_bytes": _byte_lengths(response, rows),
+        "timed": timed,
+        "bucket": np.minimum(bucket.astype(np.int64), LATENCY_BUCKETS - 1),
+    }
+    keys = {
+        "user": _labels(_first(batch, USER_COLUMNS), rows),
+        "endpoint": _labels(_first(batch, ENDPOINT_COLUMNS), rows),
+        "hour": _hours(_first(batch, TIME_COLUMNS), rows),
+    }
+    return keys, columns
+
+
+def read_batches(path: Path, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """Stream a Parquet or JSON Lines export, reading only the columns analyzed."""
+    if path.suffix == ".parquet":
+        parquet = pq.ParquetFile(path)
+        present = set(parquet.schema_arrow.names)
+        yield from parquet.iter_batches(
+            batch_size=batch_rows, columns=[n for n in JSON_SCHEMA.names if n in present]
+        )
+        return
+    yield from pajson.open_json(
+        path,
+        read_options=pajson.ReadOptions(block_size=JSON_BLOCK_BYTES),
+        parse_options=pajson.ParseOptions(
+            explicit_schema=JSON_SCHEMA, unexpected_field_behavior="ignore"
+        ),
+    )
+
+
+def export_files(paths: list[str]) -> list[Path]:
+    """Files to read: each path itself, or the exports under a directory."""
+    files: list[Path] = []
+    for name in paths:
+        path = Path(name)
+        if path.is_dir():
+            files.extend(
+                sorted(p for p in path.rglob("*") if p.suffix in (".parquet", ".json", ".jsonl"))
+            )
+        elif path.exists():
+            files.append(path)
+        else:
+            raise RuntimeError(f"No such export: {name}")
+    return files
+
+
+def _percentiles(hist: np.ndarray) -> np.ndarray:
+    """Nearest-rank percentiles for every row of histograms at once (NaN when empty)."""
+    cumulative = hist.cumsum(axis=1)
+    total = cumulative[:, -1]
+    result = np.full((len(hist), len(PERCENTILES)), np.nan)
+    for i, q in enumerate(PERCENTILES):
+        rank = np.ceil(q * total)
+        bucket = (cumulative < rank[:, None]).sum(axis=1)
+        result[:, i] = np.where(total > 0, LATENCY_BUCKET_GROWTH ** (bucket + 0.5), np.nan)
+    return result
+
+
+def _ms(value: float) -> float | None:
+    return None if math.isnan(value) else round(float(value), 1)
+
+
+def _ratio(numerator: float, denominator: float, digits: int = 4) -> float | None:
+    return round(numerator / denominator, digits) if denominator else None
+
+
+def _hour_key(hour: int) -> str:
+    if hour < 0:
+        return UNKNOWN
+    return datetime.fromtimestamp(hour * 3600, UTC).strftime("%Y-%m-%dT%H:00Z")
+
+
+def _rows(groups: _Groups, dimension: str) -> list[dict]:
+    percentiles = _percentiles(groups.hist)
+    rows = []
+    for i, key in enumerate(groups.keys):
+        s = dict(zip(SUM_FIELDS, groups.sums[i].tolist()))
+        m = dict(zip(MAX_FIELDS, groups.maxes[i].tolist()))
+        timed = int(groups.hist[i].sum())
+        rows.append(
+            {
+                "key": _hour_key(key) if dimension == "hour" else key,
+                "requests": int(s["requests"]),
+                "ok": int(s["ok"]),
+                "throttled": int(s["throttled"]),
+                "errors": int(s["errors"]),
+                "rate_429": _ratio(s["throttled"], s["requests"]),
+                "error_rate": _ratio(s["errors"], s["requests"]),
+                "latency": {
+                    **{
+                        f"p{round(q * 100)}_ms": _ms(v)
+                        for q, v in zip(PERCENTILES, percentiles[i])
+                    },
+                    "mean_ms": _ms(s["latency_ms"] / timed) if timed else None,
+                    "max_ms": _ms(m["latency_ms"]) if timed else None,
+                },
+                "input_tokens": int(s["input_tokens"]),
+                "output_tokens": int(s["output_tokens"]),
+                "output_tokens_per_second": _ratio(
+                    s["output_tokens"] * 1000, s["latency_ms"], digits=1
+                ),
+                "request_bytes": {
+                    "mean": _ratio(s["request_bytes"], s["requests"], digits=1),
+                    "max": int(m["request_bytes"]),
+                },
+                "response_bytes": {
+                    "mean": _ratio(s["response_bytes"], s["requests"], digits=1),
+                    "max": int(m["response_bytes"]),
+                },
+            }
+        )
+    if dimension == "hour":
+        return sorted(rows, key=lambda r: r["key"])
+    return sorted(rows, key=lambda r: (-r["requests"], r["key"]))
+
+
+def analyze(paths: list[str | Path], batch_rows: int = DEFAULT_BATCH_ROWS) -> dict:
+    """Read every export in turn and return overall, per-user/endpoint/hour rows."""
+    overall = _Groups()
+    groups = {dimension: _Groups() for dimension in DIMENSIONS}
+    rows = 0
+    for path in paths:
+        for batch in read_batches(Path(path), batch_rows):
+            if not len(batch):
+                continue
+            keys, columns = batch_columns(batch)
+            rows += len(batch)
+            overall.add(overall.ids(["all"], np.zeros(len(batch), dtype=np.int64)), columns)
+            for dimension in DIMENSIONS:
+                groups[dimension].add(groups[dimension].ids(*keys[dimension]), columns)
+    [total] = _rows(overall, "overall") or [None]
+    return {
+        "files": [str(p) for p in paths],
+        "rows": rows,
+        "overall": total,
+        **{f"by_{dimension}": _rows(groups[dimension], dimension) for dimension in DIMENSIONS},
+    }
+
+
+def csv_rows(report: dict) -> list[dict]:
+    """One flat row per group, the overall row first."""
+    rows = []
+    sections = [("overall", [report["overall"]] if report["overall"] else [])]
+    sections += [(dimension, report[f"by_{dimension}"]) for dimension in DIMENSIONS]
+    for dimension, groups in sections:
+        for group in groups:
+            rows.append(
+                {
+                    "dimension": dimension,
+                    **{k: v for k, v in group.items() if not isinstance(v, dict)},
+                    **group["latency"],
+                    "mean_request_bytes": group["request_bytes"]["mean"],
+                    "max_request_bytes": group["request_bytes"]["max"],
+                    "mean_response_bytes": group["response_bytes"]["mean"],
+                    "max_response_bytes": group["response_bytes"]["max"],
+                }
+            )
+    return rows
+
+
+def write_csv(path: str, report: dict) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(csv_rows(report))
+
+
+def _print_table(title: str, groups: list[dict]) -> None:
+    print(f"\n{title}")
+    print(f"  {'key':<40} {'requests':>9} {'429 %':>6} {'p50 ms':>8} {'p99 ms':>8} {'tok/s':>7}")
+    for g in groups:
+        rate = f"{g['rate_429'] * 100:.1f}" if g["rate_429"] is not None else "-"
+        p50, p99 = g["latency"]["p50_ms"], g["latency"]["p99_ms"]
+        tps = g["output_tokens_per_second"]
+        print(
+            f"  {str(g['key'])[:40]:<40} {g['requests']:>9} {rate:>6} "
+            f"{p50 if p50 is not None else '-':>8} {p99 if p99 is not None else '-':>8} "
+            f"{tps if tps is not None else '-':>7}"
+        )
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze AI Gateway inference-table exports")
+    parser.add_argument("paths", nargs="+", help="Parquet/JSONL files, or directories of them")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument("--top", type=int, default=10, help="Users and endpoints to print")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    parser.add_argument("--csv", help="Write one row per user, endpoint and hour as CSV")
+    args = parser.parse_args()
+
+    try:
+        files = export_files(args.paths)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    report = analyze(files, args.batch_rows)
+
+    print(f"{report['rows']} requests in {len(files)} file(s)")
+    if report["overall"]:
+        _print_table("overall", [report["overall"]])
+        _print_table(f"top {args.top} users", report["by_user"][: args.top])
+        _print_table(f"top {args.top} endpoints", report["by_endpoint"][: args.top])
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.csv:
+        write_csv(args.csv, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,18 @@
 """Configure AI Gateway settings (rate limits, guardrails, usage tracking)."""
 
 import json
+import sys
+from dataclasses import asdict
 
-import requests
+from admin.setup_endpoint import DEFAULT_PROFILE, get_dogfood_config
+from config.settings import DEFAULT_RATE_LIMITS, RateLimit
+from credential_helper import http_client
 
-from admin.setup_endpoint import get_dogfood_config
 
-
-def configure_gateway(host: str, token: str, endpoint_name: str) -> dict:
-    """Configure AI Gateway on an existing serving endpoint."""
-    payload = {
-        "rate_limits": [
-            {"key": "endpoint", "renewal_period": "minute", "calls": 100},
-            {"key": "user", "renewal_period": "minute", "calls": 20},
-        ],
+def gateway_config(rate_limits: list[RateLimit] | None = None) -> dict:
+    """The AI Gateway settings; ``rate_limits`` defaults to the client-side limiter's."""
+    return {
+        "rate_limits": [asdict(limit) for limit in rate_limits or DEFAULT_RATE_LIMITS],
         "usage_tracking_config": {"enabled": True},
         "inference_table_config": {
             "catalog_name": "main",
@@ -26,10 +25,18 @@ def configure_gateway(host: str, token: str, endpoint_name: str) -> dict:
         },
     }
 
-    response = requests.put(
+
+def configure_gateway(
+    host: str, token: str, endpoint_name: str, rate_limits: list[RateLimit] | None = None
+) -> dict:
+    """Configure AI Gateway on an existing serving endpoint.
+
+    ``rate_limits`` defaults to the same limits the client-side limiter applies.
+    """
+    response = http_client.put(
         f"{host}/api/2.0/serving-endpoints/{endpoint_name}/ai-gateway",
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-        json=payload,
+        json=gateway_config(rate_limits),
     )
 
     if response.status_code != 200:
@@ -41,12 +48,25 @@ def configure_gateway(host: str, token: str, endpoint_name: str) -> dict:
 
 
 def main() -> None:
+    from admin.wait_ready import ReadinessTarget, report, wait_for_ready
     from config.settings import load_config
 
     config = load_config()
-    host, token = get_dogfood_config()
-    result = configure_gateway(host, token, config.endpoint_name)
-    print(json.dumps(result, indent=2))
+    if not config.endpoints:
+        host, token = get_dogfood_config()
+        targets = [ReadinessTarget(host, config.endpoint_name, token)]
+    else:
+        targets = [
+            ReadinessTarget(e.host, e.name, get_dogfood_config(e.profile or DEFAULT_PROFILE)[1])
+            for e in config.serving_endpoints
+        ]
+
+    # AI Gateway updates are refused while an endpoint is still provisioning
+    if not report(wait_for_ready(targets)):
+        sys.exit(1)
+    for target in targets:
+        result = configure_gateway(target.host, target.token, target.name, config.rate_limits)
+        print(json.dumps(result, indent=2))
 
 
 if __name__ == "__main__":
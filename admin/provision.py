@@ -0,0 +1,407 @@
+"""Declarative, concurrent provisioning of serving endpoints, AI Gateway and federation.
+
+A spec lists workspaces with their endpoints, and the account federation policies.
+``plan`` GETs the current state of every resource on a thread pool and diffs it
+against the spec; ``apply`` sends only the differences, in parallel with bounded
+concurrency (changes to the same resource are applied in order). Re-running against
+an up-to-date deployment only makes the GETs.
+
+    uv run python -m admin.provision --spec provision.json [--dry-run] [--max-workers 8]
+
+Without ``--spec`` the spec is derived from config.json (its ``endpoints``, or
+``databricks_host``/``endpoint_name``), plus the federation policy when
+``--account-id`` is given.
+"""
+
+import json
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+
+from admin.configure_gateway import gateway_config
+from admin.setup_endpoint import DEFAULT_PROFILE, endpoint_config, get_dogfood_config
+from admin.setup_federation import POLICY_NAME, federation_policy
+from config.settings import DEFAULT_RATE_LIMITS, GatewayConfig, RateLimit
+from credential_helper import http_client
+
+DEFAULT_MAX_WORKERS = 8
+# Write-only settings the API returns redacted; they are sent on create/update but
+# never compared, or every run would see a difference
+SECRET_KEYS = frozenset({"anthropic_api_key"})
+
+
+@dataclass
+class EndpointSpec:
+    name: str
+    model: str
+    rate_limits: list[RateLimit] = field(default_factory=lambda: list(DEFAULT_RATE_LIMITS))
+
+
+@dataclass
+class WorkspaceSpec:
+    """A workspace; ``host`` defaults to the host of its ~/.databrickscfg ``profile``."""
+
+    profile: str
+    endpoints: list[EndpointSpec]
+    host: str | None = None
+
+
+@dataclass
+class FederationSpec:
+    """The Azure AD federation policy of one Databricks account."""
+
+    account_id: str
+    tenant_id: str
+    client_id: str
+    profile: str = DEFAULT_PROFILE
+    host: str | None = None
+
+
+@dataclass
+class ProvisionSpec:
+    workspaces: list[WorkspaceSpec] = field(default_factory=list)
+    federation_policies: list[FederationSpec] = field(default_factory=list)
+
+    @property
+    def profiles(self) -> set[str]:
+        return {w.profile for w in self.workspaces} | {
+            f.profile for f in self.federation_policies
+        }
+
+
+@dataclass
+class Change:
+    """One write needed to bring ``resource`` in line with the spec."""
+
+    resource: str
+    action: str  # "create" or "update"
+    method: str
+    url: str
+    payload: dict
+    profile: str
+    fields: list[str] = field(default_factory=list)
+    # (host, name) of the serving endpoint this change (re)deploys, if any
+    deploys: tuple[str, str] | None = None
+
+    def describe(self) -> str:
+        symbol = "+" if self.action == "create" else "~"
+        changed = f" ({', '.join(self.fields)})" if self.fields else ""
+        return f"{symbol} {self.action} {self.resource}{changed}"
+
+
+@dataclass
+class Plan:
+    changes: list[Change] = field(default_factory=list)
+    # resource -> error, for resources whose current state could not be read
+    errors: dict[str, str] = field(default_factory=dict)
+
+
+def _rate_limits(raw: list[dict] | None, default: list[RateLimit]) -> list[RateLimit]:
+    if not raw:
+        return list(default)
+    return [
+        RateLimit(
+            key=limit["key"],
+            calls=limit["calls"],
+            renewal_period=limit.get("renewal_period", "minute"),
+        )
+        for limit in raw
+    ]
+
+
+def load_spec(path: str) -> ProvisionSpec:
+    """Load a provisioning spec; endpoint ``model``/``rate_limits`` default to the top level."""
+    raw = json.loads(Path(path).read_text())
+    model = raw.get("model")
+    rate_limits = _rate_limits(raw.get("rate_limits"), DEFAULT_RATE_LIMITS)
+
+    workspaces = []
+    for workspace_raw in raw.get("workspaces", []):
+        endpoints = []
+        for endpoint_raw in workspace_raw.get("endpoints", []):
+            if "name" not in endpoint_raw:
+                raise ValueError("Missing required endpoints field: name")
+            endpoint_model = endpoint_raw.get("model", model)
+            if endpoint_model is None:
+                raise ValueError(f"No model for endpoint {endpoint_raw['name']}")
+            endpoints.append(
+                EndpointSpec(
+                    name=endpoint_raw["name"],
+                    model=endpoint_model,
+                    rate_limits=_rate_limits(endpoint_raw.get("rate_limits"), rate_limits),
+                )
+            )
+        workspaces.append(
+            WorkspaceSpec(
+                profile=workspace_raw.get("profile", DEFAULT_PROFILE),
+                endpoints=endpoints,
+                host=workspace_raw.get("host"),
+            )
+        )
+
+    azure_ad = raw.get("azure_ad", {})
+    policies = []
+    for policy_raw in raw.get("federation_policies", []):
+        if "account_id" not in policy_raw:
+            raise ValueError("Missing required federation_policies field: account_id")
+        for required in ("tenant_id", "client_id"):
+            if required not in policy_raw and required not in azure_ad:
+                raise ValueError(f"Missing required federation_policies field: {required}")
+        policies.append(
+            FederationSpec(
+                account_id=policy_raw["account_id"],
+                tenant_id=policy_raw.get("tenant_id", azure_ad.get("tenant_id")),
+                client_id=policy_raw.get("client_id", azure_ad.get("client_id")),
+                profile=policy_raw.get("profile", DEFAULT_PROFILE),
+                host=policy_raw.get("host"),
+            )
+        )
+
+    return ProvisionSpec(workspaces=workspaces, federation_policies=policies)
+
+
+def spec_from_config(config: GatewayConfig, account_id: str | None = None) -> ProvisionSpec:
+    """The spec config.json implies: each serving endpoint, grouped by workspace."""
+    workspaces: dict[tuple[str, str], WorkspaceSpec] = {}
+    for endpoint in config.serving_endpoints:
+        profile = endpoint.profile or DEFAULT_PROFILE
+        workspace = workspaces.setdefault(
+            (endpoint.host, profile),
+            WorkspaceSpec(profile=profile, endpoints=[], host=endpoint.host),
+        )
+        workspace.endpoints.append(
+            EndpointSpec(name=endpoint.name, model=config.model, rate_limits=config.rate_limits)
+        )
+    policies = []
+    if account_id:
+        policies.append(
+            FederationSpec(
+                account_id=account_id,
+                tenant_id=config.azure_ad.tenant_id,
+                client_id=config.azure_ad.client_id,
+            )
+        )
+    return ProvisionSpec(workspaces=list(workspaces.values()), federation_policies=policies)
+
+
+def diff(desired, current, path: str = "") -> list[str]:
+    """Paths at which ``current`` does not match ``desired``.
+
+    Only what ``desired`` specifies is compared: extra keys the API returns (status,
+    IDs, server defaults) are ignored, as are ``SECRET_KEYS``.
+    """
+    if isinstance(desired, dict):
+        if not isinstance(current, dict):
+            return [path or "."]
+        changed = []
+        for key, value in desired.items():
+            if key in SECRET_KEYS:
+                continue
+            changed += diff(value, current.get(key), f"{path}.{key}" if path else key)
+        return changed
+    if isinstance(desired, list):
+        if not isinstance(current, list) or len(current) != len(desired):
+            return [path or "."]
+        changed = []
+        for i, (want, have) in enumerate(zip(desired, current)):
+            changed += diff(want, have, f"{path}[{i}]")
+        return changed
+    return [] if desired == current else [path or "."]
+
+
+def _headers(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+
+def _get(url: str, token: str) -> dict | None:
+    """The resource at ``url``, or ``None`` if it does not exist."""
+    response = http_client.get(url, headers=_headers(token))
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to read {url} (HTTP {response.status_code}): {response.text}")
+    return response.json()
+
+
+def _plan_endpoint(host: str, profile: str, endpoint: EndpointSpec, token: str) -> list[Change]:
+    base = f"{host}/api/2.0/serving-endpoints"
+    config = endpoint_config(endpoint.name, endpoint.model)
+    gateway = gateway_config(endpoint.rate_limits)
+    resource = f"endpoint {host}/{endpoint.name}"
+
+    current = _get(f"{base}/{endpoint.name}", token)
+    if current is None:
+        payload = {"name": endpoint.name, "config": config, "ai_gateway": gateway}
+        deploys = (host, endpoint.name)
+        return [Change(resource, "create", "POST", base, payload, profile, deploys=deploys)]
+
+    changes = []
+    # The AI Gateway goes first: it cannot be updated while a config update rolls out
+    changed = diff(gateway, current.get("ai_gateway"), "ai_gateway")
+    if changed:
+        url = f"{base}/{endpoint.name}/ai-gateway"
+        changes.append(Change(resource, "update", "PUT", url, gateway, profile, changed))
+    # Compare against an update still rolling out, so a re-run does not repeat it
+    current_config = current.get("pending_config") or current.get("config")
+    changed = diff(config, current_config, "config")
+    if changed:
+        url = f"{base}/{endpoint.name}/config"
+        deploys = (host, endpoint.name)
+        changes.append(
+            Change(resource, "update", "PUT", url, config, profile, changed, deploys)
+        )
+    return changes
+
+
+def _plan_federation(host: str, policy: FederationSpec, token: str) -> list[Change]:
+    base = f"{host}/api/2.0/accounts/{policy.account_id}/federation-policies"
+    desired = federation_policy(policy.tenant_id, policy.client_id)
+    resource = f"federation policy {policy.account_id}/{POLICY_NAME}"
+
+    current = _get(f"{base}/{POLICY_NAME}", token)
+    if current is None:
+        # An explicit ID, so the policy is found at {base}/{POLICY_NAME} on the next run
+        url = f"{base}?policy_id={POLICY_NAME}"
+        return [Change(resource, "create", "POST", url, desired, policy.profile)]
+    changed = diff(desired, current)
+    if not changed:
+        return []
+    # PATCH only replaces the top-level fields named in the mask
+    mask = ",".join(sorted({path.split(".")[0].split("[")[0] for path in changed}))
+    url = f"{base}/{POLICY_NAME}?update_mask={mask}"
+    return [Change(resource, "update", "PATCH", url, desired, policy.profile, changed)]
+
+
+def plan(
+    spec: ProvisionSpec,
+    credentials: dict[str, tuple[str, str]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Plan:
+    """Read every resource in ``spec`` concurrently and list the changes it needs.
+
+    ``credentials`` maps each profile to its ``(host, token)``.
+    """
+    reads: dict[str, Callable[[], list[Change]]] = {}
+    for workspace in spec.workspaces:
+        profile_host, token = credentials[workspace.profile]
+        host = (workspace.host or profile_host).rstrip("/")
+        for endpoint in workspace.endpoints:
+            reads[f"endpoint {host}/{endpoint.name}"] = partial(
+                _plan_endpoint, host, workspace.profile, endpoint, token
+            )
+    for policy in spec.federation_policies:
+        profile_host, token = credentials[policy.profile]
+        host = (policy.host or profile_host).rstrip("/")
+        reads[f"federation policy {policy.account_id}/{POLICY_NAME}"] = partial(
+            _plan_federation, host, policy, token
+        )
+
+    result = Plan()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {resource: pool.submit(read) for resource, read in reads.items()}
+        for resource, future in futures.items():
+            try:
+                result.changes += future.result()
+            except Exception as e:
+                result.errors[resource] = str(e)
+    return result
+
+
+def _send(change: Change, token: str) -> None:
+    response = http_client.request(
+        change.method, change.url, headers=_headers(token), json=change.payload
+    )
+    if response.status_code not in (200, 201):
+        raise RuntimeError(
+            f"Failed to {change.action} {change.resource} "
+            f"(HTTP {response.status_code}): {response.text}"
+        )
+
+
+def apply(
+    changes: list[Change],
+    credentials: dict[str, tuple[str, str]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict[str, str]:
+    """Send ``changes`` concurrently; return ``{resource: error}`` for those that failed.
+
+    Changes to the same endpoint run one after another (Databricks rejects an update
+    while another is in progress); a failure skips the rest of that endpoint's changes.
+    """
+    groups: dict[str, list[Change]] = {}
+    for change in changes:
+        groups.setdefault(change.resource, []).append(change)
+
+    def run(group: list[Change]) -> None:
+        for change in group:
+            _send(change, credentials[change.profile][1])
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {resource: pool.submit(run, group) for resource, group in groups.items()}
+        for resource, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                errors[resource] = str(e)
+    return errors
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Provision gateway endpoints from a spec")
+    parser.add_argument("--spec", help="Provisioning spec (JSON); defaults to config.json")
+    parser.add_argument("--config", help="Path to config.json (without --spec)")
+    parser.add_argument("--account-id", help="Also manage this account's federation policy")
+    parser.add_argument("--dry-run", action="store_true", help="Show the changes; apply nothing")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument(
+        "--wait", action="store_true", help="Wait for created/updated endpoints to be READY"
+    )
+    args = parser.parse_args()
+
+    if args.spec:
+        spec = load_spec(args.spec)
+    else:
+        from config.settings import load_config
+
+        spec = spec_from_config(load_config(args.config), args.account_id)
+    credentials = {profile: get_dogfood_config(profile) for profile in sorted(spec.profiles)}
+
+    result = plan(spec, credentials, args.max_workers)
+    for resource, error in result.errors.items():
+        print(f"! {resource}: {error}", file=sys.stderr)
+    for change in result.changes:
+        print(change.describe())
+    if not result.changes:
+        print("No changes.")
+    if args.dry_run or not result.changes:
+        sys.exit(1 if result.errors else 0)
+
+    applied_at = time.monotonic()
+    errors = apply(result.changes, credentials, args.max_workers)
+    for resource, error in errors.items():
+        print(f"! {resource}: {error}", file=sys.stderr)
+    resources = len({change.resource for change in result.changes})
+    print(f"Applied changes to {resources - len(errors)} of {resources} resource(s).")
+
+    ready = True
+    if args.wait:
+        from admin.wait_ready import ReadinessTarget, report, wait_for_ready
+
+        targets = [
+            ReadinessTarget(*change.deploys, credentials[change.profile][1], since=applied_at)
+            for change in result.changes
+            if change.deploys and change.resource not in errors
+        ]
+        ready = report(wait_for_ready(targets))
+    sys.exit(0 if ready and not result.errors and not errors else 1)
+
+
+if __name__ == "__main__":
+    main()
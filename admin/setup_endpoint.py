@@ -4,43 +4,48 @@ import configparser
 import json
 from pathlib import Path
 
-import requests
+from credential_helper import http_client
 
 
-def get_dogfood_config() -> tuple[str, str]:
-    """Read host and token from ~/.databrickscfg [dogfood] profile."""
+DEFAULT_PROFILE = "dogfood"
+
+
+def get_dogfood_config(profile_name: str = DEFAULT_PROFILE) -> tuple[str, str]:
+    """Read host and token from a ~/.databrickscfg profile ([dogfood] by default)."""
     cfg = configparser.ConfigParser()
     cfg.read(Path.home() / ".databrickscfg")
-    if "dogfood" not in cfg:
-        raise RuntimeError("No [dogfood] profile in ~/.databrickscfg")
-    profile = cfg["dogfood"]
+    if profile_name not in cfg:
+        raise RuntimeError(f"No [{profile_name}] profile in ~/.databrickscfg")
+    profile = cfg[profile_name]
     host = profile["host"].rstrip("/")
     token = profile["token"]
     return host, token
 
 
-def create_endpoint(host: str, token: str, endpoint_name: str, model: str) -> dict:
-    """Create an external model serving endpoint."""
-    payload = {
-        "name": endpoint_name,
-        "config": {
-            "served_entities": [
-                {
-                    "name": f"{endpoint_name}-entity",
-                    "external_model": {
-                        "name": model,
-                        "provider": "anthropic",
-                        "task": "llm/v1/chat",
-                        "anthropic_config": {
-                            "anthropic_api_key": "{{secrets/claude-gateway/anthropic-api-key}}",
-                        },
+def endpoint_config(endpoint_name: str, model: str) -> dict:
+    """The serving endpoint ``config`` for an Anthropic external model."""
+    return {
+        "served_entities": [
+            {
+                "name": f"{endpoint_name}-entity",
+                "external_model": {
+                    "name": model,
+                    "provider": "anthropic",
+                    "task": "llm/v1/chat",
+                    "anthropic_config": {
+                        "anthropic_api_key": "{{secrets/claude-gateway/anthropic-api-key}}",
                     },
-                }
-            ]
-        },
+                },
+            }
+        ]
     }
 
-    response = requests.post(
+
+def create_endpoint(host: str, token: str, endpoint_name: str, model: str) -> dict:
+    """Create an external model serving endpoint."""
+    payload = {"name": endpoint_name, "config": endpoint_config(endpoint_name, model)}
+
+    response = http_client.post(
         f"{host}/api/2.0/serving-endpoints",
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
         json=payload,
@@ -58,9 +63,17 @@ def main() -> None:
     from config.settings import load_config
 
     config = load_config()
-    host, token = get_dogfood_config()
-    result = create_endpoint(host, token, config.endpoint_name, config.model)
-    print(json.dumps(result, indent=2))
+    if not config.endpoints:
+        host, token = get_dogfood_config()
+        result = create_endpoint(host, token, config.endpoint_name, config.model)
+        print(json.dumps(result, indent=2))
+        return
+
+    # Provision every configured endpoint, each with its workspace's admin profile
+    for endpoint in config.serving_endpoints:
+        _, token = get_dogfood_config(endpoint.profile or DEFAULT_PROFILE)
+        result = create_endpoint(endpoint.host, token, endpoint.name, config.model)
+        print(json.dumps(result, indent=2))
 
 
 if __name__ == "__main__":
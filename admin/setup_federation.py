@@ -2,17 +2,19 @@
 
 import json
 
-import requests
-
 from admin.setup_endpoint import get_dogfood_config
+from credential_helper import http_client
 
+POLICY_NAME = "azure-ad-claude-gateway"
 
-def create_federation_policy(
-    host: str, token: str, account_id: str, tenant_id: str, client_id: str
-) -> dict:
-    """Create a federation policy trusting Azure AD."""
-    payload = {
-        "name": "azure-ad-claude-gateway",
+
+def federation_policy(tenant_id: str, client_id: str) -> dict:
+    """A federation policy accepting the Azure AD app's ID tokens.
+
+    The policy's ID is not part of the body: it is passed as ``?policy_id=`` on
+    create, and the ``name`` the API returns is the full resource path.
+    """
+    return {
         "oidc_policy": {
             "issuer": f"https://login.microsoftonline.com/{tenant_id}/v2.0",
             "audiences": [client_id],
@@ -20,8 +22,16 @@ def create_federation_policy(
         },
     }
 
-    response = requests.post(
+
+def create_federation_policy(
+    host: str, token: str, account_id: str, tenant_id: str, client_id: str
+) -> dict:
+    """Create a federation policy trusting Azure AD."""
+    payload = federation_policy(tenant_id, client_id)
+
+    response = http_client.post(
         f"{host}/api/2.0/accounts/{account_id}/federation-policies",
+        params={"policy_id": POLICY_NAME},
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
         json=payload,
     )
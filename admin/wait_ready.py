@@ -0,0 +1,209 @@
+"""Wait for serving endpoints to become READY.
+
+A new or updated endpoint takes minutes to provision, and its AI Gateway settings
+cannot be changed until it has. ``wait_for_ready`` polls every endpoint's state
+concurrently on a single asyncio event loop, over keep-alive connections shared per
+host. Each endpoint backs off exponentially (with jitter) until a shared deadline,
+and its time to ready is reported so provisioning latency can be tracked.
+
+    uv run python -m admin.wait_ready [--config PATH] [--timeout 1200]
+"""
+
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from credential_helper.http1 import ConnectionPool, UpstreamError, encode_head, read_body
+
+DEFAULT_TIMEOUT_SECONDS = 1200.0
+INITIAL_INTERVAL_SECONDS = 2.0
+MAX_INTERVAL_SECONDS = 30.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+FAILED_UPDATES = frozenset({"UPDATE_FAILED", "UPDATE_CANCELED"})
+
+
+@dataclass
+class ReadinessTarget:
+    """An endpoint to watch. ``since`` (``time.monotonic()``) is when its change was sent."""
+
+    host: str
+    name: str
+    token: str
+    since: float | None = None
+
+
+@dataclass
+class Readiness:
+    host: str
+    name: str
+    status: str  # "ready", "failed" or "timeout"
+    seconds: float
+    polls: int
+    detail: str = ""
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+
+def endpoint_status(data: dict) -> str:
+    """``"ready"``, ``"failed"`` or ``"pending"`` for a serving endpoint GET response."""
+    state = data.get("state", {})
+    config_update = state.get("config_update", "NOT_UPDATING")
+    if config_update in FAILED_UPDATES:
+        return "failed"
+    if state.get("ready") == "READY" and config_update == "NOT_UPDATING":
+        return "ready"
+    return "pending"
+
+
+class _Client:
+    """Just enough async HTTP/1.1 for JSON GETs, with a keep-alive pool per host."""
+
+    def __init__(self):
+        self._pools: dict[str, ConnectionPool] = {}
+
+    async def get_json(self, url: str, token: str) -> tuple[int, dict]:
+        parts = urlsplit(url)
+        if parts.netloc not in self._pools:
+            self._pools[parts.netloc] = ConnectionPool.for_url(url)
+        pool = self._pools[parts.netloc]
+        response = await pool.send(
+            encode_head(
+                f"GET {parts.path} HTTP/1.1",
+                [
+                    ("Host", parts.netloc),
+                    ("Authorization", f"Bearer {token}"),
+                    ("Accept", "application/json"),
+                    ("Connection", "keep-alive"),
+                ],
+            )
+        )
+        try:
+            body = await read_body(response.reader, response.headers)
+        except BaseException:
+            response.writer.close()
+            raise
+        pool.release(response.reader, response.writer)
+        return response.code, json.loads(body or b"{}")
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
+
+
+async def _wait(
+    client: _Client,
+    target: ReadinessTarget,
+    deadline: float,
+    initial_interval: float,
+    max_interval: float,
+) -> Readiness:
+    url = f"{target.host.rstrip('/')}/api/2.0/serving-endpoints/{target.name}"
+    since = time.monotonic() if target.since is None else target.since
+    interval = initial_interval
+    polls = 0
+    detail = ""
+
+    def result(status: str) -> Readiness:
+        return Readiness(target.host, target.name, status, time.monotonic() - since, polls, detail)
+
+    while True:
+        polls += 1
+        try:
+            code, data = await asyncio.wait_for(
+                client.get_json(url, target.token),
+                max(0.0, min(REQUEST_TIMEOUT_SECONDS, deadline - time.monotonic())),
+            )
+        except (
+            OSError,
+            UpstreamError,
+            asyncio.IncompleteReadError,
+            asyncio.TimeoutError,
+            ValueError,
+        ) as e:
+            # Network trouble is transient: keep polling until the deadline. A poll cut
+            # short by the deadline keeps the last state seen as the detail.
+            if not detail or deadline > time.monotonic():
+                detail = f"{type(e).__name__}: {e}"
+        else:
+            if code == 200:
+                detail = json.dumps(data.get("state", {}))
+                status = endpoint_status(data)
+                if status != "pending":
+                    return result(status)
+            elif code == 429 or code >= 500:
+                detail = f"HTTP {code}"
+            else:
+                detail = f"HTTP {code}: {json.dumps(data)}"
+                return result("failed")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return result("timeout")
+        await asyncio.sleep(min(remaining, random.uniform(interval / 2, interval)))
+        interval = min(max_interval, interval * 2)
+
+
+async def wait_all(
+    targets: list[ReadinessTarget],
+    timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    initial_interval: float = INITIAL_INTERVAL_SECONDS,
+    max_interval: float = MAX_INTERVAL_SECONDS,
+) -> list[Readiness]:
+    """Poll every target concurrently; results are in ``targets`` order."""
+    client = _Client()
+    deadline = time.monotonic() + timeout
+    try:
+        return list(
+            await asyncio.gather(
+                *(_wait(client, t, deadline, initial_interval, max_interval) for t in targets)
+            )
+        )
+    finally:
+        client.close()
+
+
+def wait_for_ready(targets: list[ReadinessTarget], **kwargs) -> list[Readiness]:
+    """Block until every target is ready, has failed, or the deadline passes."""
+    if not targets:
+        return []
+    return asyncio.run(wait_all(targets, **kwargs))
+
+
+def report(results: list[Readiness]) -> bool:
+    """Print one line per endpoint; return whether all of them are ready."""
+    for r in results:
+        line = f"{r.status:<7} {r.host}/{r.name} in {r.seconds:.1f}s ({r.polls} polls)"
+        if r.ready:
+            print(line)
+        else:
+            print(f"{line}: {r.detail}", file=sys.stderr)
+    return all(r.ready for r in results)
+
+
+def main() -> None:
+    import argparse
+
+    from admin.setup_endpoint import DEFAULT_PROFILE, get_dogfood_config
+    from config.settings import load_config
+
+    parser = argparse.ArgumentParser(description="Wait for serving endpoints to be READY")
+    parser.add_argument("--config", help="Path to config.json")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SECONDS)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    targets = [
+        ReadinessTarget(e.host, e.name, get_dogfood_config(e.profile or DEFAULT_PROFILE)[1])
+        for e in config.serving_endpoints
+    ]
+    sys.exit(0 if report(wait_for_ready(targets, timeout=args.timeout)) else 1)
+
+
+if __name__ == "__main__":
+    main()
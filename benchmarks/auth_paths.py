@@ -0,0 +1,231 @@
+"""Benchmark suite for the credential helper's cold, warm and refresh paths.
+
+Every scenario runs ``python -m credential_helper`` (or the exchange call itself)
+against the local emulator, so no tenant or network access is needed:
+
+- ``cold``: empty caches; emulated interactive login, then token exchange
+- ``warm_keyring`` / ``warm_file``: a valid Databricks token in the keyring / file
+- ``silent_refresh``: Databricks and ID tokens gone, MSAL cache warm; silent login + exchange
+- ``id_token_refresh``: Databricks token gone, ID token still fresh; exchange only
+- ``exchange``: the ``/oidc/v1/token`` round trip alone, in process
+- ``concurrent_refresh``: N helpers refreshing at once (wall time; exchange count)
+
+Results are written as JSON so runs can be compared across commits; with
+``--baseline`` the run fails if any scenario's median regresses past ``--threshold``.
+
+    uv run python -m benchmarks.auth_paths [--runs 5] [--concurrency 8] \\
+        [--output results.json] [--baseline old.json] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from emulator.server import Emulator, EmulatorSettings
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_THRESHOLD = 0.2
+# Regressions smaller than this are noise for subprocess timings
+MIN_REGRESSION_MS = 5.0
+KEYRING_BACKEND = "benchmarks.keyring_backend.FileKeyring"
+
+
+def summarize(timings_ms: list[float]) -> dict:
+    ordered = sorted(timings_ms)
+    return {
+        "runs": len(ordered),
+        "median_ms": round(statistics.median(ordered), 1),
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 1),
+        "min_ms": round(ordered[0], 1),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Return a message for every scenario whose median regressed past ``threshold``."""
+    failures = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        baseline_ms = previous["median_ms"]
+        limit = max(baseline_ms * (1 + threshold), baseline_ms + MIN_REGRESSION_MS)
+        if current["median_ms"] > limit:
+            failures.append(
+                f"{name}: median {current['median_ms']}ms > {limit:.1f}ms "
+                f"(baseline {baseline_ms}ms)"
+            )
+    return failures
+
+
+def _git_commit() -> str | None:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=PROJECT_DIR
+    )
+    return result.stdout.strip() or None
+
+
+class _Workspace:
+    """A throwaway HOME wired to the emulator, with helpers to reset its caches."""
+
+    def __init__(self, root: Path, emulator: Emulator):
+        self.home = root / "home"
+        self.cache_dir = self.home / ".databricks-claude-gateway"
+        self.cache_dir.mkdir(parents=True)
+        self.emulator = emulator
+        self.file_config = emulator.write_config(root / "file.json")
+        self.keyring_config = emulator.write_config(
+            root / "keyring.json", token_cache={"method": "keyring", "fallback": "none"}
+        )
+        self.env = {
+            **os.environ,
+            **emulator.env(),
+            "HOME": str(self.home),
+            "PYTHON_KEYRING_BACKEND": KEYRING_BACKEND,
+            "BENCH_KEYRING_FILE": str(self.home / "keyring.json"),
+        }
+
+    def clear(self, token: bool = True, id_token: bool = True, msal: bool = False) -> None:
+        if token:
+            (self.cache_dir / "token_cache.json").unlink(missing_ok=True)
+            (self.home / "keyring.json").unlink(missing_ok=True)
+        if id_token:
+            (self.cache_dir / "id_token.json").unlink(missing_ok=True)
+        if msal:
+            (self.cache_dir / "msal_cache.bin").unlink(missing_ok=True)
+
+    def popen(self, config: Path) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, "-m", "credential_helper", "--no-daemon", "--config", str(config)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=PROJECT_DIR,
+            env=self.env,
+        )
+
+    def run(self, config: Path) -> float:
+        start = time.perf_counter()
+        helper = self.popen(config)
+        _, stderr = helper.communicate()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if helper.returncode != 0:
+            raise RuntimeError(f"credential_helper failed: {stderr.decode()[-2000:]}")
+        return elapsed_ms
+
+
+def _timed(runs: int, setup: Callable[[], None], run: Callable[[], float]) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        setup()
+        timings.append(run())
+    return timings
+
+
+def bench_exchange(workspace: _Workspace, runs: int) -> list[float]:
+    """Time ``exchange_token`` alone, in process, with an emulator-issued ID token."""
+    import credential_helper.azure_ad_auth as aad
+    from config.settings import load_config
+    from credential_helper.token_exchange import exchange_token
+
+    os.environ.update(workspace.emulator.env())
+    config = load_config(str(workspace.file_config))
+    aad.CACHE_DIR = workspace.cache_dir
+    aad.CACHE_FILE = workspace.cache_dir / "msal_cache.bin"
+    jwt = aad.acquire_token(aad.create_msal_app(config.azure_ad), config.azure_ad.scopes)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        exchange_token(config.token_exchange_url, jwt)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def bench_concurrent(workspace: _Workspace, concurrency: int) -> tuple[float, int]:
+    """Start ``concurrency`` helpers with no cached token; return wall ms and exchanges made."""
+    workspace.clear()
+    before = workspace.emulator.counters.get("token_exchange", 0)
+    start = time.perf_counter()
+    helpers = [workspace.popen(workspace.file_config) for _ in range(concurrency)]
+    for helper in helpers:
+        _, stderr = helper.communicate()
+        if helper.returncode != 0:
+            raise RuntimeError(f"credential_helper failed: {stderr.decode()[-2000:]}")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return elapsed_ms, workspace.emulator.counters.get("token_exchange", 0) - before
+
+
+def run_suite(runs: int, concurrency: int, settings: EmulatorSettings) -> dict:
+    root = Path(tempfile.mkdtemp(prefix="auth-bench-"))
+    try:
+        with Emulator(root / "emulator", settings) as emulator:
+            ws = _Workspace(root, emulator)
+            scenarios = {
+                "cold": _timed(
+                    runs, lambda: ws.clear(msal=True), lambda: ws.run(ws.file_config)
+                ),
+                "silent_refresh": _timed(runs, ws.clear, lambda: ws.run(ws.file_config)),
+                "id_token_refresh": _timed(
+                    runs, lambda: ws.clear(id_token=False), lambda: ws.run(ws.file_config)
+                ),
+                "warm_file": _timed(runs, lambda: None, lambda: ws.run(ws.file_config)),
+            }
+            ws.run(ws.keyring_config)
+            scenarios["warm_keyring"] = _timed(
+                runs, lambda: None, lambda: ws.run(ws.keyring_config)
+            )
+            scenarios["exchange"] = bench_exchange(ws, runs)
+            wall_ms, exchanges = bench_concurrent(ws, concurrency)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {name: summarize(timings) for name, timings in scenarios.items()}
+    results["concurrent_refresh"] = {
+        **summarize([wall_ms]),
+        "concurrency": concurrency,
+        "token_exchanges": exchanges,
+    }
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.time(),
+        "emulator": settings.__dict__,
+        "scenarios": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Credential helper path benchmarks")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--emulator-settings", help="JSON file with EmulatorSettings overrides")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    settings = EmulatorSettings()
+    if args.emulator_settings:
+        settings = EmulatorSettings.from_dict(json.loads(Path(args.emulator_settings).read_text()))
+
+    results = run_suite(args.runs, args.concurrency, settings)
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+
+    if args.baseline:
+        failures = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""File-backed keyring backend so benchmarks can exercise the keyring path headlessly.
+
+Selected with ``PYTHON_KEYRING_BACKEND=benchmarks.keyring_backend.FileKeyring``.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from keyring.backend import KeyringBackend
+
+
+class FileKeyring(KeyringBackend):
+    priority = 1  # type: ignore[assignment]
+
+    @property
+    def _path(self) -> Path:
+        return Path(os.environ.get("BENCH_KEYRING_FILE", Path.home() / ".bench_keyring.json"))
+
+    def _load(self) -> dict:
+        return json.loads(self._path.read_text()) if self._path.exists() else {}
+
+    def get_password(self, service: str, username: str) -> str | None:
+        return self._load().get(f"{service}/{username}")
+
+    def set_password(self, service: str, username: str, password: str) -> None:
+        data = self._load()
+        data[f"{service}/{username}"] = password
+        self._path.write_text(json.dumps(data))
+
+    def delete_password(self, service: str, username: str) -> None:
+        data = self._load()
+        data.pop(f"{service}/{username}", None)
+        self._path.write_text(json.dumps(data))
@@ -0,0 +1,454 @@
+"""Load generator for the AI Gateway: throughput, TTFT, latency histograms, 429 rate.
+
+Runs a closed loop of ``--concurrency`` workers (a comma-separated list sweeps
+several levels) against ``GatewayConfig.base_url`` for ``--duration`` seconds per
+level. Each request picks a shape by weight: streaming or not, prompt size and
+``max_tokens``. The token comes from the credential helper, as for Claude Code.
+``--emulator`` runs the same load against a local emulator instead, with
+``--emulator-settings`` modelling latency and throttling, so rate limits can be
+sized before touching a workspace.
+
+Per level and per shape it reports requests/s, output tokens/s, the 429 and error
+rates, and p50/p90/p99 plus a histogram of time to first token (streaming) and of
+full-response latency. Results go to JSON (``--output``) and CSV (``--csv``).
+
+    uv run python -m benchmarks.load [--config PATH | --emulator] [--concurrency 1,8,32] \\
+        [--duration 30] [--shapes shapes.json] [--output load.json] [--csv load.csv]
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from config.settings import GatewayConfig, load_config
+from credential_helper.http1 import (
+    ConnectionPool,
+    UpstreamError,
+    encode_head,
+    header,
+    is_chunked,
+    iter_body,
+)
+from credential_helper.token_cache import CachedToken
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_DURATION_SECONDS = 30.0
+REQUEST_TIMEOUT_SECONDS = 300.0
+# Upper bounds (ms) of the latency histogram buckets; slower responses land in the last
+HISTOGRAM_BOUNDS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+CSV_FIELDS = (
+    "concurrency",
+    "shape",
+    "requests",
+    "ok",
+    "throttled",
+    "errors",
+    "rate_429",
+    "error_rate",
+    "requests_per_second",
+    "output_tokens_per_second",
+    "ttft_p50_ms",
+    "ttft_p90_ms",
+    "ttft_p99_ms",
+    "latency_p50_ms",
+    "latency_p90_ms",
+    "latency_p99_ms",
+)
+
+
+@dataclass
+class RequestShape:
+    """One kind of request in the mix; ``weight`` is its relative frequency."""
+
+    name: str
+    stream: bool = True
+    prompt_words: int = 200
+    max_tokens: int = 256
+    weight: float = 1.0
+
+    def body(self, model: str) -> bytes:
+        prompt = " ".join(f"word{i}" for i in range(self.prompt_words))
+        return json.dumps(
+            {
+                "model": model,
+                "max_tokens": self.max_tokens,
+                "stream": self.stream,
+                "messages": [{"role": "user", "content": prompt}],
+            }
+        ).encode()
+
+
+DEFAULT_SHAPES = [
+    RequestShape("chat_stream", stream=True, prompt_words=400, max_tokens=512, weight=3),
+    RequestShape("short", stream=False, prompt_words=50, max_tokens=64, weight=1),
+]
+
+
+@dataclass
+class Sample:
+    shape: str
+    status: int  # 0 when the request failed before a response
+    latency_ms: float
+    ttft_ms: float | None = None
+    output_tokens: int = 0
+    error: str | None = None
+
+
+def load_shapes(path: str) -> list[RequestShape]:
+    shapes = [RequestShape(**raw) for raw in json.loads(Path(path).read_text())]
+    if not shapes:
+        raise ValueError(f"No request shapes in {path}")
+    return shapes
+
+
+def percentile(ordered: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of already sorted values."""
+    if not ordered:
+        return None
+    return round(ordered[max(0, math.ceil(q * len(ordered)) - 1)], 1)
+
+
+def histogram(values: list[float]) -> dict[str, int]:
+    """Counts per ``HISTOGRAM_BOUNDS_MS`` bucket, keyed ``"<=100"``, ..., ``">60000"``."""
+    counts = {f"<={bound}": 0 for bound in HISTOGRAM_BOUNDS_MS}
+    counts[f">{HISTOGRAM_BOUNDS_MS[-1]}"] = 0
+    for value in values:
+        for bound in HISTOGRAM_BOUNDS_MS:
+            if value <= bound:
+                counts[f"<={bound}"] += 1
+                break
+        else:
+            counts[f">{HISTOGRAM_BOUNDS_MS[-1]}"] += 1
+    return counts
+
+
+def _distribution(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "p50_ms": percentile(ordered, 0.5),
+        "p90_ms": percentile(ordered, 0.9),
+        "p99_ms": percentile(ordered, 0.99),
+        "max_ms": round(ordered[-1], 1) if ordered else None,
+        "histogram": histogram(ordered),
+    }
+
+
+def summarize(samples: list[Sample], elapsed_seconds: float) -> dict:
+    """Rates and latency distributions of one batch; latencies cover 2xx responses only."""
+    ok = [s for s in samples if 200 <= s.status < 300]
+    throttled = sum(1 for s in samples if s.status == 429)
+    statuses: dict[str, int] = {}
+    for s in samples:
+        statuses[str(s.status)] = statuses.get(str(s.status), 0) + 1
+    count = len(samples)
+    elapsed = max(elapsed_seconds, 1e-9)
+    return {
+        "requests": count,
+        "ok": len(ok),
+        "throttled": throttled,
+        "errors": count - len(ok) - throttled,
+        "rate_429": round(throttled / count, 4) if count else 0.0,
+        "error_rate": round((count - len(ok) - throttled) / count, 4) if count else 0.0,
+        "requests_per_second": round(count / elapsed, 2),
+        "output_tokens_per_second": round(sum(s.output_tokens for s in ok) / elapsed, 1),
+        "statuses": statuses,
+        "ttft": _distribution([s.ttft_ms for s in ok if s.ttft_ms is not None]),
+        "latency": _distribution([s.latency_ms for s in ok]),
+    }
+
+
+def _output_tokens(body: bytes, stream: bool) -> int:
+    """``usage.output_tokens`` of a Messages response (the last one, when streamed)."""
+    try:
+        if not stream:
+            return int(json.loads(body).get("usage", {}).get("output_tokens", 0))
+        tokens = 0
+        for line in body.splitlines():
+            if line.startswith(b"data:") and b"output_tokens" in line:
+                tokens = int(json.loads(line[5:]).get("usage", {}).get("output_tokens", tokens))
+        return tokens
+    except (ValueError, AttributeError):
+        return 0
+
+
+class _Target:
+    """The endpoint under load: its URL, keep-alive pool and token source."""
+
+    def __init__(self, url: str, service):
+        parts = urlsplit(url)
+        self.netloc = parts.netloc
+        self.path = parts.path or "/"
+        self.service = service
+        self.pool = ConnectionPool.for_url(url)
+
+    def build_request(self, body: bytes, token: CachedToken, stream: bool) -> bytes:
+        headers = [
+            ("Host", self.netloc),
+            ("Authorization", f"{token.token_type} {token.access_token}"),
+            ("Content-Type", "application/json"),
+            ("Accept", "text/event-stream" if stream else "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Connection", "keep-alive"),
+        ]
+        return encode_head(f"POST {self.path} HTTP/1.1", headers) + body
+
+
+async def _request(upstream: _Target, shape: RequestShape, model: str) -> Sample:
+    token = await asyncio.to_thread(upstream.service.get)
+    request = upstream.build_request(shape.body(model), token, shape.stream)
+    started = time.perf_counter()
+
+    def elapsed_ms() -> float:
+        return (time.perf_counter() - started) * 1000
+
+    response = None
+    try:
+        response = await upstream.pool.send(request)
+        ttft_ms = None
+        chunks = []
+        async for chunk in iter_body(response.reader, response.headers):
+            if ttft_ms is None and shape.stream and b"content_block_delta" in chunk:
+                ttft_ms = elapsed_ms()
+            chunks.append(chunk)
+    except (OSError, UpstreamError, asyncio.IncompleteReadError, ValueError) as e:
+        if response is not None:
+            response.writer.close()
+        return Sample(shape.name, 0, elapsed_ms(), error=f"{type(e).__name__}: {e}")
+    except BaseException:
+        if response is not None:
+            response.writer.close()
+        raise
+    latency_ms = elapsed_ms()
+
+    framed = is_chunked(response.headers) or header(response.headers, "content-length")
+    if framed and (header(response.headers, "connection") or "").lower() != "close":
+        upstream.pool.release(response.reader, response.writer)
+    else:
+        response.writer.close()
+
+    body = b"".join(chunks)
+    ok = 200 <= response.code < 300
+    return Sample(
+        shape.name,
+        response.code,
+        latency_ms,
+        ttft_ms=ttft_ms if ok else None,
+        output_tokens=_output_tokens(body, shape.stream) if ok else 0,
+        error=None if ok else body[:200].decode("utf-8", "replace"),
+    )
+
+
+async def run_level(
+    upstream: _Target,
+    model: str,
+    shapes: list[RequestShape],
+    concurrency: int,
+    duration: float,
+    max_requests: int | None = None,
+    rng: random.Random | None = None,
+) -> dict:
+    """Keep ``concurrency`` requests in flight for ``duration`` seconds (or ``max_requests``)."""
+    rng = rng or random.Random()
+    weights = [shape.weight for shape in shapes]
+    samples: list[Sample] = []
+    issued = 0
+    start = time.monotonic()
+    deadline = start + duration
+
+    async def worker() -> None:
+        nonlocal issued
+        while time.monotonic() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            shape = rng.choices(shapes, weights)[0]
+            try:
+                sample = await asyncio.wait_for(
+                    _request(upstream, shape, model), REQUEST_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                sample = Sample(shape.name, 0, REQUEST_TIMEOUT_SECONDS * 1000, error="timeout")
+            samples.append(sample)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.monotonic() - start
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "overall": summarize(samples, elapsed),
+        "shapes": {
+            shape.name: summarize([s for s in samples if s.shape == shape.name], elapsed)
+            for shape in shapes
+        },
+        "sample_errors": sorted({s.error for s in samples if s.error})[:10],
+    }
+
+
+async def run_load(
+    config: GatewayConfig,
+    service,
+    shapes: list[RequestShape],
+    levels: list[int],
+    duration: float,
+    max_requests: int | None = None,
+) -> dict:
+    """Run each concurrency level in turn over one keep-alive pool to ``config.base_url``.
+
+    ``service`` is anything with a blocking ``get() -> CachedToken``, e.g. ``TokenService``.
+    """
+    # No local rate limiter: the point is to see what the gateway itself admits
+    upstream = _Target(config.base_url, service)
+    try:
+        results = [
+            await run_level(upstream, config.model, shapes, level, duration, max_requests)
+            for level in levels
+        ]
+    finally:
+        upstream.pool.close()
+    return {
+        "target": config.base_url,
+        "duration_s": duration,
+        "shapes": [asdict(shape) for shape in shapes],
+        "levels": results,
+    }
+
+
+def csv_rows(results: dict) -> list[dict]:
+    """One row per concurrency level and shape (``shape`` is ``"all"`` for the total)."""
+    rows = []
+    for level in results["levels"]:
+        for shape, summary in {"all": level["overall"], **level["shapes"]}.items():
+            row = {"concurrency": level["concurrency"], "shape": shape}
+            row.update({k: summary[k] for k in CSV_FIELDS if k in summary})
+            for name in ("ttft", "latency"):
+                for q in ("p50", "p90", "p99"):
+                    row[f"{name}_{q}_ms"] = summary[name][f"{q}_ms"]
+            rows.append(row)
+    return rows
+
+
+def write_csv(path: str, results: dict) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(csv_rows(results))
+
+
+class HelperToken:
+    """Tokens from ``python -m credential_helper``, re-run once the last one expires."""
+
+    def __init__(self, config_path: str | None = None, env: dict[str, str] | None = None):
+        self.config_path = config_path
+        self.env = env
+        self._token: CachedToken | None = None
+        # Workers call get() on executor threads; only one of them runs the helper
+        self._lock = threading.Lock()
+
+    def get(self) -> CachedToken:
+        with self._lock:
+            if self._token is None or not self._token.is_valid:
+                self._token = self._fetch()
+            return self._token
+
+    def _fetch(self) -> CachedToken:
+        command = [sys.executable, "-m", "credential_helper"]
+        if self.config_path:
+            command += ["--config", self.config_path]
+        result = subprocess.run(
+            command, capture_output=True, text=True, cwd=PROJECT_DIR, env=self.env
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"credential_helper failed: {result.stderr[-2000:]}")
+        output = json.loads(result.stdout)
+        return CachedToken(
+            access_token=output["token"], expires_at=time.time() + output["expires_in"]
+        )
+
+
+def _print_level(level: dict) -> None:
+    overall = level["overall"]
+    print(
+        f"concurrency {level['concurrency']:>4}: {overall['requests_per_second']:>8} req/s "
+        f"{overall['output_tokens_per_second']:>9} tok/s  429 {overall['rate_429']:.1%}  "
+        f"errors {overall['error_rate']:.1%}  ttft p50/p99 {overall['ttft']['p50_ms']}/"
+        f"{overall['ttft']['p99_ms']} ms  latency p50/p99 {overall['latency']['p50_ms']}/"
+        f"{overall['latency']['p99_ms']} ms",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gateway load generator")
+    parser.add_argument("--config", help="Path to config.json")
+    parser.add_argument("--emulator", action="store_true", help="Target a local emulator")
+    parser.add_argument("--emulator-settings", help="JSON file with EmulatorSettings overrides")
+    parser.add_argument(
+        "--concurrency", default="1,8,32", help="Comma-separated concurrency levels to sweep"
+    )
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SECONDS)
+    parser.add_argument("--max-requests", type=int, help="Stop each level after this many")
+    parser.add_argument("--shapes", help="JSON list of RequestShape fields")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--csv", help="Write a per-level, per-shape summary CSV here")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    shapes = load_shapes(args.shapes) if args.shapes else DEFAULT_SHAPES
+
+    root = None
+    emulator = None
+    if args.emulator:
+        from emulator.server import Emulator, EmulatorSettings
+
+        settings = EmulatorSettings()
+        if args.emulator_settings:
+            raw = json.loads(Path(args.emulator_settings).read_text())
+            settings = EmulatorSettings.from_dict(raw)
+        root = Path(tempfile.mkdtemp(prefix="gateway-load-"))
+        emulator = Emulator(root / "emulator", settings).start()
+        os.environ.update(emulator.env())
+        config_path = str(emulator.write_config(root / "config.json"))
+        config = load_config(config_path)
+        # The helper logs in to the emulator with a throwaway HOME, not the real caches
+        home = root / "home"
+        home.mkdir()
+        service = HelperToken(config_path, {**os.environ, "HOME": str(home)})
+    else:
+        from credential_helper.daemon import TokenService
+
+        config = load_config(args.config)
+        service = TokenService(config)
+
+    try:
+        results = asyncio.run(
+            run_load(config, service, shapes, levels, args.duration, args.max_requests)
+        )
+    finally:
+        if emulator is not None:
+            emulator.stop()
+        if root is not None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for level in results["levels"]:
+        _print_level(level)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+    if args.csv:
+        write_csv(args.csv, results)
+    if not args.output and not args.csv:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
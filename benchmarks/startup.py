@@ -0,0 +1,121 @@
+"""Startup benchmark for the credential helper cache-hit path.
+
+Runs ``python -X importtime -m credential_helper`` against a throwaway HOME with a
+valid file-cached token and reports wall-clock time and import cost. Exits
+non-zero if a heavy module is imported or the median exceeds the target.
+
+    uv run python -m benchmarks.startup [--runs 10] [--target-ms 150]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from config.settings import load_config
+from credential_helper.token_cache import CachedToken, TokenStore, token_key
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+TARGET_MS = 150.0
+FORBIDDEN_MODULES = ("msal", "requests", "keyring", "urllib3")
+
+
+def prepare_home(home: Path) -> Path:
+    """Write a file-backed config and a valid cached token under ``home``."""
+    cache_dir = home / ".databricks-claude-gateway"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    config_path = cache_dir / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "databricks_host": "https://example.cloud.databricks.com",
+                "endpoint_name": "claude-code-gateway",
+                "model": "claude-sonnet-4-20250514",
+                "azure_ad": {"tenant_id": "bench-tenant", "client_id": "bench-client"},
+                "token_cache": {"method": "file", "fallback": "file"},
+            }
+        )
+    )
+    store = TokenStore(capacity=1)
+    store.put(
+        token_key(load_config(str(config_path))),
+        CachedToken(access_token="bench-token", expires_at=time.time() + 3600),
+    )
+    (cache_dir / "token_cache.json").write_text(json.dumps(store.to_dict()))
+    return config_path
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """Map imported module name to (nesting depth, cumulative import time in us)."""
+    modules: dict[str, tuple[int, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, raw_name = line.split("|", 2)
+        name = raw_name.strip()
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        modules[name] = (depth, int(cumulative))
+    return modules
+
+
+def run_once(
+    config_path: Path, home: Path, check: bool
+) -> tuple[float, dict[str, tuple[int, int]]]:
+    cmd = [sys.executable, "-X", "importtime", "-m", "credential_helper", "--no-daemon"]
+    cmd += ["--config", str(config_path)]
+    if check:
+        cmd.append("--check")
+    env = {**os.environ, "HOME": str(home)}
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True, cwd=PROJECT_DIR, env=env)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"credential_helper failed: {result.stderr[-2000:]}")
+    return elapsed_ms, parse_importtime(result.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Credential helper startup benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=TARGET_MS)
+    parser.add_argument("--check", action="store_true", help="Benchmark --check instead of get")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        home = Path(tmp)
+        config_path = prepare_home(home)
+        timings = []
+        modules: dict[str, tuple[int, int]] = {}
+        for _ in range(args.runs):
+            elapsed_ms, modules = run_once(config_path, home, args.check)
+            timings.append(elapsed_ms)
+
+    heavy = sorted(m for m in modules if m.split(".")[0] in FORBIDDEN_MODULES)
+    median_ms = statistics.median(timings)
+    top_level = {name: us for name, (depth, us) in modules.items() if depth == 0}
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:5]
+    report = {
+        "median_ms": round(median_ms, 1),
+        "min_ms": round(min(timings), 1),
+        "target_ms": args.target_ms,
+        "import_total_us": sum(top_level.values()),
+        "slowest_imports_us": dict(slowest),
+        "heavy_imports": heavy,
+    }
+    print(json.dumps(report, indent=2))
+
+    if heavy:
+        print(f"FAIL: heavy modules imported on cache hit: {heavy}", file=sys.stderr)
+        sys.exit(1)
+    if median_ms > args.target_ms:
+        print(f"FAIL: median {median_ms:.1f}ms exceeds target {args.target_ms}ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
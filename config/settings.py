@@ -1,7 +1,7 @@
 """Configuration loader for Databricks Claude Gateway."""
 
 import json
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 
 
@@ -10,12 +10,79 @@ class AzureAdConfig:
     tenant_id: str
     client_id: str
     scopes: list[str] = field(default_factory=lambda: ["openid", "profile", "email"])
+    # Overrides https://login.microsoftonline.com/<tenant_id>, e.g. for the local emulator
+    authority: str | None = None
+
+    @property
+    def authority_url(self) -> str:
+        return self.authority or f"https://login.microsoftonline.com/{self.tenant_id}"
 
 
 @dataclass
 class TokenCacheConfig:
     method: str = "keyring"
     fallback: str = "file"
+    # Renew in the background once this share of the token lifetime has passed,
+    # minus up to refresh_jitter_ratio of the lifetime chosen at random.
+    refresh_ahead_ratio: float = 0.75
+    refresh_jitter_ratio: float = 0.1
+    # Tokens kept per backend (one per workspace/identity); least recently refreshed go first
+    capacity: int = 8
+    # Keyring calls that take longer fall back to the file cache (D-Bus can hang)
+    keyring_timeout_seconds: float = 1.0
+    # Budget for refreshing a token that is inside its expiry buffer but not yet
+    # expired; past it the old token is served (stale) while a refresh continues
+    refresh_deadline_seconds: float = 10.0
+
+
+@dataclass
+class ResponseCacheConfig:
+    """Opt-in proxy cache for deterministic (``temperature: 0``) requests."""
+
+    enabled: bool = False
+    # Responses kept in the proxy's memory; older ones are still served from disk
+    memory_entries: int = 128
+    # Disk tier bounds: least recently stored entries go first once over the size
+    max_disk_bytes: int = 256 * 1024 * 1024
+    ttl_seconds: float = 86400.0
+
+
+@dataclass
+class HedgingConfig:
+    """Opt-in hedging of non-streaming requests to a second endpoint."""
+
+    enabled: bool = False
+    # Hedge once the first attempt is slower than this percentile of recent latencies
+    percentile: float = 0.95
+    # Hedges allowed per eligible request: extra load stays under this share
+    budget_ratio: float = 0.05
+
+
+@dataclass
+class RateLimit:
+    """One AI Gateway rate limit; ``key`` is ``"endpoint"`` or ``"user"``."""
+
+    key: str
+    calls: int
+    renewal_period: str = "minute"
+
+
+DEFAULT_RATE_LIMITS = [
+    RateLimit(key="endpoint", calls=100),
+    RateLimit(key="user", calls=20),
+]
+
+
+@dataclass
+class EndpointConfig:
+    """A serving endpoint to route to; ``host`` defaults to ``databricks_host``.
+
+    ``profile`` names the ~/.databrickscfg profile used to provision it.
+    """
+
+    name: str
+    host: str | None = None
+    profile: str | None = None
 
 
 @dataclass
@@ -25,34 +92,67 @@ class GatewayConfig:
     model: str
     azure_ad: AzureAdConfig
     token_cache: TokenCacheConfig = field(default_factory=TokenCacheConfig)
+    rate_limits: list[RateLimit] = field(default_factory=lambda: list(DEFAULT_RATE_LIMITS))
+    endpoints: list[EndpointConfig] = field(default_factory=list)
+    # Pin each conversation to one endpoint so Anthropic prompt caches keep hitting
+    sticky_routing: bool = True
+    response_cache: ResponseCacheConfig = field(default_factory=ResponseCacheConfig)
+    hedging: HedgingConfig = field(default_factory=HedgingConfig)
+
+    @property
+    def host(self) -> str:
+        return self.databricks_host.rstrip("/")
 
     @property
     def base_url(self) -> str:
-        host = self.databricks_host.rstrip("/")
-        return f"{host}/serving-endpoints/{self.endpoint_name}/invocations"
+        return f"{self.host}/serving-endpoints/{self.endpoint_name}/invocations"
 
     @property
     def token_exchange_url(self) -> str:
-        host = self.databricks_host.rstrip("/")
-        return f"{host}/oidc/v1/token"
+        return f"{self.host}/oidc/v1/token"
+
+    @property
+    def serving_endpoints(self) -> list[EndpointConfig]:
+        """Every endpoint to route across, with ``host`` filled in.
+
+        Falls back to the single ``endpoint_name`` when no ``endpoints`` are configured.
+        """
+        endpoints = self.endpoints or [EndpointConfig(name=self.endpoint_name)]
+        return [
+            EndpointConfig(
+                name=e.name, host=(e.host or self.host).rstrip("/"), profile=e.profile
+            )
+            for e in endpoints
+        ]
 
+    def for_endpoint(self, endpoint: EndpointConfig) -> "GatewayConfig":
+        """This config narrowed to one endpoint (and its workspace's token exchange)."""
+        return replace(
+            self,
+            databricks_host=endpoint.host or self.databricks_host,
+            endpoint_name=endpoint.name,
+            endpoints=[],
+        )
 
-def load_config(path: str | None = None) -> GatewayConfig:
-    """Load config from explicit path, CWD, or ~/.databricks-claude-gateway/config.json."""
+
+def find_config_path(path: str | None = None) -> Path:
+    """The file ``load_config`` reads: explicit path, CWD, or the home config."""
     if path:
-        config_path = Path(path)
-    else:
-        cwd_path = Path.cwd() / "config.json"
-        home_path = Path.home() / ".databricks-claude-gateway" / "config.json"
-        if cwd_path.exists():
-            config_path = cwd_path
-        elif home_path.exists():
-            config_path = home_path
-        else:
-            raise FileNotFoundError(
-                "No config.json found in current directory or ~/.databricks-claude-gateway/"
-            )
+        return Path(path)
+    cwd_path = Path.cwd() / "config.json"
+    home_path = Path.home() / ".databricks-claude-gateway" / "config.json"
+    if cwd_path.exists():
+        return cwd_path
+    if home_path.exists():
+        return home_path
+    raise FileNotFoundError(
+        "No config.json found in current directory or ~/.databricks-claude-gateway/"
+    )
+
 
+def load_config(path: str | None = None) -> GatewayConfig:
+    """Load config from explicit path, CWD, or ~/.databricks-claude-gateway/config.json."""
+    config_path = find_config_path(path)
     if not config_path.exists():
         raise FileNotFoundError(f"Config file not found: {config_path}")
 
@@ -71,18 +171,65 @@ def load_config(path: str | None = None) -> GatewayConfig:
         tenant_id=azure_ad_raw["tenant_id"],
         client_id=azure_ad_raw["client_id"],
         scopes=azure_ad_raw.get("scopes", ["openid", "profile", "email"]),
+        authority=azure_ad_raw.get("authority"),
     )
 
     token_cache_raw = raw.get("token_cache", {})
     token_cache = TokenCacheConfig(
         method=token_cache_raw.get("method", "keyring"),
         fallback=token_cache_raw.get("fallback", "file"),
+        refresh_ahead_ratio=token_cache_raw.get("refresh_ahead_ratio", 0.75),
+        refresh_jitter_ratio=token_cache_raw.get("refresh_jitter_ratio", 0.1),
+        capacity=token_cache_raw.get("capacity", 8),
+        keyring_timeout_seconds=token_cache_raw.get("keyring_timeout_seconds", 1.0),
+        refresh_deadline_seconds=token_cache_raw.get("refresh_deadline_seconds", 10.0),
+    )
+
+    response_cache_raw = raw.get("response_cache", {})
+    response_cache = ResponseCacheConfig(
+        enabled=response_cache_raw.get("enabled", False),
+        memory_entries=response_cache_raw.get("memory_entries", 128),
+        max_disk_bytes=response_cache_raw.get("max_disk_bytes", 256 * 1024 * 1024),
+        ttl_seconds=response_cache_raw.get("ttl_seconds", 86400.0),
+    )
+
+    hedging_raw = raw.get("hedging", {})
+    hedging = HedgingConfig(
+        enabled=hedging_raw.get("enabled", False),
+        percentile=hedging_raw.get("percentile", 0.95),
+        budget_ratio=hedging_raw.get("budget_ratio", 0.05),
     )
 
+    rate_limits = [
+        RateLimit(
+            key=limit["key"],
+            calls=limit["calls"],
+            renewal_period=limit.get("renewal_period", "minute"),
+        )
+        for limit in raw.get("rate_limits", [])
+    ] or list(DEFAULT_RATE_LIMITS)
+
+    endpoints = []
+    for endpoint_raw in raw.get("endpoints", []):
+        if "name" not in endpoint_raw:
+            raise ValueError("Missing required endpoints field: name")
+        endpoints.append(
+            EndpointConfig(
+                name=endpoint_raw["name"],
+                host=endpoint_raw.get("host"),
+                profile=endpoint_raw.get("profile"),
+            )
+        )
+
     return GatewayConfig(
         databricks_host=raw["databricks_host"],
         endpoint_name=raw["endpoint_name"],
         model=raw["model"],
         azure_ad=azure_ad,
         token_cache=token_cache,
+        rate_limits=rate_limits,
+        endpoints=endpoints,
+        sticky_routing=raw.get("sticky_routing", True),
+        response_cache=response_cache,
+        hedging=hedging,
     )
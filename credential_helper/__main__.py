@@ -6,22 +6,74 @@ import sys
 import time
 
 from config.settings import load_config
-from credential_helper.azure_ad_auth import acquire_token, create_msal_app
-from credential_helper.token_cache import CachedToken, get_cached_token, save_token
-from credential_helper.token_exchange import exchange_token
+from credential_helper import timing
+from credential_helper.daemon import query_daemon, serve
+from credential_helper.provider import get_token, refresh_ahead, spawn_background_refresh
+from credential_helper.token_cache import claim_refresh_attempt, get_cached_token, token_key
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Databricks Claude Gateway credential helper")
     parser.add_argument("--config", help="Path to config.json")
     parser.add_argument("--check", action="store_true", help="Check token validity without refresh")
+    parser.add_argument("--daemon", action="store_true", help="Run the resident credential daemon")
+    parser.add_argument(
+        "--no-daemon", action="store_true", help="Do not use a running credential daemon"
+    )
+    parser.add_argument(
+        "--refresh-ahead",
+        action="store_true",
+        help="Renew the cached token without interactive login (used by background refresh)",
+    )
+    parser.add_argument(
+        "--timings", action="store_true", help="Print a per-phase timing breakdown to stderr"
+    )
     args = parser.parse_args()
 
-    config = load_config(args.config)
+    if args.daemon:
+        serve(load_config(args.config), args.config)
+        return
+
+    command = "refresh-ahead" if args.refresh_ahead else "check" if args.check else "get"
+    with timing.collect(command=command) as collector:
+        try:
+            _run(args)
+        except Exception as e:
+            timing.annotate(error=type(e).__name__)
+            raise
+        finally:
+            timing.emit(collector)
+            if args.timings:
+                print(timing.format_breakdown(collector), file=sys.stderr)
+
 
-    cached = get_cached_token(config.token_cache)
+def _run(args: argparse.Namespace) -> None:
+    if not args.no_daemon and not args.refresh_ahead:
+        with timing.span("daemon_query"):
+            reply = query_daemon("check" if args.check else "get", args.config)
+        if reply is not None:
+            timing.annotate(outcome="daemon")
+            if args.check:
+                if reply["valid"]:
+                    print(json.dumps({"valid": True, "expires_at": reply["expires_at"]}))
+                    sys.exit(0)
+                print(json.dumps({"valid": False}), file=sys.stderr)
+                sys.exit(1)
+            expires_in = int(reply["expires_at"] - time.time())
+            print(json.dumps({"token": reply["token"], "expires_in": expires_in}))
+            return
+
+    with timing.span("load_config"):
+        config = load_config(args.config)
+    timing.annotate(host=config.host)
+
+    if args.refresh_ahead:
+        refresh_ahead(config)
+        return
 
     if args.check:
+        with timing.span("cache_lookup"):
+            cached = get_cached_token(config.token_cache, token_key(config))
         if cached and cached.is_valid:
             print(json.dumps({"valid": True, "expires_at": cached.expires_at}))
             sys.exit(0)
@@ -29,26 +81,13 @@ def main() -> None:
             print(json.dumps({"valid": False}), file=sys.stderr)
             sys.exit(1)
 
-    if cached and cached.is_valid:
-        print(json.dumps({"token": cached.access_token, "expires_in": int(cached.expires_at - time.time())}))
-        return
-
-    # Authenticate via Azure AD
-    app = create_msal_app(config.azure_ad)
-    jwt = acquire_token(app, config.azure_ad.scopes)
-
-    # Exchange for Databricks token
-    db_token = exchange_token(config.token_exchange_url, jwt)
-
-    # Cache the token
-    cached_token = CachedToken(
-        access_token=db_token.access_token,
-        expires_at=time.time() + db_token.expires_in,
-        token_type=db_token.token_type,
-    )
-    save_token(config.token_cache, cached_token)
-
-    print(json.dumps({"token": db_token.access_token, "expires_in": db_token.expires_in}))
+    token = get_token(config)
+    if token.needs_refresh and claim_refresh_attempt(token_key(config)):
+        spawn_background_refresh(args.config)
+    output = {"token": token.access_token, "expires_in": int(token.expires_at - time.time())}
+    if token.stale:
+        output["stale"] = True
+    print(json.dumps(output))
 
 
 if __name__ == "__main__":
@@ -1,52 +1,202 @@
 """Azure AD authentication using MSAL with PKCE."""
 
 import atexit
+import copy
+import json
+import sys
+import time
 from pathlib import Path
 
 import msal
 
 from config.settings import AzureAdConfig
+from credential_helper import timing
+from credential_helper.token_cache import atomic_write_text, refresh_lock
 
 CACHE_DIR = Path.home() / ".databricks-claude-gateway"
 CACHE_FILE = CACHE_DIR / "msal_cache.bin"
+CACHE_LOCK_TIMEOUT_SECONDS = 10
+# MSAL always requests these itself and rejects them if passed explicitly
+RESERVED_SCOPES = frozenset({"openid", "profile", "offline_access"})
 
+_ACCESS_TOKEN_TYPES = ("AccessToken", "atext")
 
-def _load_cache() -> msal.SerializableTokenCache:
-    cache = msal.SerializableTokenCache()
-    if CACHE_FILE.exists():
-        cache.deserialize(CACHE_FILE.read_text())
-    atexit.register(_save_cache, cache)
+
+def _read_state(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text() or "{}")
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        return {}  # an unreadable cache only costs a login
+
+
+def prune_state(state: dict, now: float | None = None) -> dict:
+    """Drop expired access tokens, then accounts (and their ID tokens) with no credentials left.
+
+    Refresh tokens carry no expiry in the cache; they are removed by MSAL when rejected.
+    """
+    now = time.time() if now is None else now
+    for credential_type in _ACCESS_TOKEN_TYPES:
+        entries = state.get(credential_type, {})
+        for key in [k for k, e in entries.items() if int(e.get("expires_on", 0)) <= now]:
+            del entries[key]
+
+    def holders(credential_type: str) -> set:
+        return {e.get("home_account_id") for e in state.get(credential_type, {}).values()}
+
+    usable = holders("RefreshToken").union(*(holders(t) for t in _ACCESS_TOKEN_TYPES))
+    for credential_type in ("Account", "IdToken"):
+        entries = state.get(credential_type, {})
+        for key in [k for k, e in entries.items() if e.get("home_account_id") not in usable]:
+            del entries[key]
+    return state
+
+
+def merge_state(base: dict, ours: dict, theirs: dict) -> dict:
+    """Apply the changes this process made since ``base`` on top of the file's current state.
+
+    Entries we added, changed or removed win; everything else another process wrote is kept.
+    """
+    merged = copy.deepcopy(theirs)
+    for credential_type in set(base) | set(ours):
+        before = base.get(credential_type, {})
+        after = ours.get(credential_type, {})
+        target = merged.setdefault(credential_type, {})
+        for key, entry in after.items():
+            if before.get(key) != entry:
+                target[key] = entry
+        for key in before.keys() - after.keys():
+            target.pop(key, None)
+    return merged
+
+
+class PersistentTokenCache(msal.SerializableTokenCache):
+    """MSAL token cache backed by ``path``, loaded on demand and saved by merging.
+
+    Nothing is read until ``load()``, which ``create_msal_app`` calls, so only code
+    that actually talks to Azure AD pays for the file. ``save()`` takes a file lock,
+    re-reads the file, applies only this process's changes to it, prunes expired
+    entries and writes it atomically, so concurrent helpers do not overwrite each
+    other's accounts. Only MSAL's public ``serialize``/``deserialize`` are used.
+    """
+
+    def __init__(self, path: Path, lock_file: Path | None = None):
+        super().__init__()
+        self.path = path
+        self.lock_file = lock_file or path.with_suffix(".lock")
+        # The state last read from or written to ``path``; our changes are the diff
+        self._base: dict = {}
+
+    def load(self) -> None:
+        with timing.span("msal_cache_load"):
+            state = _read_state(self.path)
+        self.deserialize(json.dumps(state))
+
+    def deserialize(self, state: str | None) -> None:
+        super().deserialize(state)
+        self._base = json.loads(state) if state else {}
+
+    def save(self) -> None:
+        """Persist this process's changes, if any, under the cache file lock."""
+        if not self.has_state_changed:
+            return
+        with refresh_lock(
+            timeout=CACHE_LOCK_TIMEOUT_SECONDS, lock_file=self.lock_file, phase="msal_cache_lock"
+        ):
+            ours = json.loads(self.serialize())
+            try:
+                state = merge_state(self._base, ours, _read_state(self.path))
+                prune_state(state)
+                text = json.dumps(state, indent=1)
+                atomic_write_text(self.path, text)
+            except BaseException:
+                self.has_state_changed = True  # serialize() cleared it; retry at exit
+                raise
+            self.deserialize(text)
+
+
+# The newest app's cache, saved by one atexit handler (the daemon creates many apps)
+_exit_cache: PersistentTokenCache | None = None
+
+
+def _load_cache() -> PersistentTokenCache:
+    global _exit_cache
+    cache = PersistentTokenCache(CACHE_FILE)
+    cache.load()
+    if _exit_cache is None:
+        atexit.register(_save_exit_cache)
+    _exit_cache = cache
     return cache
 
 
-def _save_cache(cache: msal.SerializableTokenCache) -> None:
-    if cache.has_state_changed:
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        CACHE_FILE.write_text(cache.serialize())
+def _save_exit_cache() -> None:
+    if _exit_cache is not None:
+        _save_cache(_exit_cache)
+
+
+def _save_cache(cache: PersistentTokenCache) -> None:
+    try:
+        cache.save()
+    except (OSError, TimeoutError) as e:
+        print(f"Warning: could not save MSAL cache: {e}", file=sys.stderr)
 
 
 def create_msal_app(config: AzureAdConfig) -> msal.PublicClientApplication:
     """Create an MSAL public client application with token cache."""
-    authority = f"https://login.microsoftonline.com/{config.tenant_id}"
     cache = _load_cache()
-    return msal.PublicClientApplication(
-        client_id=config.client_id,
-        authority=authority,
-        token_cache=cache,
-    )
+    # MSAL fetches the authority's OpenID configuration while constructing the app
+    with timing.span("msal_app"):
+        if config.authority:
+            # A non-Microsoft host cannot pass instance discovery
+            return msal.PublicClientApplication(
+                client_id=config.client_id,
+                authority=config.authority,
+                token_cache=cache,
+                instance_discovery=False,
+            )
+        return msal.PublicClientApplication(
+            client_id=config.client_id,
+            authority=config.authority_url,
+            token_cache=cache,
+        )
 
 
-def acquire_token(app: msal.PublicClientApplication, scopes: list[str]) -> str:
+def acquire_token(
+    app: msal.PublicClientApplication, scopes: list[str], interactive: bool = True
+) -> str:
     """Acquire a JWT ID token, trying silent auth first then interactive."""
+    scopes = [scope for scope in scopes if scope not in RESERVED_SCOPES]
     accounts = app.get_accounts()
     if accounts:
-        result = app.acquire_token_silent(scopes, account=accounts[0])
+        with timing.span("msal_silent"):
+            result = app.acquire_token_silent(scopes, account=accounts[0])
+            if result and "id_token" not in result:
+                # An access-token cache hit carries no ID token; redeem the refresh token
+                result = app.acquire_token_silent(
+                    scopes, account=accounts[0], force_refresh=True
+                )
         if result and "id_token" in result:
+            _persist(app)
             return result["id_token"]
 
-    result = app.acquire_token_interactive(scopes=scopes)
+    if not interactive:
+        raise RuntimeError(
+            "Azure AD silent authentication failed and interactive login is disabled"
+        )
+
+    with timing.span("msal_interactive"):
+        result = app.acquire_token_interactive(scopes=scopes)
     if "id_token" not in result:
         error = result.get("error_description", result.get("error", "Unknown error"))
         raise RuntimeError(f"Azure AD authentication failed: {error}")
 
+    _persist(app)
     return result["id_token"]
+
+
+def _persist(app: msal.PublicClientApplication) -> None:
+    """Save the app's cache now rather than at exit (the daemon may never exit)."""
+    cache = getattr(app, "token_cache", None)
+    if isinstance(cache, PersistentTokenCache):
+        _save_cache(cache)
@@ -0,0 +1,98 @@
+"""Cross-process circuit breaker for the token endpoints.
+
+After ``FAILURE_THRESHOLD`` consecutive outage-type failures (network errors, 429,
+5xx) against an endpoint, calls to it fail fast with ``CircuitOpenError`` until a
+jittered exponential back-off has passed; the next call is then let through as a
+probe, and a success closes the circuit. State lives in a small JSON file so every
+helper process (and the daemon) shares it.
+"""
+
+import json
+import random
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from credential_helper.token_cache import CACHE_DIR, atomic_write_text
+
+BREAKER_FILE = CACHE_DIR / "circuit_breaker.json"
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF_SECONDS = 5.0
+MAX_BACKOFF_SECONDS = 300.0
+
+
+class CircuitOpenError(RuntimeError):
+    """The endpoint has been failing; not calling it again until ``retry_at``."""
+
+    def __init__(self, name: str, retry_at: float):
+        self.name = name
+        self.retry_at = retry_at
+        super().__init__(
+            f"{name} is failing; not retrying for {max(0, retry_at - time.time()):.0f}s"
+        )
+
+
+def _load(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        path: Path | None = None,
+        threshold: int = FAILURE_THRESHOLD,
+        base_backoff: float = BASE_BACKOFF_SECONDS,
+        max_backoff: float = MAX_BACKOFF_SECONDS,
+    ):
+        self.name = name
+        self.path = path or BREAKER_FILE
+        self.threshold = threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+    def state(self) -> dict:
+        return _load(self.path).get(self.name, {})
+
+    def _update(self, state: dict | None) -> None:
+        states = _load(self.path)
+        if state is None:
+            if self.name not in states:
+                return
+            del states[self.name]
+        else:
+            states[self.name] = state
+        atomic_write_text(self.path, json.dumps(states))
+
+    def check(self) -> None:
+        """Raise ``CircuitOpenError`` while the circuit is open."""
+        state = self.state()
+        if state.get("failures", 0) >= self.threshold and time.time() < state["retry_at"]:
+            raise CircuitOpenError(self.name, state["retry_at"])
+
+    def record_success(self) -> None:
+        self._update(None)
+
+    def record_failure(self) -> None:
+        failures = self.state().get("failures", 0) + 1
+        state = {"failures": failures, "retry_at": 0.0}
+        if failures >= self.threshold:
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (failures - self.threshold))
+            state["retry_at"] = time.time() + random.uniform(backoff / 2, backoff)
+        self._update(state)
+
+    @contextmanager
+    def guard(self, is_outage: Callable[[BaseException], bool]) -> Iterator[None]:
+        """Fail fast while open; count exceptions ``is_outage`` accepts, reset on success."""
+        self.check()
+        try:
+            yield
+        except Exception as e:
+            if is_outage(e):
+                self.record_failure()
+            raise
+        self.record_success()
@@ -0,0 +1,223 @@
+"""Resident credential daemon serving tokens over a Unix domain socket.
+
+Protocol: the client sends one JSON line (``{"op": "get" | "check" | "stop",
+"config": <path or null>}``) and reads one JSON line back. ``config`` is the
+resolved file ``load_config`` picks, so a CLI run in a directory with its own
+config.json is never served the daemon's token for another workspace.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+from config.settings import GatewayConfig, find_config_path
+from credential_helper import timing
+from credential_helper.token_cache import (
+    CACHE_DIR,
+    REFRESH_RETRY_SECONDS,
+    CachedToken,
+    claim_refresh_attempt,
+    get_cached_token,
+    token_key,
+)
+
+SOCKET_PATH = CACHE_DIR / "daemon.sock"
+CLIENT_TIMEOUT_SECONDS = 0.5
+MAX_REQUEST_BYTES = 4096
+
+
+def _config_key(config_path: str | None) -> str | None:
+    try:
+        return str(find_config_path(config_path).resolve())
+    except FileNotFoundError:
+        return None
+
+
+class TokenService:
+    """Holds the current token in memory and refreshes it on demand.
+
+    Once a token passes its refresh-ahead point it keeps being served while a
+    background thread renews it without interactive login. A failed renewal is not
+    retried until ``claim_refresh_attempt`` allows it.
+    """
+
+    def __init__(self, config: GatewayConfig):
+        self.config = config
+        self._token: CachedToken | None = None
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        # Don't re-read the refresh attempts file before this, after it said to back off
+        self._refresh_backoff_until = 0.0
+
+    @staticmethod
+    def _servable(token: CachedToken | None) -> bool:
+        # A stale token (its refresh missed the deadline) is served while it is usable
+        return token is not None and (token.is_valid or (token.stale and token.is_usable))
+
+    def get(self) -> CachedToken:
+        token = self._token
+        if token is not None and self._servable(token):
+            if token.needs_refresh:
+                self._start_background_refresh()
+            return token
+        with self._lock:
+            if not self._servable(self._token):
+                from credential_helper.provider import get_token
+
+                self._token = get_token(self.config)
+            return self._token
+
+    def _start_background_refresh(self) -> None:
+        if time.time() < self._refresh_backoff_until:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+        if not claim_refresh_attempt(token_key(self.config)):
+            self._refresh_backoff_until = time.time() + REFRESH_RETRY_SECONDS / 2
+            self._refreshing.release()
+            return
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        from credential_helper.provider import refresh_ahead
+
+        try:
+            token = refresh_ahead(self.config)
+            if token is not None:
+                with self._lock:
+                    self._token = token
+        except Exception as e:
+            # Keep serving the current token; a blocking refresh runs once it expires.
+            print(f"Background token refresh failed: {e}", file=sys.stderr)
+        finally:
+            self._refreshing.release()
+
+    def peek(self) -> CachedToken | None:
+        token = self._token
+        if token and token.is_valid:
+            return token
+        token = get_cached_token(self.config.token_cache, token_key(self.config))
+        if token and token.is_valid:
+            self._token = token
+            return token
+        return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        server: TokenDaemon = self.server  # type: ignore[assignment]
+        try:
+            request = json.loads(self.rfile.readline(MAX_REQUEST_BYTES))
+            reply = server.dispatch(request)
+        except Exception as e:
+            reply = {"error": str(e)}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class TokenDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, service: TokenService, config_path: str | None = None):
+        self.service = service
+        self.config_key = _config_key(config_path)
+        super().__init__(str(socket_path), _Handler)
+        os.chmod(socket_path, 0o600)
+
+    def dispatch(self, request: dict) -> dict:
+        op = request.get("op")
+        if request.get("config") != self.config_key:
+            return {"error": "config mismatch"}
+        if op == "get":
+            token = self.service.get()
+            return {"token": token.access_token, "expires_at": token.expires_at}
+        if op == "check":
+            token = self.service.peek()
+            if token is None:
+                return {"valid": False}
+            return {"valid": True, "expires_at": token.expires_at}
+        if op == "stop":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"stopped": True}
+        return {"error": f"Unknown op: {op}"}
+
+
+def query_daemon(
+    op: str,
+    config_path: str | None = None,
+    socket_path: Path | None = None,
+    timeout: float = CLIENT_TIMEOUT_SECONDS,
+) -> dict | None:
+    """Send one request to the daemon; return None if it is not reachable."""
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = str(socket_path or SOCKET_PATH)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            request = {"op": op, "config": _config_key(config_path)}
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            reply = sock.makefile("rb").readline()
+    except OSError:
+        return None
+    if not reply:
+        return None
+    try:
+        data = json.loads(reply)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "error" in data:
+        return None
+    return data
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    if not socket_path.exists():
+        return
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT_SECONDS)
+            sock.connect(str(socket_path))
+    except OSError:
+        socket_path.unlink()
+        return
+    raise RuntimeError(f"Credential daemon already running on {socket_path}")
+
+
+def _export_traces(url: str, stop: threading.Event) -> None:
+    """Send the helpers' spooled OTLP traces until ``stop`` is set."""
+    while not stop.wait(timing.OTLP_EXPORT_INTERVAL_SECONDS):
+        try:
+            timing.export_spool(url)
+        except Exception as e:
+            print(f"OTLP export failed: {e}", file=sys.stderr)
+
+
+def serve(
+    config: GatewayConfig, config_path: str | None = None, socket_path: Path | None = None
+) -> None:
+    """Run the credential daemon in the foreground until stopped."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("Credential daemon requires Unix domain socket support")
+    socket_path = socket_path or SOCKET_PATH
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    _remove_stale_socket(socket_path)
+
+    server = TokenDaemon(socket_path, TokenService(config), config_path)
+    print(f"Credential daemon listening on {socket_path}", file=sys.stderr)
+    stop = threading.Event()
+    url = timing.otlp_url()
+    if url:
+        threading.Thread(target=_export_traces, args=(url, stop), daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+        if socket_path.exists():
+            socket_path.unlink()
@@ -0,0 +1,104 @@
+"""Hedged requests for non-streaming calls.
+
+Tail latency to a serving endpoint is dominated by occasional stalls unrelated to
+the prompt. With ``hedging.enabled`` and two or more endpoints, the proxy sends a
+second copy of a non-streaming request to the next-ranked endpoint if the first
+has not answered within ``percentile`` of that endpoint's recent latencies. The
+first successful response is relayed and the other attempt is cancelled, closing
+its connection.
+
+Extra load is capped two ways. A hedge spends one credit, and each eligible
+request earns ``budget_ratio`` credits, so hedges never exceed that share of
+eligible requests. A hedge is also sent only if the alternate endpoint's rate
+limiter has a token free right now. It never queues behind the limits that
+``configure_gateway`` sets on the gateway.
+"""
+
+import json
+import math
+from collections import deque
+from dataclasses import asdict, dataclass
+
+from config.settings import HedgingConfig
+from credential_helper.rate_limit import RateLimiter
+
+# Recent latencies kept per endpoint, and how many are needed before hedging
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+# Shortest hedge delay, so sub-millisecond samples cannot make every request a hedge
+MIN_DELAY_SECONDS = 0.01
+# Unspent credits kept, in hedges; bounds a burst after a quiet spell
+MAX_CREDITS = 5.0
+# Credits are sums of fractions, so ten 0.1s must count as one
+CREDIT_EPSILON = 1e-9
+
+
+def hedgeable(method: str, body: bytes) -> bool:
+    """Whether a request may be sent twice: a non-streaming JSON POST."""
+    if method != "POST":
+        return False
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and not payload.get("stream")
+
+
+@dataclass
+class HedgeStats:
+    eligible: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    skipped_budget: int = 0
+    skipped_rate_limit: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class Hedger:
+    """Tracks per-endpoint latency percentiles and the hedging budget."""
+
+    def __init__(self, config: HedgingConfig):
+        self.config = config
+        self.credits = 0.0
+        self.stats = HedgeStats()
+        self._latencies: dict[str, deque[float]] = {}
+
+    def observe(self, key: str, seconds: float) -> None:
+        """Record the time to a successful non-streaming response from ``key``."""
+        self._latencies.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def delay(self, key: str) -> float | None:
+        """How long to wait on ``key`` before hedging; None until enough samples."""
+        window = self._latencies.get(key)
+        if window is None or len(window) < MIN_SAMPLES:
+            return None
+        ordered = sorted(window)
+        rank = max(1, math.ceil(self.config.percentile * len(ordered)))
+        return max(MIN_DELAY_SECONDS, ordered[rank - 1])
+
+    def admit(self) -> None:
+        """Count an eligible request, earning its share of hedging budget."""
+        self.stats.eligible += 1
+        self.credits = min(MAX_CREDITS, self.credits + self.config.budget_ratio)
+
+    def try_hedge(self, limiter: RateLimiter) -> bool:
+        """Spend a credit and a rate-limit slot on a hedge, if both are free now."""
+        if self.credits < 1 - CREDIT_EPSILON:
+            self.stats.skipped_budget += 1
+            return False
+        if not limiter.try_reserve():
+            self.stats.skipped_rate_limit += 1
+            return False
+        self.credits = max(0.0, self.credits - 1)
+        self.stats.hedged += 1
+        return True
+
+    def to_dict(self) -> dict:
+        delays = {key: self.delay(key) for key in self._latencies}
+        return {
+            **self.stats.to_dict(),
+            "credits": round(self.credits, 2),
+            "delay_ms": {k: round(v * 1000, 1) for k, v in delays.items() if v is not None},
+        }
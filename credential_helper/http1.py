@@ -0,0 +1,172 @@
+"""Just enough asyncio HTTP/1.1 for the local proxy and the admin/benchmark tools.
+
+Reading and writing message heads, reading bodies (including chunked transfer
+encoding) and pooled keep-alive client connections to one host. Stdlib only: the
+proxy imports this on every launch.
+"""
+
+import asyncio
+import ssl
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+POOL_MAX_IDLE = 8
+READ_CHUNK_BYTES = 64 * 1024
+
+Headers = list[tuple[str, str]]
+
+
+class UpstreamError(Exception):
+    """The connection failed before a complete response head was read."""
+
+
+def header(headers: Headers, name: str) -> str | None:
+    """The first value of header ``name`` (lower case), or None."""
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def is_chunked(headers: Headers) -> bool:
+    return "chunked" in (header(headers, "transfer-encoding") or "").lower()
+
+
+async def read_head(reader: asyncio.StreamReader) -> tuple[str, Headers] | None:
+    """Read a start line and headers; None on a cleanly closed connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    start = line.decode("latin-1").rstrip("\r\n")
+    headers: Headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers.append((name.strip(), value.strip()))
+    return start, headers
+
+
+async def iter_body(
+    reader: asyncio.StreamReader, headers: Headers, chunk_bytes: int = READ_CHUNK_BYTES
+) -> AsyncIterator[bytes]:
+    """Yield a message body as it arrives, undoing chunked framing.
+
+    Without ``Content-Length`` or chunking the body runs until the connection closes.
+    """
+    if is_chunked(headers):
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            yield (await reader.readexactly(size + 2))[:-2]
+    length = header(headers, "content-length")
+    if length is not None:
+        remaining = int(length)
+        while remaining:
+            data = await reader.read(min(chunk_bytes, remaining))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            remaining -= len(data)
+            yield data
+        return
+    while data := await reader.read(chunk_bytes):
+        yield data
+
+
+async def read_body(reader: asyncio.StreamReader, headers: Headers) -> bytes:
+    """Read a complete request body (no ``Content-Length`` means none)."""
+    if not is_chunked(headers) and header(headers, "content-length") is None:
+        return b""
+    return b"".join([chunk async for chunk in iter_body(reader, headers)])
+
+
+def encode_head(start: str, headers: Headers) -> bytes:
+    lines = [start] + [f"{name}: {value}" for name, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+@dataclass
+class Response:
+    """A response whose head has been read; the body is still on ``reader``."""
+
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    status: str
+    headers: Headers
+
+    @property
+    def code(self) -> int:
+        return int(self.status.split(" ", 2)[1])
+
+
+class ConnectionPool:
+    """Idle keep-alive connections to one host."""
+
+    def __init__(self, host: str, port: int, ssl_context: ssl.SSLContext | None):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    @classmethod
+    def for_url(cls, url: str) -> "ConnectionPool":
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        return cls(
+            parts.hostname or "",
+            parts.port or (443 if https else 80),
+            ssl.create_default_context() if https else None,
+        )
+
+    async def acquire(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        """Return ``(reader, writer, reused)``."""
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl_context
+        )
+        return reader, writer, False
+
+    def release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if len(self._idle) < POOL_MAX_IDLE and not writer.is_closing():
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+    async def send(self, request: bytes) -> Response:
+        """Write the request and read the response head.
+
+        A pooled connection the server has already closed is discarded and the request
+        is retried; a failure on a fresh connection is raised. The caller reads the
+        body and then releases or closes the connection.
+        """
+        while True:
+            reader, writer, reused = await self.acquire()
+            try:
+                writer.write(request)
+                await writer.drain()
+                head = await read_head(reader)
+                if head is None:
+                    raise UpstreamError("connection closed before response")
+                return Response(reader, writer, head[0], head[1])
+            except (OSError, UpstreamError):
+                writer.close()
+                if not reused:
+                    raise
+            except BaseException:
+                # Cancelled, e.g. the losing attempt of a hedged request
+                writer.close()
+                raise
@@ -0,0 +1,78 @@
+"""Reuse of the last Azure AD ID token while it is still fresh.
+
+The Databricks token exchange only needs a valid ID token, and Azure AD issues
+them for about an hour. Keeping the last one and checking its ``exp``/``aud``
+claims locally lets a refresh skip MSAL (and its import) entirely. Claims are
+decoded without signature verification: Databricks validates the token, this only
+decides whether it is worth presenting.
+
+Stdlib only.
+"""
+
+import base64
+import json
+import time
+
+from config.settings import AzureAdConfig
+from credential_helper.token_cache import CACHE_DIR, atomic_write_text
+
+ID_TOKEN_FILE = CACHE_DIR / "id_token.json"
+# Leave time for the exchange itself and for clock skew
+ID_TOKEN_MIN_REMAINING_SECONDS = 300
+
+
+def decode_claims(jwt: str) -> dict:
+    """Return the JWT payload claims, or ``{}`` if ``jwt`` is not a well-formed JWT."""
+    try:
+        payload = jwt.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (IndexError, ValueError):
+        return {}
+    return claims if isinstance(claims, dict) else {}
+
+
+def _key(config: AzureAdConfig) -> str:
+    return f"{config.authority_url}|{config.client_id}"
+
+
+def is_fresh(claims: dict, config: AzureAdConfig, now: float | None = None) -> bool:
+    now = time.time() if now is None else now
+    audience = claims.get("aud")
+    audiences = audience if isinstance(audience, list) else [audience]
+    return (
+        config.client_id in audiences
+        and isinstance(claims.get("exp"), (int, float))
+        and claims["exp"] - ID_TOKEN_MIN_REMAINING_SECONDS > now
+    )
+
+
+def _load() -> dict:
+    try:
+        return json.loads(ID_TOKEN_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def get_fresh_id_token(config: AzureAdConfig) -> str | None:
+    """The last ID token for this authority and client, if it is fresh enough to exchange."""
+    jwt = _load().get(_key(config))
+    if jwt and is_fresh(decode_claims(jwt), config):
+        return jwt
+    return None
+
+
+def save_id_token(config: AzureAdConfig, jwt: str) -> None:
+    tokens = {
+        key: token
+        for key, token in _load().items()
+        if decode_claims(token).get("exp", 0) > time.time()
+    }
+    tokens[_key(config)] = jwt
+    atomic_write_text(ID_TOKEN_FILE, json.dumps(tokens))
+
+
+def clear_id_token(config: AzureAdConfig) -> None:
+    tokens = _load()
+    if tokens.pop(_key(config), None) is not None:
+        atomic_write_text(ID_TOKEN_FILE, json.dumps(tokens))
@@ -0,0 +1,175 @@
+"""Token acquisition: cached token first, then Azure AD login + Databricks exchange.
+
+Only the stdlib is imported on the cache-hit path; ``requests`` is loaded lazily by
+``refresh_token``, and ``msal`` only when no fresh ID token is cached.
+"""
+
+import contextvars
+import dataclasses
+import sys
+import threading
+import time
+
+from config.settings import GatewayConfig
+from credential_helper import timing
+from credential_helper.circuit_breaker import CircuitBreaker
+from credential_helper.id_token import clear_id_token, get_fresh_id_token, save_id_token
+from credential_helper.token_cache import (
+    CachedToken,
+    compute_refresh_at,
+    get_cached_token,
+    refresh_lock,
+    save_token,
+    token_key,
+)
+
+
+def _is_outage(error: BaseException) -> bool:
+    """Network errors, 429 and 5xx count against a circuit breaker; auth errors do not."""
+    import requests
+
+    if isinstance(error, requests.RequestException):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _acquire_jwt(config: GatewayConfig, interactive: bool) -> str:
+    """Log in through MSAL and remember the resulting ID token for later refreshes."""
+    with timing.span("import_msal"):
+        from credential_helper.azure_ad_auth import acquire_token, create_msal_app
+
+    with CircuitBreaker(config.azure_ad.authority_url).guard(_is_outage):
+        app = create_msal_app(config.azure_ad)
+        jwt = acquire_token(app, config.azure_ad.scopes, interactive=interactive)
+    save_id_token(config.azure_ad, jwt)
+    return jwt
+
+
+def refresh_token(config: GatewayConfig, interactive: bool = True) -> CachedToken:
+    """Authenticate via Azure AD, exchange for a Databricks token and cache it.
+
+    A still-fresh cached ID token is exchanged directly, skipping MSAL; if Databricks
+    rejects it, it is dropped and a new one is acquired. Both endpoints go through
+    circuit breakers, so a failing Azure AD or token endpoint raises
+    ``CircuitOpenError`` immediately instead of being retried by every caller.
+    """
+    with timing.span("import_auth"):
+        from credential_helper.token_exchange import TokenExchangeError, exchange_token
+
+    def exchange(jwt: str):
+        with CircuitBreaker(config.token_exchange_url).guard(_is_outage):
+            with timing.span("token_exchange"):
+                return exchange_token(config.token_exchange_url, jwt)
+
+    jwt = get_fresh_id_token(config.azure_ad)
+    db_token = None
+    if jwt is not None:
+        timing.annotate(id_token="cached")
+        try:
+            db_token = exchange(jwt)
+        except TokenExchangeError as e:
+            if _is_outage(e):
+                raise
+            clear_id_token(config.azure_ad)
+    if db_token is None:
+        db_token = exchange(_acquire_jwt(config, interactive))
+
+    issued_at = time.time()
+    cached_token = CachedToken(
+        access_token=db_token.access_token,
+        expires_at=issued_at + db_token.expires_in,
+        token_type=db_token.token_type,
+        refresh_at=compute_refresh_at(
+            issued_at,
+            db_token.expires_in,
+            config.token_cache.refresh_ahead_ratio,
+            config.token_cache.refresh_jitter_ratio,
+        ),
+    )
+    with timing.span("cache_save"):
+        save_token(config.token_cache, cached_token, token_key(config))
+    timing.annotate(outcome="refreshed")
+    return cached_token
+
+
+def _locked_refresh(config: GatewayConfig, interactive: bool = True) -> CachedToken:
+    with refresh_lock():
+        cached = get_cached_token(config.token_cache, token_key(config))
+        if cached and cached.is_valid:
+            timing.annotate(outcome="refreshed_elsewhere")
+            return cached
+        return refresh_token(config, interactive=interactive)
+
+
+def get_token(config: GatewayConfig) -> CachedToken:
+    """Return a valid cached token, refreshing it if needed.
+
+    Refreshes are single-flight across processes: whoever holds the refresh lock
+    logs in, and the others wait for it and then read the token it cached.
+
+    A token inside its expiry buffer but not yet expired is refreshed silently under
+    ``token_cache.refresh_deadline_seconds``; if the deadline passes or the refresh
+    fails, that token is returned with ``stale=True`` (and ``needs_refresh``) so the
+    caller can revalidate in the background.
+    """
+    with timing.span("cache_lookup"):
+        cached = get_cached_token(config.token_cache, token_key(config), allow_stale=True)
+    if cached and cached.is_valid:
+        timing.annotate(outcome="cache_hit")
+        return cached
+    if cached is None:
+        return _locked_refresh(config)
+
+    result: dict = {}
+
+    def run() -> None:
+        try:
+            result["token"] = _locked_refresh(config, interactive=False)
+        except Exception as e:
+            result["error"] = e
+
+    # The worker keeps running past the deadline; a CLI process exiting just drops it
+    context = contextvars.copy_context()
+    worker = threading.Thread(target=context.run, args=(run,), daemon=True)
+    worker.start()
+    worker.join(config.token_cache.refresh_deadline_seconds)
+    if "token" in result:
+        return result["token"]
+    reason = type(result["error"]).__name__ if "error" in result else "deadline"
+    print(f"Serving stale token: refresh {reason}", file=sys.stderr)
+    timing.annotate(outcome="stale", stale_reason=reason)
+    return dataclasses.replace(cached, stale=True, refresh_at=time.time())
+
+
+def refresh_ahead(config: GatewayConfig) -> CachedToken | None:
+    """Renew the cached token without interactive login.
+
+    Returns None without refreshing if another process already holds the refresh lock.
+    """
+    with refresh_lock(wait=False) as acquired:
+        if not acquired:
+            return None
+        cached = get_cached_token(config.token_cache, token_key(config))
+        if cached and not cached.needs_refresh:
+            return cached
+        return refresh_token(config, interactive=False)
+
+
+def spawn_background_refresh(config_path: str | None = None) -> None:
+    """Start a detached ``--refresh-ahead`` helper that renews the cached token.
+
+    The caller keeps using its still-valid token; the helper never opens a browser.
+    """
+    import subprocess
+
+    args = [sys.executable, "-m", "credential_helper", "--refresh-ahead", "--no-daemon"]
+    if config_path:
+        args += ["--config", config_path]
+    subprocess.Popen(
+        args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
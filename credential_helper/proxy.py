@@ -0,0 +1,640 @@
+"""Local token-injecting reverse proxy for Claude Code traffic.
+
+Claude Code talks to ``http://127.0.0.1:<port>`` with the proxy's secret as its
+token. The proxy forwards each request to ``GatewayConfig.base_url`` over a pooled
+keep-alive HTTP/1.1 connection, replacing the credentials with the current
+Databricks token, and relays the response body chunk by chunk so SSE streams are
+not buffered.
+Requests are admitted through local token buckets mirroring the gateway rate
+limits and, with several endpoints configured, routed with failover: each
+conversation sticks to one endpoint (for Anthropic prompt caching), and requests
+without one go by live latency and error rate. With ``response_cache.enabled``,
+repeated ``temperature: 0`` requests are answered from ``response_cache`` and
+identical concurrent ones share one upstream call. With ``hedging.enabled``, a slow
+non-streaming request is raced against a copy on the next endpoint (``hedging``).
+``GET /_gateway/stats`` reports queueing, routing, cache and hedging counters.
+
+Given a per-session secret (``GATEWAY_PROXY_SECRET``; the launcher generates one),
+only clients presenting it as their API token are forwarded, so other local users,
+processes and web pages cannot borrow the Databricks token. Without a secret the
+proxy only listens on loopback.
+
+    GATEWAY_PROXY_SECRET=... uv run python -m credential_helper.proxy [--port 8788]
+
+The launcher runs it with ``--port 0 --print-url --exit-with-parent``.
+"""
+
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import unquote, urlsplit
+
+from config.settings import GatewayConfig
+from credential_helper.daemon import TokenService
+from credential_helper.hedging import Hedger, hedgeable
+from credential_helper.http1 import (
+    ConnectionPool,
+    Headers,
+    Response,
+    UpstreamError,
+    encode_head,
+    header,
+    is_chunked,
+    read_body,
+    read_head,
+)
+from credential_helper.rate_limit import QueueFullError, RateLimiter
+from credential_helper.response_cache import CachedResponse, ResponseCache, ResponseCapture
+from credential_helper.routing import Router, prefix_key
+from credential_helper.token_cache import CachedToken
+
+DEFAULT_PORT = 8788
+RELAY_CHUNK_BYTES = 64 * 1024
+STATS_PATH = "/_gateway/stats"
+PROXY_SECRET_ENV = "GATEWAY_PROXY_SECRET"
+PARENT_POLL_SECONDS = 1.0
+
+# Never forwarded: hop-by-hop headers, headers the proxy rewrites, client credentials.
+_DROP_REQUEST_HEADERS = frozenset(
+    {
+        "connection",
+        "keep-alive",
+        "proxy-authorization",
+        "proxy-connection",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+        "host",
+        "content-length",
+        "authorization",
+        "x-api-key",
+    }
+)
+_DROP_RESPONSE_HEADERS = frozenset({"connection", "keep-alive", "proxy-connection"})
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _authorized(headers: Headers, secret: str | None) -> bool:
+    """Whether the client's ``Authorization: Bearer`` or ``x-api-key`` is ``secret``."""
+    if secret is None:
+        return True
+    presented = [header(headers, "x-api-key") or ""]
+    scheme, _, token = (header(headers, "authorization") or "").partition(" ")
+    if scheme.lower() == "bearer":
+        presented.append(token.strip())
+    return any(hmac.compare_digest(value.encode(), secret.encode()) for value in presented)
+
+
+def _valid_target(target: str) -> bool:
+    """An origin-form path with no dot segments, so it stays under the endpoint path."""
+    return target.startswith("/") and ".." not in unquote(target)
+
+
+class _Upstream:
+    """One serving endpoint: its URL, connection pool, token source and rate limiter."""
+
+    def __init__(self, key: str, base_url: str, service: TokenService, limiter: RateLimiter):
+        upstream = urlsplit(base_url)
+        self.key = key
+        self.netloc = upstream.netloc
+        self.base_path = upstream.path.rstrip("/")
+        self.service = service
+        self.limiter = limiter
+        self.pool = ConnectionPool.for_url(base_url)
+
+    def build_request(
+        self, method: str, target: str, headers: Headers, body: bytes, token: CachedToken
+    ) -> bytes:
+        out_headers = [(k, v) for k, v in headers if k.lower() not in _DROP_REQUEST_HEADERS]
+        out_headers += [
+            ("Host", self.netloc),
+            ("Authorization", f"{token.token_type} {token.access_token}"),
+            ("Content-Length", str(len(body))),
+            ("Connection", "keep-alive"),
+        ]
+        return encode_head(f"{method} {self.base_path}{target} HTTP/1.1", out_headers) + body
+
+
+class _TokenError(Exception):
+    """No Databricks token could be obtained for an endpoint."""
+
+
+def _failed(response: Response) -> bool:
+    """Whether the endpoint throttled or errored, so another one should be tried."""
+    return response.code == 429 or response.code >= 500
+
+
+def _retry_after(headers: Headers) -> float | None:
+    try:
+        return float(header(headers, "retry-after") or "")
+    except ValueError:
+        return None
+
+
+class GatewayProxy:
+    """Forwards local requests to the AI Gateway endpoints with a fresh token.
+
+    With several endpoints configured, each request goes to the best-ranked one and
+    fails over to the next when an endpoint errors, returns 5xx or throttles. With a
+    ``secret``, requests that do not present it are rejected with a 401.
+    """
+
+    def __init__(
+        self,
+        config: GatewayConfig,
+        service: TokenService | None = None,
+        secret: str | None = None,
+    ):
+        self.secret = secret
+        services = {config.host: service or TokenService(config)}
+        self.upstreams: dict[str, _Upstream] = {}
+        for endpoint in config.serving_endpoints:
+            endpoint_config = config.for_endpoint(endpoint)
+            if endpoint_config.host not in services:
+                services[endpoint_config.host] = TokenService(endpoint_config)
+            key = f"{endpoint_config.host}/{endpoint.name}"
+            self.upstreams[key] = _Upstream(
+                key,
+                endpoint_config.base_url,
+                services[endpoint_config.host],
+                RateLimiter(config.rate_limits),
+            )
+        self.router = Router(list(self.upstreams))
+        self.sticky = config.sticky_routing and len(self.upstreams) > 1
+        self.hedger = Hedger(config.hedging) if config.hedging.enabled else None
+        self.cache = (
+            ResponseCache(config.response_cache, config.endpoint_name, config.model)
+            if config.response_cache.enabled
+            else None
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> asyncio.Server:
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    def stats(self) -> dict:
+        stats = {
+            "endpoints": self.router.to_dict(),
+            "sticky": {"pinned": self.router.pinned, "rebalanced": self.router.rebalanced},
+            "rate_limit": {key: u.limiter.stats.to_dict() for key, u in self.upstreams.items()},
+        }
+        if self.cache is not None:
+            stats["response_cache"] = self.cache.to_dict()
+        if self.hedger is not None:
+            stats["hedging"] = self.hedger.to_dict()
+        return stats
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                head = await read_head(reader)
+                if head is None:
+                    break
+                start, headers = head
+                body = await read_body(reader, headers)
+                keep_alive = await self._forward(start, headers, body, writer)
+                if not keep_alive or (header(headers, "connection") or "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _forward(
+        self, start: str, headers: Headers, body: bytes, client: asyncio.StreamWriter
+    ) -> bool:
+        """Answer one request from the cache or upstream; return client keep-alive."""
+        method, target, _ = start.split(" ", 2)
+        if not _authorized(headers, self.secret):
+            await self._send_error(client, 401, "Missing or invalid gateway proxy token")
+            return False
+        if method == "GET" and target == STATS_PATH:
+            await self._send_json(client, 200, self.stats())
+            return True
+        if not _valid_target(target):
+            await self._send_error(client, 400, f"Invalid request target: {target}")
+            return False
+
+        key = self.cache.key(method, target, headers, body) if self.cache else None
+        if key is None:
+            return await self._forward_upstream(method, target, headers, body, client)
+        cached, leader = await self.cache.begin(key)
+        if cached is not None:
+            await self._send_cached(client, cached)
+            return True
+        if not leader:
+            return await self._forward_upstream(method, target, headers, body, client)
+        capture = ResponseCapture()
+        try:
+            keep_alive = await self._forward_upstream(
+                method, target, headers, body, client, capture
+            )
+        except BaseException:
+            self.cache.finish(key, None)
+            raise
+        response = capture.response()
+        self.cache.finish(key, response)
+        if response is not None:
+            await self.cache.store(key, response)
+        return keep_alive
+
+    async def _forward_upstream(
+        self,
+        method: str,
+        target: str,
+        headers: Headers,
+        body: bytes,
+        client: asyncio.StreamWriter,
+        capture: ResponseCapture | None = None,
+    ) -> bool:
+        """Send one request upstream and relay the response; return client keep-alive."""
+        affinity = prefix_key(body) if self.sticky else None
+        candidates = [self.upstreams[key] for key in self.router.ranked(affinity)]
+        hedge = self.hedger is not None and len(candidates) > 1 and hedgeable(method, body)
+        if hedge:
+            self.hedger.admit()
+        request = (method, target, headers, body)
+        tried: list[_Upstream] = []
+        for upstream in candidates:
+            if upstream in tried:
+                continue
+            tried.append(upstream)
+            try:
+                if hedge and len(tried) == 1:
+                    upstream, response = await self._hedged(upstream, candidates[1], tried, request)
+                else:
+                    response = await self._attempt(upstream, request, observe=hedge)
+            except _TokenError as e:
+                if len(tried) == len(candidates):
+                    await self._send_error(client, 503, f"Failed to obtain Databricks token: {e}")
+                    return False
+                continue
+            except QueueFullError as e:
+                if len(tried) == len(candidates):
+                    await self._send_error(client, 429, str(e), retry_after=e.wait)
+                    return False
+                continue
+            except (OSError, UpstreamError) as e:
+                if len(tried) == len(candidates):
+                    await self._send_error(client, 502, f"Upstream request failed: {e}")
+                    return False
+                continue
+            if _failed(response) and len(tried) < len(candidates):
+                response.writer.close()
+                continue
+            return await self._relay(upstream, response, method, client, capture)
+        return False
+
+    async def _attempt(
+        self,
+        upstream: _Upstream,
+        request: tuple[str, str, Headers, bytes],
+        admitted: bool = False,
+        observe: bool = False,
+        sent: asyncio.Event | None = None,
+    ) -> Response:
+        """Send ``request`` to ``upstream`` with a fresh token and read the response head.
+
+        Waits for the rate limiter unless the slot is already ``admitted``, then sets
+        ``sent`` as the request goes out. The outcome is recorded with the router and,
+        when ``observe``, a success's latency with the hedger. Raises
+        ``QueueFullError``, ``_TokenError``, ``OSError`` or ``UpstreamError``.
+        """
+        if not admitted:
+            await upstream.limiter.acquire()
+        try:
+            token = await asyncio.to_thread(upstream.service.get)
+        except Exception as e:
+            raise _TokenError(str(e)) from e
+
+        if sent is not None:
+            sent.set()
+        started = time.monotonic()
+        try:
+            response = await upstream.pool.send(upstream.build_request(*request, token))
+        except (OSError, UpstreamError):
+            self.router.record(upstream.key, time.monotonic() - started, ok=False)
+            raise
+        elapsed = time.monotonic() - started
+        failed = _failed(response)
+        self.router.record(
+            upstream.key,
+            elapsed,
+            ok=not failed,
+            retry_after=_retry_after(response.headers) if failed else None,
+        )
+        if observe and not failed and self.hedger is not None:
+            self.hedger.observe(upstream.key, elapsed)
+        return response
+
+    async def _hedged(
+        self,
+        primary: _Upstream,
+        alternate: _Upstream,
+        tried: list[_Upstream],
+        request: tuple[str, str, Headers, bytes],
+    ) -> tuple[_Upstream, Response]:
+        """Race ``primary`` against a copy sent to ``alternate`` once it is slow.
+
+        The copy goes out (and ``alternate`` joins ``tried``) only if ``primary`` has
+        not answered within its hedge delay of being sent and the hedger allows it. The first
+        successful response wins and the other attempt is cancelled. If every attempt
+        fails, the last failed response is returned, or the last error raised.
+        """
+        sent = asyncio.Event()
+        first = asyncio.ensure_future(self._attempt(primary, request, observe=True, sent=sent))
+        attempts = {first: primary}
+        result: tuple[_Upstream, Response] | None = None
+        error: BaseException | None = None
+        pending = set(attempts)
+        try:
+            delay = self.hedger.delay(primary.key)
+            if delay is not None:
+                # The delay runs from when the request goes out, not while it waits for
+                # the rate limiter and a token
+                waiting = asyncio.ensure_future(sent.wait())
+                try:
+                    await asyncio.wait({first, waiting}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiting.cancel()
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self.hedger.try_hedge(alternate.limiter):
+                    tried.append(alternate)
+                    copy = asyncio.ensure_future(
+                        self._attempt(alternate, request, admitted=True, observe=True)
+                    )
+                    attempts[copy] = alternate
+                    pending.add(copy)
+
+            while pending and (result is None or _failed(result[1])):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    response = task.result()
+                    if result is not None and not _failed(result[1]):
+                        response.writer.close()  # both finished at once; keep the first
+                        continue
+                    if result is not None:
+                        result[1].writer.close()
+                    result = (attempts[task], response)
+        finally:
+            for task in pending:
+                task.cancel()
+            for outcome in await asyncio.gather(*pending, return_exceptions=True):
+                if isinstance(outcome, Response):
+                    outcome.writer.close()
+        if result is None:
+            raise error
+        if result[0] is alternate and not _failed(result[1]):
+            self.hedger.stats.hedge_wins += 1
+        return result
+
+    async def _relay(
+        self,
+        upstream: _Upstream,
+        response: Response,
+        method: str,
+        client: asyncio.StreamWriter,
+        capture: ResponseCapture | None = None,
+    ) -> bool:
+        """Relay the response head and body to the client; return client keep-alive."""
+        code, resp_headers = response.code, response.headers
+        framed = (
+            method == "HEAD"
+            or code in (204, 304)
+            or 100 <= code < 200
+            or is_chunked(resp_headers)
+            or header(resp_headers, "content-length") is not None
+        )
+        client_headers = [
+            (k, v) for k, v in resp_headers if k.lower() not in _DROP_RESPONSE_HEADERS
+        ]
+        client_headers.append(("Connection", "keep-alive" if framed else "close"))
+        client.write(encode_head(response.status, client_headers))
+        if capture is not None:
+            capture.status, capture.headers = response.status, resp_headers
+
+        try:
+            await self._relay_body(response.reader, client, method, code, resp_headers, capture)
+        except BaseException:
+            response.writer.close()
+            raise
+        if capture is not None:
+            capture.complete = True
+        if framed and (header(resp_headers, "connection") or "").lower() != "close":
+            upstream.pool.release(response.reader, response.writer)
+        else:
+            response.writer.close()
+        return framed
+
+    async def _relay_body(
+        self,
+        upstream: asyncio.StreamReader,
+        client: asyncio.StreamWriter,
+        method: str,
+        code: int,
+        headers: Headers,
+        capture: ResponseCapture | None = None,
+    ) -> None:
+        """Copy the response body to the client as it arrives, keeping its framing.
+
+        ``capture`` also receives the (de-chunked) body.
+        """
+        if method == "HEAD" or code in (204, 304) or 100 <= code < 200:
+            await client.drain()
+            return
+        if is_chunked(headers):
+            while True:
+                size_line = await upstream.readline()
+                size = int(size_line.split(b";")[0], 16)
+                client.write(size_line)
+                if size == 0:
+                    while True:
+                        line = await upstream.readline()
+                        client.write(line)
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                    await client.drain()
+                    return
+                chunk = await upstream.readexactly(size + 2)
+                client.write(chunk)
+                if capture is not None:
+                    capture.add(chunk[:-2])
+                await client.drain()
+        length = header(headers, "content-length")
+        if length is not None:
+            remaining = int(length)
+            while remaining:
+                data = await upstream.read(min(RELAY_CHUNK_BYTES, remaining))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                client.write(data)
+                if capture is not None:
+                    capture.add(data)
+                await client.drain()
+                remaining -= len(data)
+            await client.drain()
+            return
+        while data := await upstream.read(RELAY_CHUNK_BYTES):
+            client.write(data)
+            if capture is not None:
+                capture.add(data)
+            await client.drain()
+
+    async def _send_cached(self, client: asyncio.StreamWriter, response: CachedResponse) -> None:
+        client.write(
+            encode_head(
+                response.status,
+                response.headers
+                + [
+                    ("Content-Length", str(len(response.body))),
+                    ("X-Gateway-Cache", "hit"),
+                    ("Connection", "keep-alive"),
+                ],
+            )
+            + response.body
+        )
+        await client.drain()
+
+    async def _send_error(
+        self,
+        client: asyncio.StreamWriter,
+        code: int,
+        message: str,
+        retry_after: float | None = None,
+    ) -> None:
+        error = {"type": "error", "error": {"type": "proxy_error", "message": message}}
+        headers = [] if retry_after is None else [("Retry-After", str(math.ceil(retry_after)))]
+        await self._send_json(client, code, error, keep_alive=False, headers=headers)
+
+    async def _send_json(
+        self,
+        client: asyncio.StreamWriter,
+        code: int,
+        data: dict,
+        keep_alive: bool = True,
+        headers: Headers | None = None,
+    ) -> None:
+        body = json.dumps(data).encode()
+        reason = {
+            200: "OK",
+            400: "Bad Request",
+            401: "Unauthorized",
+            429: "Too Many Requests",
+            502: "Bad Gateway",
+            503: "Service Unavailable",
+        }[code]
+        client.write(
+            encode_head(
+                f"HTTP/1.1 {code} {reason}",
+                [
+                    ("Content-Type", "application/json"),
+                    ("Content-Length", str(len(body))),
+                    ("Connection", "keep-alive" if keep_alive else "close"),
+                ]
+                + (headers or []),
+            )
+            + body
+        )
+        await client.drain()
+
+
+def start_proxy_thread(
+    config: GatewayConfig, host: str = "127.0.0.1", port: int = 0, secret: str | None = None
+) -> str:
+    """Run the proxy on a daemon thread and return its base URL once it is listening."""
+    ready = threading.Event()
+    result: dict = {}
+
+    async def run() -> None:
+        try:
+            server = await GatewayProxy(config, secret=secret).start(host, port)
+        except BaseException as e:
+            result["error"] = e
+            ready.set()
+            raise
+        result["url"] = f"http://{host}:{server.sockets[0].getsockname()[1]}"
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+    ready.wait()
+    if "error" in result:
+        raise result["error"]
+    return result["url"]
+
+
+async def _wait_for_parent_exit(parent_pid: int) -> None:
+    """Return once this process is reparented, i.e. ``parent_pid`` has exited."""
+    while os.getppid() == parent_pid:
+        await asyncio.sleep(PARENT_POLL_SECONDS)
+
+
+def main() -> None:
+    from config.settings import load_config
+
+    parser = argparse.ArgumentParser(description="Local token-injecting proxy for Claude Code")
+    parser.add_argument("--config", help="Path to config.json")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument(
+        "--print-url", action="store_true", help="Print the base URL on stdout once listening"
+    )
+    parser.add_argument(
+        "--exit-with-parent", action="store_true", help="Exit when the parent process exits"
+    )
+    args = parser.parse_args()
+    parent_pid = os.getppid()
+
+    secret = os.environ.get(PROXY_SECRET_ENV) or None
+    if secret is None:
+        if not _is_loopback(args.host):
+            parser.error(f"--host {args.host} is not loopback; set {PROXY_SECRET_ENV} first")
+        print(
+            f"Warning: {PROXY_SECRET_ENV} is not set; any local process can use this proxy",
+            file=sys.stderr,
+        )
+    config = load_config(args.config)
+
+    async def run() -> None:
+        server = await GatewayProxy(config, secret=secret).start(args.host, args.port)
+        url = f"http://{args.host}:{server.sockets[0].getsockname()[1]}"
+        if args.print_url:
+            print(url, flush=True)
+        else:
+            print(f"Gateway proxy listening on {url}", file=sys.stderr)
+        async with server:
+            if args.exit_with_parent:
+                await _wait_for_parent_exit(parent_pid)
+            else:
+                await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Client-side admission control mirroring the AI Gateway rate limits.
+
+Each configured ``RateLimit`` becomes a token bucket. A request that would exceed a
+limit is queued until the bucket refills instead of being sent and rejected with
+a 429, so bursts are smoothed out locally. A request that would queue for longer
+than ``MAX_QUEUE_SECONDS`` is rejected with ``QueueFullError`` instead, and one
+cancelled while queued gives its slot back, so a burst cannot build up debt.
+"""
+
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+
+from config.settings import RateLimit
+
+RENEWAL_PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600}
+MAX_QUEUE_SECONDS = 60.0
+
+
+class QueueFullError(RuntimeError):
+    """Admitting the request would mean queueing for longer than the limiter allows."""
+
+    def __init__(self, wait: float):
+        self.wait = wait
+        super().__init__(f"Rate limit queue is full; next slot in {wait:.0f}s")
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations, so waiters are served in FIFO order."""
+
+    def __init__(self, calls: int, period_seconds: float, clock=time.monotonic):
+        self.capacity = float(calls)
+        self.rate = calls / period_seconds
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds until it is actually available."""
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def available(self) -> bool:
+        """Whether a token could be taken right now without waiting."""
+        self._refill()
+        return self._tokens >= 1
+
+    def wait(self) -> float:
+        """Seconds a reservation made now would wait, without making it."""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def refund(self) -> None:
+        """Give back a reservation that was never used."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+
+@dataclass
+class LimiterStats:
+    admitted: int = 0
+    queued: int = 0
+    rejected: int = 0
+    cancelled: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class RateLimiter:
+    """Admits requests through every configured bucket, waiting as long as the slowest."""
+
+    def __init__(
+        self,
+        limits: list[RateLimit],
+        clock=time.monotonic,
+        max_wait: float = MAX_QUEUE_SECONDS,
+    ):
+        self.max_wait = max_wait
+        self.buckets = {
+            limit.key: TokenBucket(
+                limit.calls, RENEWAL_PERIOD_SECONDS[limit.renewal_period], clock
+            )
+            for limit in limits
+        }
+        self.stats = LimiterStats()
+
+    def reserve(self) -> float:
+        """Reserve a slot in every bucket and return the wait before it may be used."""
+        wait = max((bucket.reserve() for bucket in self.buckets.values()), default=0.0)
+        self.stats.admitted += 1
+        if wait > 0:
+            self.stats.queued += 1
+            self.stats.total_wait_seconds += wait
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, wait)
+        return wait
+
+    def try_reserve(self) -> bool:
+        """Reserve a slot only if every bucket has one free now; never queues."""
+        if not all(bucket.available() for bucket in self.buckets.values()):
+            return False
+        self.reserve()
+        return True
+
+    async def acquire(self) -> float:
+        """Wait until the request may be sent; return the time spent queued.
+
+        Raises ``QueueFullError`` rather than wait longer than ``max_wait``. If the
+        caller is cancelled while queued, the reservation is refunded.
+        """
+        wait = max((bucket.wait() for bucket in self.buckets.values()), default=0.0)
+        if wait > self.max_wait:
+            self.stats.rejected += 1
+            raise QueueFullError(wait)
+        wait = self.reserve()
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                for bucket in self.buckets.values():
+                    bucket.refund()
+                self.stats.cancelled += 1
+                raise
+        return wait
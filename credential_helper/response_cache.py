@@ -0,0 +1,288 @@
+"""Response cache for deterministic gateway requests.
+
+Agents and CI jobs resend byte-identical ``temperature: 0`` requests. With
+``response_cache.enabled``, the proxy answers repeats without going upstream, so
+they cost neither model latency nor rate-limit quota. A request is keyed by a
+SHA-256 over its canonical JSON body (sorted keys, integral floats as ints,
+``metadata`` dropped), the model, the serving endpoint, the request path and the
+``anthropic-*`` headers.
+
+Successful responses are kept in a small in-memory LRU and in
+``~/.databricks-claude-gateway/responses/``, which is bounded by
+``max_disk_bytes`` and ``ttl_seconds``. Identical requests that arrive while the
+first is still upstream wait for it and share its response. They are single-flight
+per proxy, so N concurrent copies make one upstream call.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from config.settings import ResponseCacheConfig
+from credential_helper.token_cache import CACHE_DIR
+
+RESPONSE_CACHE_DIR = CACHE_DIR / "responses"
+# Larger responses are relayed but not cached
+MAX_ENTRY_BYTES = 8 * 1024 * 1024
+# Request headers that change what the model returns
+KEY_HEADERS = ("anthropic-version", "anthropic-beta")
+# Request fields that do not (Claude Code puts a per-session user ID in metadata)
+IGNORED_FIELDS = frozenset({"metadata"})
+# Response headers not stored: framing is rewritten on replay, the rest is per request
+_DROP_RESPONSE_HEADERS = frozenset(
+    {
+        "connection",
+        "keep-alive",
+        "proxy-connection",
+        "content-length",
+        "transfer-encoding",
+        "date",
+        "request-id",
+        "x-request-id",
+    }
+)
+
+Headers = list[tuple[str, str]]
+
+
+def _canonical(value):
+    """``value`` with integral floats as ints, so ``0.0`` and ``0`` hash the same."""
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+@dataclass
+class CachedResponse:
+    status: str
+    headers: Headers
+    body: bytes
+    created: float = field(default_factory=time.time)
+
+    def encode(self) -> bytes:
+        meta = {"status": self.status, "headers": self.headers, "created": self.created}
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> "CachedResponse":
+        meta, _, body = data.partition(b"\n")
+        parsed = json.loads(meta)
+        headers = [(name, value) for name, value in parsed["headers"]]
+        return cls(parsed["status"], headers, body, parsed["created"])
+
+
+class ResponseCapture:
+    """Collects the response the proxy relays, to cache it once it is complete."""
+
+    def __init__(self):
+        self.status = ""
+        self.headers: Headers = []
+        self.complete = False
+        self._chunks: list[bytes] = []
+        self._size = 0
+
+    def add(self, data: bytes) -> None:
+        self._size += len(data)
+        if self._size <= MAX_ENTRY_BYTES:
+            self._chunks.append(data)
+        else:
+            self._chunks.clear()
+
+    def response(self) -> CachedResponse | None:
+        """The response if it is complete, a 200 and small enough to keep."""
+        if not self.complete or self._size > MAX_ENTRY_BYTES:
+            return None
+        if self.status.split(" ", 2)[1:2] != ["200"]:
+            return None
+        headers = [(k, v) for k, v in self.headers if k.lower() not in _DROP_RESPONSE_HEADERS]
+        return CachedResponse(self.status, headers, b"".join(self._chunks))
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    coalesced: int = 0
+    misses: int = 0
+    stored: int = 0
+    evicted: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ResponseCache:
+    """Two-tier cache of deterministic responses plus single-flight for misses."""
+
+    def __init__(
+        self,
+        config: ResponseCacheConfig,
+        endpoint: str,
+        model: str,
+        directory: Path | None = None,
+        clock=time.time,
+    ):
+        self.config = config
+        self.endpoint = endpoint
+        self.model = model
+        self.directory = directory or RESPONSE_CACHE_DIR
+        self._clock = clock
+        self._memory: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        # Disk entries: key -> (created, size), scanned on first use
+        self._disk: dict[str, tuple[float, int]] | None = None
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def key(self, method: str, target: str, headers: Headers, body: bytes) -> str | None:
+        """The cache key for a deterministic request, or None if it must go upstream."""
+        if method != "POST":
+            return None
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict):
+            return None
+        temperature = payload.get("temperature")
+        if isinstance(temperature, bool) or temperature != 0:
+            return None
+        lower = {name.lower(): value for name, value in headers}
+        material = {
+            "endpoint": self.endpoint,
+            "target": target,
+            "model": payload.get("model", self.model),
+            "headers": {name: lower.get(name) for name in KEY_HEADERS},
+            "body": _canonical({k: v for k, v in payload.items() if k not in IGNORED_FIELDS}),
+        }
+        canonical = json.dumps(material, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _fresh(self, response: CachedResponse) -> bool:
+        return self._clock() - response.created < self.config.ttl_seconds
+
+    async def begin(self, key: str) -> tuple[CachedResponse | None, bool]:
+        """Look ``key`` up, waiting for an identical request already upstream.
+
+        Returns ``(response, False)`` on a hit. ``(None, True)`` makes the caller the
+        one request that goes upstream; it must call ``finish``. ``(None, False)``
+        means the request it waited on was not cacheable, so it goes upstream itself.
+        """
+        if key not in self._inflight:
+            response = self._memory.get(key)
+            if response is not None and self._fresh(response):
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return response, False
+            self._memory.pop(key, None)
+            response = await asyncio.to_thread(self._disk_get, key)
+            if response is not None:
+                self.stats.disk_hits += 1
+                self._remember(key, response)
+                return response, False
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(pending), False
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        self.stats.misses += 1
+        return None, True
+
+    def finish(self, key: str, response: CachedResponse | None) -> None:
+        """Hand the upstream response (None if not cacheable) to the waiting requests."""
+        pending = self._inflight.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(response)
+        if response is not None:
+            self._remember(key, response)
+
+    async def store(self, key: str, response: CachedResponse) -> None:
+        """Write a finished response to the disk tier."""
+        await asyncio.to_thread(self._disk_put, key, response)
+        self.stats.stored += 1
+
+    def _remember(self, key: str, response: CachedResponse) -> None:
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    def _index(self) -> dict[str, tuple[float, int]]:
+        if self._disk is None:
+            self._disk = {}
+            if self.directory.exists():
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(".bin"):
+                        stat = entry.stat()
+                        self._disk[entry.name[:-4]] = (stat.st_mtime, stat.st_size)
+            self._disk_bytes = sum(size for _, size in self._disk.values())
+        return self._disk
+
+    def _disk_get(self, key: str) -> CachedResponse | None:
+        try:
+            response = CachedResponse.decode(self._path(key).read_bytes())
+        except (OSError, ValueError, KeyError):
+            return None
+        if self._fresh(response):
+            return response
+        with self._disk_lock:
+            self._drop(key)
+        return None
+
+    def _disk_put(self, key: str, response: CachedResponse) -> None:
+        data = response.encode()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._disk_lock:
+            index = self._index()
+            self._disk_bytes += len(data) - index.get(key, (0.0, 0))[1]
+            index[key] = (response.created, len(data))
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the oldest until the tier fits ``max_disk_bytes``."""
+        index = self._index()
+        expired_before = self._clock() - self.config.ttl_seconds
+        for key in [k for k, (created, _) in index.items() if created < expired_before]:
+            self._drop(key)
+        if self._disk_bytes <= self.config.max_disk_bytes:
+            return
+        for key in sorted(index, key=lambda k: index[k][0]):
+            if self._disk_bytes <= self.config.max_disk_bytes:
+                break
+            self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        index = self._index()
+        if key in index:
+            self._disk_bytes -= index.pop(key)[1]
+            self.stats.evicted += 1
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def to_dict(self) -> dict:
+        return {**self.stats.to_dict(), "memory_entries": len(self._memory)}
@@ -0,0 +1,139 @@
+"""Latency-aware routing across serving endpoints.
+
+Each endpoint keeps an EWMA of its response latency and error rate. Requests go to
+the endpoint with the best score; an endpoint that returns 5xx or throttles is put
+in a cooldown and only used again when every other endpoint is cooling down too.
+
+Anthropic prompt caching only pays off if a conversation keeps reaching the same
+backend. A request with a ``prefix_key`` (a hash of its tools, system prompt and
+first message) is therefore pinned by consistent hashing, whatever the latencies:
+each endpoint owns ``RING_REPLICAS`` points on a hash ring and the conversation
+goes to the first endpoint clockwise of its key. It moves only while that endpoint
+cools down, and only to the next endpoint on the ring, so other conversations stay
+where their caches are.
+"""
+
+import bisect
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+
+EWMA_ALPHA = 0.2
+ERROR_PENALTY = 10.0  # a 100% error rate scores like 11x the latency
+COOLDOWN_SECONDS = 5.0
+MAX_COOLDOWN_SECONDS = 60.0
+RING_REPLICAS = 64
+# Leading messages hashed with the tools and system prompt to identify a conversation
+PREFIX_MESSAGES = 1
+
+
+def _ring_hash(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+
+
+def prefix_key(body: bytes) -> str | None:
+    """A stable hash of a Messages request's cacheable prefix, or None if it has none.
+
+    Requests from one conversation share it, because later turns only append messages.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get("messages"), list):
+        return None
+    messages = payload["messages"][:PREFIX_MESSAGES]
+    if not messages:
+        return None
+    prefix = [payload.get("model"), payload.get("tools"), payload.get("system"), messages]
+    canonical = json.dumps(prefix, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+@dataclass
+class EndpointStats:
+    latency: float = 0.0
+    error_rate: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    cooldown_until: float = 0.0
+
+    @property
+    def score(self) -> float:
+        return self.latency * (1 + ERROR_PENALTY * self.error_rate)
+
+    def to_dict(self) -> dict:
+        return {
+            "latency_ms": round(self.latency * 1000, 1),
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class Router:
+    """Ranks endpoint keys by live latency and error rate."""
+
+    def __init__(self, keys: list[str], alpha: float = EWMA_ALPHA, clock=time.monotonic):
+        self.alpha = alpha
+        self._clock = clock
+        self.stats = {key: EndpointStats() for key in keys}
+        ring = sorted((_ring_hash(f"{key}#{i}"), key) for key in keys for i in range(RING_REPLICAS))
+        self._ring_points = [point for point, _ in ring]
+        self._ring_keys = [key for _, key in ring]
+        self.pinned = 0
+        self.rebalanced = 0
+
+    def ranked(self, affinity: str | None = None) -> list[str]:
+        """All keys, best first; endpoints cooling down go last.
+
+        Endpoints with no samples score 0, so each is tried before it is judged.
+        With an ``affinity`` (a ``prefix_key``), healthy endpoints are ordered by the
+        hash ring instead of by score.
+        """
+        now = self._clock()
+        if affinity is not None:
+            order = self._ring_order(affinity)
+            ranked = sorted(order, key=lambda k: self.stats[k].cooldown_until > now)
+            if ranked[0] == order[0]:
+                self.pinned += 1
+            else:
+                self.rebalanced += 1
+            return ranked
+        return sorted(
+            self.stats,
+            key=lambda k: (self.stats[k].cooldown_until > now, self.stats[k].score),
+        )
+
+    def _ring_order(self, affinity: str) -> list[str]:
+        """Every key, in the order met walking the ring clockwise from ``affinity``."""
+        start = bisect.bisect(self._ring_points, _ring_hash(affinity))
+        order: list[str] = []
+        for i in range(len(self._ring_keys)):
+            key = self._ring_keys[(start + i) % len(self._ring_keys)]
+            if key not in order:
+                order.append(key)
+                if len(order) == len(self.stats):
+                    break
+        return order
+
+    def record(
+        self, key: str, latency: float, ok: bool, retry_after: float | None = None
+    ) -> None:
+        """Fold one response into the endpoint's EWMAs; failures start a cooldown."""
+        stats = self.stats[key]
+        if stats.requests == 0:
+            stats.latency = latency
+            stats.error_rate = 0.0 if ok else 1.0
+        else:
+            stats.latency += self.alpha * (latency - stats.latency)
+            stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+        stats.requests += 1
+        if not ok:
+            stats.failures += 1
+            cooldown = retry_after if retry_after is not None else COOLDOWN_SECONDS
+            stats.cooldown_until = self._clock() + min(cooldown, MAX_COOLDOWN_SECONDS)
+
+    def to_dict(self) -> dict:
+        return {key: stats.to_dict() for key, stats in self.stats.items()}
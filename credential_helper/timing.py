@@ -0,0 +1,325 @@
+"""Phase timing for credential acquisition.
+
+Code marks phases with ``span("name")``; spans are only recorded inside a
+``collect()`` block, which the CLI opens once per invocation. At the end the CLI
+appends one JSON line per invocation to a size-rotated metrics file and, when
+``OTEL_EXPORTER_OTLP_ENDPOINT`` is set, spools the spans as an OTLP/HTTP JSON trace.
+The CLI never waits on the collector: the credential daemon sends the spool every
+``OTLP_EXPORT_INTERVAL_SECONDS``, or ``--export-otlp`` sends it once.
+
+Metrics files from many machines can be concatenated and summarized per phase:
+
+    python -m credential_helper.timing [metrics.jsonl ...]
+    python -m credential_helper.timing --export-otlp
+
+Stdlib only: this runs on the cache-hit path.
+"""
+
+import json
+import math
+import os
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+CACHE_DIR = Path.home() / ".databricks-claude-gateway"
+METRICS_FILE = CACHE_DIR / "metrics.jsonl"
+METRICS_MAX_BYTES = 1_000_000
+METRICS_BACKUPS = 3
+OTLP_SPOOL_FILE = CACHE_DIR / "otlp_spool.jsonl"
+OTLP_TIMEOUT_SECONDS = 2.0
+OTLP_EXPORT_INTERVAL_SECONDS = 60.0
+SERVICE_NAME = "databricks-claude-gateway.credential_helper"
+
+
+@dataclass
+class Span:
+    name: str
+    start_ns: int
+    duration_ms: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class Collector:
+    spans: list[Span] = field(default_factory=list)
+    attributes: dict = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.time_ns)
+    start: float = field(default_factory=time.perf_counter)
+
+    def phases(self) -> dict[str, float]:
+        """Total milliseconds per phase name, in first-seen order."""
+        totals: dict[str, float] = {}
+        for s in self.spans:
+            totals[s.name] = round(totals.get(s.name, 0.0) + s.duration_ms, 3)
+        return totals
+
+    def record(self) -> dict:
+        return {
+            "ts": round(self.start_ns / 1e9, 3),
+            **self.attributes,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "phases": self.phases(),
+        }
+
+
+_collector: ContextVar[Collector | None] = ContextVar("credential_helper_timing", default=None)
+
+
+@contextmanager
+def collect(**attributes) -> Iterator[Collector]:
+    """Record spans opened in this context (threads started inside it are not included)."""
+    collector = Collector(attributes=dict(attributes))
+    reset = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(reset)
+
+
+def annotate(**attributes) -> None:
+    """Attach attributes (command, outcome, ...) to the current invocation's record."""
+    collector = _collector.get()
+    if collector is not None:
+        collector.attributes.update(attributes)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as phase ``name``; a no-op outside ``collect()``."""
+    collector = _collector.get()
+    if collector is None:
+        yield
+        return
+    s = Span(name=name, start_ns=time.time_ns())
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        s.duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        collector.spans.append(s)
+
+
+def _rotate(path: Path, backups: int) -> None:
+    for i in range(backups - 1, 0, -1):
+        older = path.with_name(f"{path.name}.{i}")
+        if older.exists():
+            os.replace(older, path.with_name(f"{path.name}.{i + 1}"))
+    os.replace(path, path.with_name(f"{path.name}.1"))
+
+
+def write_record(
+    record: dict,
+    path: Path | None = None,
+    max_bytes: int = METRICS_MAX_BYTES,
+    backups: int = METRICS_BACKUPS,
+) -> None:
+    """Append ``record`` as one JSON line, rotating the file once it exceeds ``max_bytes``."""
+    path = path or METRICS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if path.stat().st_size >= max_bytes:
+            _rotate(path, backups)
+    except FileNotFoundError:
+        pass
+    # A single O_APPEND write keeps lines from concurrent helpers intact
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, (json.dumps(record, separators=(",", ":")) + "\n").encode())
+    finally:
+        os.close(fd)
+
+
+def _otlp_payload(collector: Collector) -> dict:
+    trace_id = os.urandom(16).hex()
+    root_id = os.urandom(8).hex()
+    end_ns = collector.start_ns + int((time.perf_counter() - collector.start) * 1e9)
+
+    def attributes(values: dict) -> list[dict]:
+        return [{"key": k, "value": {"stringValue": str(v)}} for k, v in values.items()]
+
+    spans = [
+        {
+            "traceId": trace_id,
+            "spanId": root_id,
+            "name": "credential_helper",
+            "kind": 1,
+            "startTimeUnixNano": str(collector.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": attributes(collector.attributes),
+        }
+    ]
+    for s in collector.spans:
+        spans.append(
+            {
+                "traceId": trace_id,
+                "spanId": os.urandom(8).hex(),
+                "parentSpanId": root_id,
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.start_ns + int(s.duration_ms * 1e6)),
+                "status": {"code": 2, "message": s.error} if s.error else {},
+            }
+        )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def otlp_url() -> str | None:
+    """The OTLP/HTTP traces endpoint from the standard variables, if one is set."""
+    url = os.environ.get("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")
+    if url:
+        return url
+    base = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+    return f"{base.rstrip('/')}/v1/traces" if base else None
+
+
+def post_otlp(payload: dict, url: str) -> None:
+    """POST an OTLP/HTTP JSON traces payload."""
+    import urllib.request
+
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=OTLP_TIMEOUT_SECONDS) as response:
+        response.read()
+
+
+def export_spool(url: str, path: Path | None = None) -> int:
+    """Send the spooled traces to ``url`` in one request; return how many were sent.
+
+    The spool is renamed aside first, so helpers keep appending to a fresh file. A
+    batch that fails to send stays aside and goes first on the next export, then the
+    spool's rotated backup, then the spool itself.
+    """
+    path = path or OTLP_SPOOL_FILE
+    sending = path.with_name(f"{path.name}.sending")
+    sent = 0
+    for source in (None, path.with_name(f"{path.name}.1"), path):
+        if source is None:
+            if not sending.exists():
+                continue
+        else:
+            try:
+                os.replace(source, sending)
+            except FileNotFoundError:
+                continue
+        payloads = list(read_records([sending]))
+        if payloads:
+            spans = [rs for payload in payloads for rs in payload.get("resourceSpans", [])]
+            post_otlp({"resourceSpans": spans}, url)
+        sending.unlink()
+        sent += len(payloads)
+    return sent
+
+
+def emit(collector: Collector) -> None:
+    """Write the invocation's record locally and spool it for OTLP if configured.
+
+    Nothing here touches the network. Metrics must never break credential
+    acquisition, so failures are only reported.
+    """
+    try:
+        write_record(collector.record())
+    except OSError as e:
+        print(f"credential_helper: could not write metrics: {e}", file=sys.stderr)
+    if otlp_url():
+        try:
+            write_record(_otlp_payload(collector), OTLP_SPOOL_FILE, backups=1)
+        except OSError as e:
+            print(f"credential_helper: could not spool OTLP trace: {e}", file=sys.stderr)
+
+
+def format_breakdown(collector: Collector) -> str:
+    record = collector.record()
+    lines = [f"{name:<24}{ms:>10.1f} ms" for name, ms in record["phases"].items()]
+    lines.append(f"{'total':<24}{record['total_ms']:>10.1f} ms")
+    for name in ("outcome", "keyring", "error"):
+        if name in record:
+            lines.append(f"{name:<24}{record[name]:>13}")
+    return "\n".join(lines)
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(records: Iterable[dict]) -> dict[str, dict]:
+    """Count, p50 and p99 (ms) per phase, plus ``total``, across many invocation records."""
+    samples: dict[str, list[float]] = {}
+    for record in records:
+        for name, ms in record.get("phases", {}).items():
+            samples.setdefault(name, []).append(ms)
+        if "total_ms" in record:
+            samples.setdefault("total", []).append(record["total_ms"])
+    summary = {}
+    for name, values in samples.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": _percentile(values, 0.5),
+            "p99_ms": _percentile(values, 0.99),
+        }
+    return summary
+
+
+def read_records(paths: Iterable[Path]) -> Iterator[dict]:
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line torn by a crash mid-write
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize credential helper phase timings")
+    parser.add_argument(
+        "files", nargs="*", type=Path, help="metrics.jsonl files (default: this machine's)"
+    )
+    parser.add_argument(
+        "--export-otlp",
+        action="store_true",
+        help="Send spooled traces to OTEL_EXPORTER_OTLP_ENDPOINT and exit",
+    )
+    args = parser.parse_args()
+
+    if args.export_otlp:
+        url = otlp_url()
+        if url is None:
+            parser.error("OTEL_EXPORTER_OTLP_ENDPOINT is not set")
+        print(f"Exported {export_spool(url)} traces to {url}", file=sys.stderr)
+        return
+
+    paths = args.files or sorted(
+        p for p in METRICS_FILE.parent.glob(f"{METRICS_FILE.name}*") if p.is_file()
+    )
+    print(json.dumps(summarize(read_records(paths)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
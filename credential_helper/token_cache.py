@@ -1,17 +1,45 @@
-"""Token caching with keyring and file fallback."""
+"""Token caching with keyring and file fallback.
 
+Tokens are keyed by ``token_key`` (workspace host, Azure tenant, client ID and
+scopes), so switching workspace or identity keeps the other tokens. Each backend
+holds at most ``TokenCacheConfig.capacity`` tokens and evicts the least recently
+refreshed one.
+"""
+
+import hashlib
 import json
+import os
+import random
+import tempfile
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
+from typing import TypeVar
 
-from config.settings import TokenCacheConfig
+from config.settings import GatewayConfig, TokenCacheConfig
+from credential_helper import timing
 
 CACHE_DIR = Path.home() / ".databricks-claude-gateway"
 CACHE_FILE = CACHE_DIR / "token_cache.json"
+LOCK_FILE = CACHE_DIR / "refresh.lock"
+# When each token's next refresh-ahead may start, so a failing one is not retried per call
+REFRESH_ATTEMPTS_FILE = CACHE_DIR / "refresh_attempts.json"
+REFRESH_RETRY_SECONDS = 120.0
 KEYRING_SERVICE = "databricks-claude-gateway"
-KEYRING_KEY = "databricks_token"
+KEYRING_INDEX_KEY = "index"
+KEYRING_HEALTH_FILE = CACHE_DIR / "keyring_health.json"
+# How long a slow or broken keyring is skipped before it is probed again
+KEYRING_HEALTH_TTL_SECONDS = 3600
+FILE_FORMAT_VERSION = 2
 EXPIRY_BUFFER_SECONDS = 300  # 5 minutes
+# A token inside the expiry buffer may still be served stale while this much life remains
+STALE_MIN_REMAINING_SECONDS = 30
+LOCK_TIMEOUT_SECONDS = 600  # long enough for an interactive browser login
+LOCK_POLL_SECONDS = 0.1
 
 
 @dataclass
@@ -19,16 +47,30 @@ class CachedToken:
     access_token: str
     expires_at: float
     token_type: str = "Bearer"
+    refresh_at: float | None = None
+    # Served past its expiry buffer because a refresh missed the deadline; not persisted
+    stale: bool = False
 
     @property
     def is_valid(self) -> bool:
         return time.time() < (self.expires_at - EXPIRY_BUFFER_SECONDS)
 
+    @property
+    def is_usable(self) -> bool:
+        """Still accepted by Databricks for a little while, even if no longer ``is_valid``."""
+        return time.time() < (self.expires_at - STALE_MIN_REMAINING_SECONDS)
+
+    @property
+    def needs_refresh(self) -> bool:
+        """True once the token is past its (jittered) refresh-ahead point."""
+        return self.refresh_at is not None and time.time() >= self.refresh_at
+
     def to_dict(self) -> dict:
         return {
             "access_token": self.access_token,
             "expires_at": self.expires_at,
             "token_type": self.token_type,
+            "refresh_at": self.refresh_at,
         }
 
     @classmethod
@@ -37,14 +79,283 @@ class CachedToken:
             access_token=data["access_token"],
             expires_at=data["expires_at"],
             token_type=data.get("token_type", "Bearer"),
+            refresh_at=data.get("refresh_at"),
         )
 
 
-def _try_keyring_get() -> CachedToken | None:
+def compute_refresh_at(
+    issued_at: float, expires_in: float, ratio: float, jitter_ratio: float
+) -> float:
+    """Pick when to start refreshing a token issued at ``issued_at``.
+
+    The jitter is drawn once per token so a fleet that logged in together spreads
+    its refreshes out instead of hitting the token endpoint at the same moment.
+    """
+    jitter = random.uniform(0, expires_in * jitter_ratio)
+    latest = issued_at + expires_in - EXPIRY_BUFFER_SECONDS
+    return min(issued_at + expires_in * ratio - jitter, latest)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write ``text`` to a temp file next to ``path`` and rename it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
     try:
-        import keyring
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+@contextmanager
+def refresh_lock(
+    wait: bool = True,
+    timeout: float = LOCK_TIMEOUT_SECONDS,
+    lock_file: Path | None = None,
+    phase: str = "lock_wait",
+) -> Iterator[bool]:
+    """Hold the cross-process token refresh lock (or another lock given ``lock_file``).
+
+    Yields True once the lock is held, or False straight away if ``wait`` is False and
+    another process holds it. Without ``fcntl`` (Windows) no lock is taken. Time spent
+    waiting is recorded as timing phase ``phase``.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield True
+        return
+
+    lock_file = lock_file or LOCK_FILE
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_file, "a") as f:
+        deadline = time.monotonic() + timeout
+        with timing.span(phase):
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except BlockingIOError:
+                    if not wait:
+                        acquired = False
+                        break
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"Timed out waiting for token refresh lock {lock_file}")
+                    time.sleep(LOCK_POLL_SECONDS)
+        if not acquired:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def claim_refresh_attempt(key: str) -> bool:
+    """Record a refresh-ahead attempt for ``key`` unless one started recently.
+
+    Returns False while an earlier attempt, from any process, is inside its jittered
+    ``REFRESH_RETRY_SECONDS`` back-off; the caller keeps serving its current token.
+    A successful refresh moves the token's ``refresh_at`` forward, so this only holds
+    back retries of a refresh that failed (e.g. silent login needs interaction).
+    """
+    now = time.time()
+    try:
+        attempts = json.loads(REFRESH_ATTEMPTS_FILE.read_text())
+    except (OSError, ValueError):
+        attempts = {}
+    if not isinstance(attempts, dict):
+        attempts = {}
+    attempts = {k: t for k, t in attempts.items() if isinstance(t, (int, float)) and t > now}
+    if key in attempts:
+        return False
+    attempts[key] = now + random.uniform(REFRESH_RETRY_SECONDS / 2, REFRESH_RETRY_SECONDS)
+    try:
+        atomic_write_text(REFRESH_ATTEMPTS_FILE, json.dumps(attempts))
+    except OSError:
+        pass
+    return True
+
+
+def token_key(config: GatewayConfig) -> str:
+    """Cache key for the token ``config`` would obtain: host, tenant, client ID, scopes."""
+    azure_ad = config.azure_ad
+    scopes = " ".join(sorted(azure_ad.scopes))
+    return "|".join([config.host, azure_ad.tenant_id, azure_ad.client_id, scopes])
+
+
+def _keyring_slot(key: str) -> str:
+    return "token-" + hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+class TokenStore:
+    """LRU map of cache key to token with O(1) lookup, bounded by ``capacity``."""
+
+    def __init__(self, capacity: int, tokens: dict[str, CachedToken] | None = None):
+        self.capacity = capacity
+        self._tokens: OrderedDict[str, CachedToken] = OrderedDict(tokens or {})
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def keys(self) -> list[str]:
+        """Keys from least to most recently used."""
+        return list(self._tokens)
+
+    def get(self, key: str) -> CachedToken | None:
+        token = self._tokens.get(key)
+        if token is not None:
+            self._tokens.move_to_end(key)
+        return token
+
+    def put(self, key: str, token: CachedToken) -> list[str]:
+        """Insert or refresh ``key``; return the keys evicted to stay within capacity."""
+        self._tokens[key] = token
+        self._tokens.move_to_end(key)
+        evicted = []
+        while len(self._tokens) > self.capacity:
+            evicted.append(self._tokens.popitem(last=False)[0])
+        return evicted
+
+    def remove(self, key: str) -> bool:
+        return self._tokens.pop(key, None) is not None
+
+    def to_dict(self) -> dict:
+        return {
+            "version": FILE_FORMAT_VERSION,
+            "tokens": {key: token.to_dict() for key, token in self._tokens.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, capacity: int) -> "TokenStore":
+        if data.get("version") != FILE_FORMAT_VERSION:
+            return cls(capacity)  # single-token cache from before keying; re-login once
+        tokens = {k: CachedToken.from_dict(v) for k, v in data.get("tokens", {}).items()}
+        return cls(capacity, tokens)
+
+
+# Parsed token_cache.json, reused while the file is unchanged (daemon, proxy). Every
+# write renames a new file into place, so its inode changes even when a coarse mtime
+# does not.
+_file_store: tuple[Path, tuple[int, int], TokenStore] | None = None
 
-        raw = keyring.get_password(KEYRING_SERVICE, KEYRING_KEY)
+
+def _file_version(stat: os.stat_result) -> tuple[int, int]:
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _load_file_store(capacity: int) -> TokenStore:
+    global _file_store
+    try:
+        version = _file_version(CACHE_FILE.stat())
+    except FileNotFoundError:
+        return TokenStore(capacity)
+    if _file_store is not None and _file_store[:2] == (CACHE_FILE, version):
+        store = _file_store[2]
+        store.capacity = capacity
+        return store
+    store = TokenStore.from_dict(json.loads(CACHE_FILE.read_text()), capacity)
+    _file_store = (CACHE_FILE, version, store)
+    return store
+
+
+def _write_file_store(store: TokenStore) -> None:
+    global _file_store
+    atomic_write_text(CACHE_FILE, json.dumps(store.to_dict()))
+    _file_store = (CACHE_FILE, _file_version(CACHE_FILE.stat()), store)
+
+
+T = TypeVar("T")
+
+
+class KeyringUnavailable(Exception):
+    """The keyring is memoized as slow/broken, timed out, or raised."""
+
+
+# Memoized keyring health: {"status": "available" | "slow" | "broken", "checked_at": ...}
+_keyring_health: dict | None = None
+
+
+def keyring_health() -> dict:
+    """The last recorded keyring health (``{}`` if never probed)."""
+    global _keyring_health
+    if _keyring_health is None:
+        try:
+            _keyring_health = json.loads(KEYRING_HEALTH_FILE.read_text())
+        except (OSError, ValueError):
+            _keyring_health = {}
+    return _keyring_health
+
+
+def _record_keyring_health(status: str, elapsed_ms: float, error: str | None = None) -> None:
+    global _keyring_health
+    previous = keyring_health()
+    _keyring_health = {"status": status, "checked_at": time.time(), "elapsed_ms": elapsed_ms}
+    if error:
+        _keyring_health["error"] = error
+    timing.annotate(keyring=status)
+    # An available keyring is the common case; only write when the verdict changes
+    if previous.get("status") != status or status != "available":
+        try:
+            atomic_write_text(KEYRING_HEALTH_FILE, json.dumps(_keyring_health))
+        except OSError:
+            pass
+
+
+def _keyring_skipped() -> bool:
+    health = keyring_health()
+    return (
+        health.get("status") in ("slow", "broken")
+        and time.time() - health.get("checked_at", 0) < KEYRING_HEALTH_TTL_SECONDS
+    )
+
+
+def _keyring_call(op: Callable[..., T], timeout: float, phase: str) -> T:
+    """Run ``op(keyring)`` on a daemon thread, giving up after ``timeout`` seconds.
+
+    A hung D-Bus/Secret Service call is left behind on its thread; the verdict is
+    memoized so later invocations skip the keyring until the health TTL expires.
+    """
+    if _keyring_skipped():
+        timing.annotate(keyring="skipped")
+        raise KeyringUnavailable(f"keyring marked {keyring_health()['status']}")
+
+    result: dict = {}
+
+    def run() -> None:
+        try:
+            import keyring
+
+            result["value"] = op(keyring)
+        except Exception as e:
+            result["error"] = e
+
+    start = time.perf_counter()
+    with timing.span(phase):
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        worker.join(timeout)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    if worker.is_alive():
+        _record_keyring_health("slow", elapsed_ms)
+        raise KeyringUnavailable(f"keyring did not answer within {timeout}s")
+    if "error" in result:
+        _record_keyring_health("broken", elapsed_ms, repr(result["error"]))
+        raise KeyringUnavailable(str(result["error"])) from result["error"]
+    _record_keyring_health("available", elapsed_ms)
+    return result["value"]
+
+
+def _try_keyring_get(key: str, timeout: float) -> CachedToken | None:
+    try:
+        raw = _keyring_call(
+            lambda keyring: keyring.get_password(KEYRING_SERVICE, _keyring_slot(key)),
+            timeout,
+            "keyring_get",
+        )
         if raw:
             return CachedToken.from_dict(json.loads(raw))
     except Exception:
@@ -52,66 +363,107 @@ def _try_keyring_get() -> CachedToken | None:
     return None
 
 
-def _try_keyring_set(token: CachedToken) -> bool:
-    try:
-        import keyring
+def _keyring_index(keyring) -> list[str]:
+    raw = keyring.get_password(KEYRING_SERVICE, KEYRING_INDEX_KEY)
+    return json.loads(raw) if raw else []
 
-        keyring.set_password(KEYRING_SERVICE, KEYRING_KEY, json.dumps(token.to_dict()))
+
+def _delete_slots(keyring, slots: list[str]) -> None:
+    for slot in slots:
+        try:
+            keyring.delete_password(KEYRING_SERVICE, slot)
+        except Exception:
+            pass  # already gone
+
+
+def _try_keyring_set(key: str, token: CachedToken, capacity: int, timeout: float) -> bool:
+    """Store ``token`` and update the LRU index entry, deleting evicted slots."""
+
+    def store(keyring) -> None:
+        slot = _keyring_slot(key)
+        index = [s for s in _keyring_index(keyring) if s != slot] + [slot]
+        evicted, index = index[:-capacity], index[-capacity:]
+        keyring.set_password(KEYRING_SERVICE, slot, json.dumps(token.to_dict()))
+        keyring.set_password(KEYRING_SERVICE, KEYRING_INDEX_KEY, json.dumps(index))
+        _delete_slots(keyring, evicted)
+
+    try:
+        _keyring_call(store, timeout, "keyring_set")
         return True
     except Exception:
         return False
 
 
-def _try_keyring_delete() -> bool:
-    try:
-        import keyring
+def _try_keyring_delete(key: str | None, timeout: float) -> bool:
+    def delete(keyring) -> None:
+        index = _keyring_index(keyring)
+        slots = index if key is None else [_keyring_slot(key)]
+        _delete_slots(keyring, slots)
+        remaining = [s for s in index if s not in slots]
+        if remaining:
+            keyring.set_password(KEYRING_SERVICE, KEYRING_INDEX_KEY, json.dumps(remaining))
+        else:
+            _delete_slots(keyring, [KEYRING_INDEX_KEY])
 
-        keyring.delete_password(KEYRING_SERVICE, KEYRING_KEY)
+    try:
+        _keyring_call(delete, timeout, "keyring_delete")
         return True
     except Exception:
         return False
 
 
-def _file_get() -> CachedToken | None:
-    if not CACHE_FILE.exists():
-        return None
-    data = json.loads(CACHE_FILE.read_text())
-    return CachedToken.from_dict(data)
+def _file_get(key: str, capacity: int) -> CachedToken | None:
+    with timing.span("file_get"):
+        return _load_file_store(capacity).get(key)
+
 
+def _file_set(key: str, token: CachedToken, capacity: int) -> None:
+    store = _load_file_store(capacity)
+    store.put(key, token)
+    _write_file_store(store)
 
-def _file_set(token: CachedToken) -> None:
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    CACHE_FILE.write_text(json.dumps(token.to_dict()))
 
+def _file_delete(key: str | None, capacity: int) -> None:
+    global _file_store
+    if key is None:
+        if CACHE_FILE.exists():
+            CACHE_FILE.unlink()
+        _file_store = None
+        return
+    store = _load_file_store(capacity)
+    if store.remove(key):
+        _write_file_store(store)
 
-def _file_delete() -> None:
-    if CACHE_FILE.exists():
-        CACHE_FILE.unlink()
 
+def get_cached_token(
+    config: TokenCacheConfig, key: str, allow_stale: bool = False
+) -> CachedToken | None:
+    """Get the cached token for ``key`` (see ``token_key``) if one exists and is valid.
 
-def get_cached_token(config: TokenCacheConfig) -> CachedToken | None:
-    """Get a cached token if one exists and is valid."""
+    With ``allow_stale``, a token inside the expiry buffer is returned while it is
+    still ``is_usable``; check ``is_valid`` to tell the two apart.
+    """
     token = None
     if config.method == "keyring":
-        token = _try_keyring_get()
+        token = _try_keyring_get(key, config.keyring_timeout_seconds)
     if token is None and config.fallback == "file":
-        token = _file_get()
-    if token and not token.is_valid:
+        token = _file_get(key, config.capacity)
+    if token and not (token.is_usable if allow_stale else token.is_valid):
         return None
     return token
 
 
-def save_token(config: TokenCacheConfig, token: CachedToken) -> None:
-    """Save a token to the cache."""
+def save_token(config: TokenCacheConfig, token: CachedToken, key: str) -> None:
+    """Save a token to the cache under ``key``."""
     if config.method == "keyring":
-        if _try_keyring_set(token):
+        if _try_keyring_set(key, token, config.capacity, config.keyring_timeout_seconds):
             return
     if config.fallback == "file" or config.method == "file":
-        _file_set(token)
+        _file_set(key, token, config.capacity)
 
 
-def clear_cache(config: TokenCacheConfig) -> None:
-    """Clear all cached tokens."""
+def clear_cache(config: TokenCacheConfig, key: str | None = None) -> None:
+    """Clear the cached token for ``key``, or all cached tokens."""
     if config.method == "keyring":
-        _try_keyring_delete()
-    _file_delete()
+        _try_keyring_delete(key, config.keyring_timeout_seconds)
+    _file_delete(key, config.capacity)
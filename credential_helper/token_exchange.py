@@ -2,7 +2,13 @@
 
 from dataclasses import dataclass
 
-import requests
+from credential_helper import http_client
+
+
+class TokenExchangeError(RuntimeError):
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        super().__init__(f"Token exchange failed (HTTP {status_code}): {text}")
 
 
 @dataclass
@@ -17,7 +23,7 @@ def exchange_token(url: str, jwt: str) -> DatabricksToken:
 
     Uses RFC 8693 token exchange grant type.
     """
-    response = requests.post(
+    response = http_client.post(
         url,
         data={
             "grant_type": "urn:ietf:params:oauth:grant-type:token-exchange",
@@ -29,9 +35,7 @@ def exchange_token(url: str, jwt: str) -> DatabricksToken:
     )
 
     if response.status_code != 200:
-        raise RuntimeError(
-            f"Token exchange failed (HTTP {response.status_code}): {response.text}"
-        )
+        raise TokenExchangeError(response.status_code, response.text)
 
     data = response.json()
     return DatabricksToken(
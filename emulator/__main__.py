@@ -0,0 +1,45 @@
+"""Run the local emulator: python -m emulator."""
+
+import argparse
+import json
+import shlex
+import sys
+import time
+from pathlib import Path
+
+from emulator.server import Emulator, EmulatorSettings
+
+DEFAULT_STATE_DIR = Path.home() / ".databricks-claude-gateway" / "emulator"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local Azure AD + Databricks emulator")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8943, help="Port to listen on")
+    parser.add_argument("--settings", help="JSON file with EmulatorSettings overrides")
+    parser.add_argument(
+        "--state-dir", default=str(DEFAULT_STATE_DIR), help="Where to write cert and config"
+    )
+    args = parser.parse_args()
+
+    settings = EmulatorSettings()
+    if args.settings:
+        settings = EmulatorSettings.from_dict(json.loads(Path(args.settings).read_text()))
+
+    emulator = Emulator(Path(args.state_dir), settings, args.host, args.port).start()
+    config_path = emulator.write_config()
+    print(f"Emulator listening on {emulator.url}", file=sys.stderr)
+    print(f"Config written to {config_path}; use it with:", file=sys.stderr)
+    for name, value in emulator.env().items():
+        print(f"export {name}={shlex.quote(value)}")
+    print(f"export GATEWAY_CONFIG={shlex.quote(str(config_path))}")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Headless stand-in for a browser during the emulated interactive login.
+
+MSAL opens the authorize URL through ``$BROWSER``. The emulator's authorize page is
+an auto-submitting ``form_post`` form; this follows it the way a browser would by
+POSTing the hidden fields to MSAL's localhost redirect listener.
+
+    python -m emulator.browser <authorize-url> --cafile cert.pem
+"""
+
+import argparse
+import ssl
+import urllib.parse
+import urllib.request
+from html.parser import HTMLParser
+
+
+class _FormParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.action: str | None = None
+        self.fields: dict[str, str] = {}
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attributes = dict(attrs)
+        if tag == "form":
+            self.action = attributes.get("action")
+        elif tag == "input" and attributes.get("name"):
+            self.fields[attributes["name"]] = attributes.get("value") or ""
+
+
+def complete_login(authorize_url: str, cafile: str | None = None) -> None:
+    context = ssl.create_default_context(cafile=cafile)
+    with urllib.request.urlopen(authorize_url, context=context) as response:
+        page = response.read().decode()
+    form = _FormParser()
+    form.feed(page)
+    if not form.action:
+        raise RuntimeError("Authorize page did not contain a form")
+    data = urllib.parse.urlencode(form.fields).encode()
+    with urllib.request.urlopen(form.action, data=data) as response:
+        response.read()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless login for the emulator")
+    parser.add_argument("url", help="Authorize URL opened by MSAL")
+    parser.add_argument("--cafile", help="Emulator certificate")
+    args = parser.parse_args()
+    complete_login(args.url, args.cafile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,561 @@
+"""Hermetic local emulator of Azure AD, Databricks OIDC and serving endpoints.
+
+One HTTPS server stands in for all three services so the credential helper, proxy
+and benchmarks can run end to end without network access:
+
+- ``/<tenant>/v2.0/.well-known/openid-configuration``, ``/<tenant>/oauth2/v2.0/authorize``
+  and ``/<tenant>/oauth2/v2.0/token`` — enough of Azure AD for MSAL's auth code +
+  PKCE and refresh token flows. Authorize auto-consents via a ``form_post`` page.
+- ``/oidc/v1/token`` — RFC 8693 exchange of an emulator-issued ID token.
+- ``/serving-endpoints/<name>/invocations[/...]`` — Anthropic Messages responses,
+  streamed as SSE when the request asks for ``"stream": true``.
+- ``/api/2.0/serving-endpoints[/<name>[/config|/ai-gateway]]`` — create, read and
+  update endpoints. New and updated endpoints stay ``NOT_READY`` for
+  ``endpoint_ready_seconds``, and AI Gateway updates are refused until they are ready.
+
+Latency, 429 rates, token lifetimes and streaming speed come from ``EmulatorSettings``.
+"""
+
+import base64
+import html
+import json
+import random
+import secrets
+import ssl
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from emulator.tls import write_self_signed_cert
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+TENANT_ID = "emulator-tenant"
+CLIENT_ID = "emulator-client"
+USER_OID = "00000000-0000-0000-0000-000000000001"
+USER_EMAIL = "developer@emulator.local"
+ENDPOINTS_API = "/api/2.0/serving-endpoints"
+
+
+@dataclass
+class EmulatorSettings:
+    """Tunable behaviour. Latencies are medians in ms, drawn log-normally with ``latency_sigma``."""
+
+    aad_latency_ms: float = 40.0
+    exchange_latency_ms: float = 60.0
+    first_token_latency_ms: float = 300.0
+    latency_sigma: float = 0.25
+    exchange_throttle_rate: float = 0.0
+    invocation_throttle_rate: float = 0.0
+    invocation_error_rate: float = 0.0
+    retry_after_seconds: int = 1
+    id_token_lifetime_seconds: int = 3600
+    access_token_lifetime_seconds: int = 3600
+    output_tokens: int = 32
+    stream_tokens_per_second: float = 100.0
+    endpoint_ready_seconds: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EmulatorSettings":
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown emulator settings: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64url_json(data: dict) -> str:
+    return _b64url(json.dumps(data).encode())
+
+
+def _decode_jwt_claims(token: str) -> dict | None:
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+
+
+class _State:
+    """Issued codes and tokens plus per-route request counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.codes: dict[str, dict] = {}
+        self.refresh_tokens: set[str] = set()
+        self.access_tokens: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.endpoints: dict[str, dict] = {}
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_EmulatorHTTPServer"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    @property
+    def settings(self) -> EmulatorSettings:
+        return self.server.settings
+
+    @property
+    def state(self) -> _State:
+        return self.server.state
+
+    def _sleep(self, median_ms: float) -> None:
+        if median_ms > 0:
+            time.sleep(random.lognormvariate(0, self.settings.latency_sigma) * median_ms / 1000)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, code: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code: int, data: dict, headers: dict | None = None) -> None:
+        self._send(code, json.dumps(data).encode(), "application/json", headers)
+
+    def _throttle(self) -> None:
+        self._send_json(
+            429,
+            {"error_code": "REQUEST_LIMIT_EXCEEDED", "message": "Emulated rate limit"},
+            {"Retry-After": str(self.settings.retry_after_seconds)},
+        )
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        parts = path.strip("/").split("/")
+        if path.endswith("/v2.0/.well-known/openid-configuration"):
+            self.state.count("aad_discovery")
+            self._openid_configuration(parts[0])
+        elif path.endswith("/oauth2/v2.0/authorize"):
+            self.state.count("aad_authorize")
+            self._authorize()
+        elif path == "/_emulator/stats":
+            with self.state.lock:
+                self._send_json(200, dict(self.state.counters))
+        elif path.startswith(ENDPOINTS_API + "/"):
+            self.state.count("endpoint_get")
+            self._get_endpoint(path.removeprefix(ENDPOINTS_API + "/"))
+        else:
+            self._send_json(404, {"error": f"Not found: {path}"})
+
+    def do_POST(self) -> None:
+        path = urlsplit(self.path).path
+        body = self._read_body()
+        if path.endswith("/oauth2/v2.0/token"):
+            self.state.count("aad_token")
+            self._aad_token(path.strip("/").split("/")[0], parse_qs(body.decode()))
+        elif path == "/oidc/v1/token":
+            self.state.count("token_exchange")
+            self._token_exchange(parse_qs(body.decode()))
+        elif path.startswith("/serving-endpoints/") and "/invocations" in path:
+            self.state.count("invocations")
+            self._invocations(path, body)
+        elif path == ENDPOINTS_API:
+            self.state.count("endpoint_create")
+            self._create_endpoint(body)
+        else:
+            self._send_json(404, {"error": f"Not found: {path}"})
+
+    def do_PUT(self) -> None:
+        path = urlsplit(self.path).path
+        body = self._read_body()
+        name, _, field = path.removeprefix(ENDPOINTS_API + "/").partition("/")
+        if path.startswith(ENDPOINTS_API + "/") and field in ("config", "ai-gateway"):
+            self.state.count(f"endpoint_put_{field.replace('-', '_')}")
+            self._update_endpoint(name, field, body)
+        else:
+            self._send_json(404, {"error": f"Not found: {path}"})
+
+    # Serving endpoints API
+
+    def _endpoint_view(self, endpoint: dict) -> dict:
+        ready = time.time() >= endpoint["ready_at"]
+        return {
+            "name": endpoint["name"],
+            "config": endpoint["config"],
+            "ai_gateway": endpoint["ai_gateway"],
+            "state": {
+                "ready": "READY" if ready or endpoint["deployed"] else "NOT_READY",
+                "config_update": "NOT_UPDATING" if ready else "IN_PROGRESS",
+            },
+        }
+
+    def _get_endpoint(self, name: str) -> None:
+        with self.state.lock:
+            endpoint = self.state.endpoints.get(name)
+            view = self._endpoint_view(endpoint) if endpoint else None
+        if view is None:
+            self._send_json(404, {"error_code": "RESOURCE_DOES_NOT_EXIST"})
+            return
+        self._send_json(200, view)
+
+    def _create_endpoint(self, body: bytes) -> None:
+        request = json.loads(body or b"{}")
+        name = request.get("name", "")
+        with self.state.lock:
+            if name in self.state.endpoints:
+                self._send_json(400, {"error_code": "RESOURCE_ALREADY_EXISTS"})
+                return
+            endpoint = {
+                "name": name,
+                "config": request.get("config", {}),
+                "ai_gateway": request.get("ai_gateway", {}),
+                "ready_at": time.time() + self.settings.endpoint_ready_seconds,
+                "deployed": False,
+            }
+            self.state.endpoints[name] = endpoint
+            view = self._endpoint_view(endpoint)
+        self._send_json(200, view)
+
+    def _update_endpoint(self, name: str, field: str, body: bytes) -> None:
+        request = json.loads(body or b"{}")
+        with self.state.lock:
+            endpoint = self.state.endpoints.get(name)
+            if endpoint is None:
+                self._send_json(404, {"error_code": "RESOURCE_DOES_NOT_EXIST"})
+                return
+            now = time.time()
+            if now < endpoint["ready_at"]:
+                self._send_json(
+                    409,
+                    {"error_code": "RESOURCE_CONFLICT", "message": "Endpoint is being updated"},
+                )
+                return
+            if field == "config":
+                endpoint.update(
+                    config=request,
+                    deployed=True,
+                    ready_at=now + self.settings.endpoint_ready_seconds,
+                )
+            else:
+                endpoint["ai_gateway"] = request
+            view = self._endpoint_view(endpoint)
+        self._send_json(200, view)
+
+    # Azure AD
+
+    def _openid_configuration(self, tenant: str) -> None:
+        self._sleep(self.settings.aad_latency_ms)
+        base = f"{self.server.url}/{tenant}"
+        self._send_json(
+            200,
+            {
+                "issuer": f"{base}/v2.0",
+                "authorization_endpoint": f"{base}/oauth2/v2.0/authorize",
+                "token_endpoint": f"{base}/oauth2/v2.0/token",
+                "response_modes_supported": ["query", "fragment", "form_post"],
+            },
+        )
+
+    def _authorize(self) -> None:
+        query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        code = secrets.token_urlsafe(16)
+        with self.state.lock:
+            self.state.codes[code] = {
+                "client_id": query.get("client_id", CLIENT_ID),
+                "nonce": query.get("nonce"),
+            }
+        fields_html = "".join(
+            f'<input type="hidden" name="{name}" value="{html.escape(value)}">'
+            for name, value in (("code", code), ("state", query.get("state", "")))
+        )
+        page = (
+            f'<html><body onload="document.forms[0].submit()">'
+            f'<form method="post" action="{html.escape(query["redirect_uri"])}">'
+            f"{fields_html}</form></body></html>"
+        )
+        self._send(200, page.encode(), "text/html")
+
+    def _id_token(self, tenant: str, client_id: str, nonce: str | None) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": f"{self.server.url}/{tenant}/v2.0",
+            "sub": USER_OID,
+            "oid": USER_OID,
+            "tid": tenant,
+            "aud": client_id,
+            "email": USER_EMAIL,
+            "preferred_username": USER_EMAIL,
+            "iat": now,
+            "nbf": now,
+            "exp": now + self.settings.id_token_lifetime_seconds,
+        }
+        if nonce:
+            claims["nonce"] = nonce
+        header = _b64url_json({"alg": "none", "typ": "JWT"})
+        return f"{header}.{_b64url_json(claims)}.{_b64url(b'emulator')}"
+
+    def _aad_token(self, tenant: str, form: dict[str, list[str]]) -> None:
+        self._sleep(self.settings.aad_latency_ms)
+        grant = form.get("grant_type", [""])[0]
+        client_id = form.get("client_id", [CLIENT_ID])[0]
+        nonce = None
+        error = None
+        with self.state.lock:
+            if grant == "authorization_code":
+                issued = self.state.codes.pop(form.get("code", [""])[0], None)
+                if issued is None:
+                    error = "invalid_grant"
+                else:
+                    nonce = issued["nonce"]
+            elif grant == "refresh_token":
+                if form.get("refresh_token", [""])[0] not in self.state.refresh_tokens:
+                    error = "invalid_grant"
+            else:
+                error = "unsupported_grant_type"
+            refresh_token = secrets.token_urlsafe(24)
+            if error is None:
+                self.state.refresh_tokens.add(refresh_token)
+        if error is not None:
+            self._send_json(400, {"error": error})
+            return
+
+        self._send_json(
+            200,
+            {
+                "token_type": "Bearer",
+                "scope": form.get("scope", ["openid profile email"])[0],
+                "expires_in": self.settings.id_token_lifetime_seconds,
+                "access_token": secrets.token_urlsafe(24),
+                "refresh_token": refresh_token,
+                "id_token": self._id_token(tenant, client_id, nonce),
+                "client_info": _b64url_json({"uid": USER_OID, "utid": tenant}),
+            },
+        )
+
+    # Databricks
+
+    def _token_exchange(self, form: dict[str, list[str]]) -> None:
+        self._sleep(self.settings.exchange_latency_ms)
+        if random.random() < self.settings.exchange_throttle_rate:
+            self._throttle()
+            return
+        claims = _decode_jwt_claims(form.get("subject_token", [""])[0])
+        if not claims or not str(claims.get("iss", "")).startswith(self.server.url):
+            self._send_json(401, {"error": "invalid_subject_token"})
+            return
+        if claims.get("exp", 0) < time.time():
+            self._send_json(401, {"error": "expired_subject_token"})
+            return
+        token = "dapi-emu-" + secrets.token_hex(16)
+        lifetime = self.settings.access_token_lifetime_seconds
+        with self.state.lock:
+            self.state.access_tokens[token] = time.time() + lifetime
+        self._send_json(
+            200, {"access_token": token, "token_type": "Bearer", "expires_in": lifetime}
+        )
+
+    def _invocations(self, path: str, body: bytes) -> None:
+        scheme, _, token = (self.headers.get("Authorization") or "").partition(" ")
+        with self.state.lock:
+            expires_at = self.state.access_tokens.get(token)
+        if scheme != "Bearer" or expires_at is None or expires_at < time.time():
+            self._send_json(401, {"error_code": "UNAUTHENTICATED", "message": "Invalid token"})
+            return
+        if random.random() < self.settings.invocation_throttle_rate:
+            self._throttle()
+            return
+        if random.random() < self.settings.invocation_error_rate:
+            self._send_json(503, {"error_code": "TEMPORARILY_UNAVAILABLE"})
+            return
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error_code": "BAD_REQUEST", "message": "Invalid JSON"})
+            return
+        self._sleep(self.settings.first_token_latency_ms)
+        model = request.get("model", "emulator")
+        words = [f"token{i}" for i in range(self.settings.output_tokens)]
+        if request.get("stream"):
+            self._stream(model, words)
+            return
+        self._send_json(200, _message(model, " ".join(words), len(words)))
+
+    def _stream(self, model: str, words: list[str]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(name: str, data: dict) -> None:
+            chunk = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+
+        message = _message(model, "", 0)
+        message["content"] = []
+        event("message_start", {"type": "message_start", "message": message})
+        block = {"type": "text", "text": ""}
+        event(
+            "content_block_start",
+            {"type": "content_block_start", "index": 0, "content_block": block},
+        )
+        interval = 1 / self.settings.stream_tokens_per_second
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(interval)
+            delta = {"type": "text_delta", "text": word if i == 0 else f" {word}"}
+            event(
+                "content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta}
+            )
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event(
+            "message_delta",
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(words)},
+            },
+        )
+        event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def _message(model: str, text: str, output_tokens: int) -> dict:
+    return {
+        "id": f"msg_emu_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 10, "output_tokens": output_tokens},
+    }
+
+
+class _EmulatorHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], settings: EmulatorSettings, url_host: str):
+        super().__init__(address, _Handler)
+        self.settings = settings
+        self.state = _State()
+        self.url = f"https://{url_host}:{self.server_address[1]}"
+
+
+class Emulator:
+    """Runs the emulator on a background thread.
+
+    ``state_dir`` receives the TLS certificate, the ``$BROWSER`` login script and,
+    via ``write_config``, a ``config.json`` that ``load_config`` accepts.
+    """
+
+    def __init__(
+        self,
+        state_dir: Path,
+        settings: EmulatorSettings | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.state_dir = Path(state_dir)
+        self.settings = settings or EmulatorSettings()
+        self.host = host
+        self.port = port
+        self._server: _EmulatorHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("Emulator is not running")
+        return self._server.url
+
+    @property
+    def cert_path(self) -> Path:
+        return self.state_dir / "cert.pem"
+
+    @property
+    def browser_path(self) -> Path:
+        return self.state_dir / "browser.sh"
+
+    @property
+    def counters(self) -> dict[str, int]:
+        assert self._server is not None
+        with self._server.state.lock:
+            return dict(self._server.state.counters)
+
+    def start(self) -> "Emulator":
+        cert_path, key_path = write_self_signed_cert(self.state_dir, self.host)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_path, key_path)
+        self._server = _EmulatorHTTPServer((self.host, self.port), self.settings, self.host)
+        self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self._write_browser_script()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "Emulator":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _write_browser_script(self) -> None:
+        # webbrowser waits for $BROWSER to exit, but MSAL only starts serving its
+        # redirect listener afterwards, so the login runs in the background. The
+        # certificate comes from the environment because webbrowser caches $BROWSER
+        # for the life of the process.
+        self.browser_path.write_text(
+            "#!/bin/sh\n"
+            f'cd "{PROJECT_DIR}" && "{sys.executable}" -m emulator.browser "$1" '
+            '--cafile "$REQUESTS_CA_BUNDLE" >/dev/null 2>&1 &\n'
+        )
+        self.browser_path.chmod(0o700)
+
+    def env(self) -> dict[str, str]:
+        """Environment variables that make clients trust the emulator and log in headlessly."""
+        return {
+            "REQUESTS_CA_BUNDLE": str(self.cert_path),
+            "SSL_CERT_FILE": str(self.cert_path),
+            "BROWSER": str(self.browser_path),
+        }
+
+    def gateway_config(self, endpoint_name: str = "claude-code-gateway") -> dict:
+        """Raw config.json contents pointing every service at the emulator."""
+        return {
+            "databricks_host": self.url,
+            "endpoint_name": endpoint_name,
+            "model": "claude-sonnet-4-20250514",
+            "azure_ad": {
+                "tenant_id": TENANT_ID,
+                "client_id": CLIENT_ID,
+                "authority": f"{self.url}/{TENANT_ID}",
+            },
+            "token_cache": {"method": "file", "fallback": "file"},
+        }
+
+    def write_config(self, path: Path | None = None, **overrides) -> Path:
+        path = Path(path or self.state_dir / "config.json")
+        path.write_text(json.dumps({**self.gateway_config(), **overrides}, indent=2))
+        return path
@@ -1,49 +1,139 @@
-"""Python launcher: get token → set env → exec claude."""
+"""Python launcher: log in → start local token proxy → exec claude.
+
+Claude Code is pointed at a local proxy that injects a fresh Databricks token on
+every request, so sessions outlive the ~1h token lifetime. The proxy is started as
+a separate process while the token is fetched in-process and ``claude`` is
+resolved, then this process becomes ``claude`` via ``execvpe``. Claude only gets a
+random per-session secret that the proxy requires; the Databricks token never
+enters its environment.
+"""
 
-import json
 import os
+import secrets
+import shutil
 import subprocess
 import sys
+import threading
 from pathlib import Path
 
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
 
-def main() -> None:
-    project_dir = Path(__file__).resolve().parent.parent
-
-    # Get token from credential helper
-    result = subprocess.run(
-        [sys.executable, "-m", "credential_helper"],
-        capture_output=True,
-        text=True,
-        cwd=project_dir,
+from config.settings import GatewayConfig, load_config  # noqa: E402
+from credential_helper.provider import get_token  # noqa: E402
+
+PROXY_SECRET_ENV = "GATEWAY_PROXY_SECRET"
+
+
+def _config_path() -> str | None:
+    """The project's config.json if present, else load_config's own search order."""
+    project_config = PROJECT_DIR / "config.json"
+    return str(project_config) if project_config.exists() else None
+
+
+def _fetch(config: GatewayConfig, result: dict) -> None:
+    try:
+        # Log in up front so the proxy never has to open a browser mid-session
+        result["token"] = get_token(config)
+    except Exception as e:
+        result["error"] = e
+
+
+def _spawn_proxy(config_path: str | None, secret: str) -> subprocess.Popen:
+    """Start the proxy in a fresh interpreter; it prints its URL once listening.
+
+    Not a fork, so it inherits no lock held by a thread of this process (keyring
+    timeouts, refresh workers). The proxy outlives the ``execvpe`` below (the launcher's PID becomes claude's) and exits
+    when claude does. Its own session keeps Ctrl-C for claude.
+    """
+    command = [
+        sys.executable,
+        "-m",
+        "credential_helper.proxy",
+        "--port",
+        "0",
+        "--print-url",
+        "--exit-with-parent",
+    ]
+    if config_path:
+        command += ["--config", config_path]
+    env = os.environ.copy()
+    env[PROXY_SECRET_ENV] = secret
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_DIR), env.get("PYTHONPATH")]))
+    return subprocess.Popen(
+        command,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        start_new_session=True,
     )
-    if result.returncode != 0:
-        print(f"Credential helper failed: {result.stderr}", file=sys.stderr)
-        sys.exit(1)
 
-    token_data = json.loads(result.stdout)
-    token = token_data["token"]
 
-    # Load config
-    config_path = project_dir / "config.json"
-    if not config_path.exists():
-        config_path = Path.home() / ".databricks-claude-gateway" / "config.json"
-    if not config_path.exists():
-        print("Error: config.json not found", file=sys.stderr)
+def _proxy_url(proxy: subprocess.Popen) -> str | None:
+    """The URL the proxy prints once listening, or None if it exited first."""
+    with proxy.stdout:
+        return proxy.stdout.readline().decode().strip() or None
+
+
+def _run_with_proxy_thread(
+    config: GatewayConfig, claude: str, env: dict[str, str], secret: str
+) -> None:
+    """Fallback off POSIX, where ``execvpe`` does not keep the PID: host the proxy here."""
+    from credential_helper.proxy import start_proxy_thread
+
+    env["ANTHROPIC_BASE_URL"] = start_proxy_thread(config, secret=secret)
+    process = subprocess.Popen([claude] + sys.argv[1:], env=env)
+    while True:
+        try:
+            sys.exit(process.wait())
+        except KeyboardInterrupt:
+            # Ctrl-C is for claude; keep the proxy up until it exits
+            continue
+
+
+def main() -> None:
+    config_path = _config_path()
+    try:
+        config = load_config(config_path)
+    except Exception as e:
+        print(f"Credential helper failed: {e}", file=sys.stderr)
         sys.exit(1)
+    # Claude authenticates to the proxy with this; only the proxy holds the real token
+    secret = secrets.token_urlsafe(32)
+    proxy = _spawn_proxy(config_path, secret) if os.name == "posix" else None
 
-    config = json.loads(config_path.read_text())
-    host = config["databricks_host"].rstrip("/")
-    endpoint = config["endpoint_name"]
-    model = config["model"]
+    result: dict = {}
+    fetcher = threading.Thread(target=_fetch, args=(config, result))
+    fetcher.start()
+    # Resolve claude while the token is being fetched
+    claude = shutil.which("claude")
+    fetcher.join()
+
+    error = None
+    if "error" in result:
+        error = f"Credential helper failed: {result['error']}"
+    elif claude is None:
+        error = "Error: claude not found on PATH"
+    if error:
+        if proxy is not None:
+            proxy.terminate()
+        print(error, file=sys.stderr)
+        sys.exit(1)
 
-    # Set environment and exec claude
     env = os.environ.copy()
-    env["ANTHROPIC_BASE_URL"] = f"{host}/serving-endpoints/{endpoint}/invocations"
-    env["ANTHROPIC_AUTH_TOKEN"] = token
-    env["ANTHROPIC_MODEL"] = model
+    env["ANTHROPIC_AUTH_TOKEN"] = secret
+    env["ANTHROPIC_MODEL"] = config.model
+    if proxy is None:
+        _run_with_proxy_thread(config, claude, env, secret)
+        return
 
-    os.execvpe("claude", ["claude"] + sys.argv[1:], env)
+    url = _proxy_url(proxy)
+    if url is None:
+        print("Error: local proxy failed to start", file=sys.stderr)
+        sys.exit(1)
+    env["ANTHROPIC_BASE_URL"] = url
+    # get_token already saved the MSAL cache; execvpe skips atexit handlers
+    os.execvpe(claude, [claude] + sys.argv[1:], env)
 
 
 if __name__ == "__main__":
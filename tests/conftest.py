@@ -7,6 +7,22 @@ import pytest
 from config.settings import AzureAdConfig, GatewayConfig, TokenCacheConfig
 
 
+@pytest.fixture(autouse=True)
+def isolated_health_state(tmp_path, monkeypatch):
+    """Keep keyring health, refresh, breaker, ID token and response cache state out of ~."""
+    import credential_helper.circuit_breaker as cb
+    import credential_helper.id_token as it
+    import credential_helper.response_cache as rc
+    import credential_helper.token_cache as tc
+
+    monkeypatch.setattr(tc, "KEYRING_HEALTH_FILE", tmp_path / "keyring_health.json")
+    monkeypatch.setattr(tc, "_keyring_health", None)
+    monkeypatch.setattr(tc, "REFRESH_ATTEMPTS_FILE", tmp_path / "refresh_attempts.json")
+    monkeypatch.setattr(cb, "BREAKER_FILE", tmp_path / "circuit_breaker.json")
+    monkeypatch.setattr(it, "ID_TOKEN_FILE", tmp_path / "id_token.json")
+    monkeypatch.setattr(rc, "RESPONSE_CACHE_DIR", tmp_path / "responses")
+
+
 @pytest.fixture
 def sample_config_dict():
     return {
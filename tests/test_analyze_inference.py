@@ -0,0 +1,156 @@
+"""Tests for admin.analyze_inference."""
+
+import csv
+import json
+from datetime import UTC, datetime
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+pytest.importorskip("numpy")
+
+from admin.analyze_inference import (  # noqa: E402
+    CSV_FIELDS,
+    analyze,
+    export_files,
+    read_batches,
+    write_csv,
+)
+
+HOUR = datetime(2025, 3, 1, 10, tzinfo=UTC)
+
+
+def _response(input_tokens: int, output_tokens: int, stream: bool = False) -> str:
+    if not stream:
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+        return json.dumps({"type": "message", "usage": usage})
+    # A streamed response reports output_tokens once at the start and again at the end
+    usage = {"input_tokens": input_tokens, "output_tokens": 1}
+    start = {"type": "message_start", "message": {"usage": usage}}
+    delta = {"type": "message_delta", "usage": {"output_tokens": output_tokens}}
+    return f"data: {json.dumps(start)}\n\ndata: {json.dumps(delta)}\n\n"
+
+
+def _rows() -> list[dict]:
+    rows = []
+    for i in range(100):
+        rows.append(
+            {
+                "request_time": HOUR.replace(minute=i % 60, hour=10 + i // 60),
+                "requester": "alice@example.com" if i % 4 else "bob@example.com",
+                "endpoint_name": "claude-gw",
+                "status_code": 200,
+                "execution_duration_ms": float(i + 1) * 10,
+                "request": "x" * 100,
+                "response": _response(20, 50, stream=i % 2 == 0),
+            }
+        )
+    for i in range(10):
+        rows.append(
+            {
+                "request_time": HOUR,
+                "requester": "bob@example.com",
+                "endpoint_name": "claude-gw-2",
+                "status_code": 429,
+                "execution_duration_ms": 1.0,
+                "request": "x" * 1000,
+                "response": None,
+            }
+        )
+    return rows
+
+
+def _write_parquet(path, rows, row_group_size=16):
+    table = pa.Table.from_pylist(rows)
+    pq.write_table(table, path, row_group_size=row_group_size)
+    return path
+
+
+def _write_jsonl(path, rows):
+    with path.open("w") as f:
+        for row in rows:
+            f.write(json.dumps({**row, "request_time": row["request_time"].isoformat()}) + "\n")
+    return path
+
+
+@pytest.mark.parametrize(
+    ("writer", "name"), [(_write_parquet, "export.parquet"), (_write_jsonl, "export.jsonl")]
+)
+def test_analyze_groups_by_user_endpoint_and_hour(tmp_path, writer, name):
+    path = writer(tmp_path / name, _rows())
+
+    report = analyze([path], batch_rows=16)
+
+    overall = report["overall"]
+    assert report["rows"] == overall["requests"] == 110
+    assert (overall["ok"], overall["throttled"], overall["errors"]) == (100, 10, 0)
+    assert overall["rate_429"] == round(10 / 110, 4)
+    # Latencies are 10..1000 ms; the histogram is within one 5% bucket
+    assert overall["latency"]["p50_ms"] == pytest.approx(500, rel=0.05)
+    assert overall["latency"]["p99_ms"] == pytest.approx(990, rel=0.05)
+    assert overall["latency"]["max_ms"] == 1000.0
+    # Streamed responses count their final output_tokens; 429s count no tokens
+    assert (overall["input_tokens"], overall["output_tokens"]) == (2000, 5000)
+    assert overall["output_tokens_per_second"] == round(5000 * 1000 / sum(range(10, 1001, 10)), 1)
+    assert overall["request_bytes"]["max"] == 1000
+
+    users = {u["key"]: u for u in report["by_user"]}
+    assert [u["key"] for u in report["by_user"]] == ["alice@example.com", "bob@example.com"]
+    assert users["bob@example.com"]["throttled"] == 10
+    assert users["alice@example.com"]["requests"] == 75
+
+    endpoints = {e["key"]: e for e in report["by_endpoint"]}
+    assert endpoints["claude-gw-2"]["rate_429"] == 1.0
+    assert endpoints["claude-gw-2"]["latency"]["p50_ms"] is None
+
+    assert [(h["key"], h["requests"]) for h in report["by_hour"]] == [
+        ("2025-03-01T10:00Z", 70),
+        ("2025-03-01T11:00Z", 40),
+    ]
+
+
+def test_parquet_reads_only_analyzed_columns_in_batches(tmp_path):
+    rows = [{**row, "unrelated_blob": "y" * 10_000} for row in _rows()]
+    path = _write_parquet(tmp_path / "export.parquet", rows)
+
+    batches = list(read_batches(path, batch_rows=16))
+
+    assert max(len(b) for b in batches) <= 16
+    assert "unrelated_blob" not in batches[0].schema.names
+    assert sum(len(b) for b in batches) == 110
+
+
+def test_missing_columns_fall_back_to_unknown(tmp_path):
+    path = _write_parquet(
+        tmp_path / "export.parquet",
+        [{"status_code": 200, "execution_time_ms": 5.0}, {"status_code": 503}],
+    )
+
+    report = analyze([path])
+
+    assert [u["key"] for u in report["by_user"]] == ["unknown"]
+    assert [h["key"] for h in report["by_hour"]] == ["unknown"]
+    assert report["overall"]["errors"] == 1
+    assert report["overall"]["latency"]["max_ms"] == 5.0
+
+
+def test_export_files_and_csv(tmp_path):
+    _write_parquet(tmp_path / "a.parquet", _rows()[:50])
+    _write_jsonl(tmp_path / "b.jsonl", _rows()[50:])
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    files = export_files([str(tmp_path)])
+    assert [f.name for f in files] == ["a.parquet", "b.jsonl"]
+    with pytest.raises(RuntimeError, match="No such export"):
+        export_files([str(tmp_path / "missing.parquet")])
+
+    report = analyze(files)
+    assert report["overall"]["requests"] == 110
+
+    path = tmp_path / "report.csv"
+    write_csv(str(path), report)
+    rows = list(csv.DictReader(path.open()))
+    assert list(rows[0]) == list(CSV_FIELDS)
+    assert rows[0]["dimension"] == "overall"
+    assert [r["dimension"] for r in rows].count("hour") == 2
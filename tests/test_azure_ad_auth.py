@@ -1,9 +1,19 @@
 """Tests for credential_helper.azure_ad_auth."""
 
+import json
+import time
+
 import pytest
 
 from config.settings import AzureAdConfig
-from credential_helper.azure_ad_auth import acquire_token, create_msal_app
+from credential_helper import azure_ad_auth
+from credential_helper.azure_ad_auth import (
+    PersistentTokenCache,
+    acquire_token,
+    create_msal_app,
+    merge_state,
+    prune_state,
+)
 
 
 @pytest.fixture
@@ -73,3 +83,165 @@ def test_acquire_token_interactive_failure_raises(mocker, azure_config):
 
     with pytest.raises(RuntimeError, match="User cancelled"):
         acquire_token(mock_app, azure_config.scopes)
+
+
+def test_acquire_token_non_interactive_raises(mocker, azure_config):
+    mock_app = mocker.Mock()
+    mock_app.get_accounts.return_value = []
+
+    with pytest.raises(RuntimeError, match="interactive login is disabled"):
+        acquire_token(mock_app, azure_config.scopes, interactive=False)
+
+    mock_app.acquire_token_interactive.assert_not_called()
+
+
+def test_acquire_token_drops_reserved_scopes(mocker):
+    mock_app = mocker.Mock()
+    mock_app.get_accounts.return_value = []
+    mock_app.acquire_token_interactive.return_value = {"id_token": "jwt"}
+
+    acquire_token(mock_app, ["openid", "profile", "email"])
+
+    mock_app.acquire_token_interactive.assert_called_once_with(scopes=["email"])
+
+
+def test_create_msal_app_custom_authority(mocker, azure_config):
+    mocker.patch("credential_helper.azure_ad_auth._load_cache")
+    mock_app_cls = mocker.patch("credential_helper.azure_ad_auth.msal.PublicClientApplication")
+    azure_config.authority = "https://127.0.0.1:8943/emulator-tenant"
+
+    create_msal_app(azure_config)
+
+    kwargs = mock_app_cls.call_args.kwargs
+    assert kwargs["authority"] == "https://127.0.0.1:8943/emulator-tenant"
+    assert kwargs["instance_discovery"] is False
+
+
+def _refresh_token(account: str) -> dict:
+    return {
+        "credential_type": "RefreshToken",
+        "home_account_id": account,
+        "environment": "login.microsoftonline.com",
+        "client_id": "test-client",
+        "target": "email",
+        "secret": f"rt-{account}",
+    }
+
+
+def _access_token(account: str, expires_on: float) -> dict:
+    return {
+        "credential_type": "AccessToken",
+        "home_account_id": account,
+        "environment": "login.microsoftonline.com",
+        "client_id": "test-client",
+        "realm": "test-tenant",
+        "target": "email",
+        "secret": f"at-{account}",
+        "expires_on": str(int(expires_on)),
+    }
+
+
+def test_persistent_cache_loads_on_demand(tmp_path, mocker):
+    path = tmp_path / "msal_cache.bin"
+    path.write_text(json.dumps({"RefreshToken": {"a": _refresh_token("a")}}))
+    read = mocker.spy(azure_ad_auth, "_read_state")
+
+    cache = PersistentTokenCache(path)
+    read.assert_not_called()
+
+    cache.load()
+    assert len(list(cache.search("RefreshToken"))) == 1
+    assert not cache.has_state_changed
+    read.assert_called_once()
+
+
+def test_persistent_cache_merges_concurrent_writers(tmp_path):
+    path = tmp_path / "msal_cache.bin"
+    first = PersistentTokenCache(path)
+    second = PersistentTokenCache(path)
+    first.load()
+    second.load()
+
+    first.modify("RefreshToken", _refresh_token("a"), {"secret": "rt-a"})
+    second.modify("RefreshToken", _refresh_token("b"), {"secret": "rt-b"})
+    first.save()
+    second.save()
+
+    saved = json.loads(path.read_text())["RefreshToken"]
+    assert {e["home_account_id"] for e in saved.values()} == {"a", "b"}
+    assert not second.has_state_changed
+    assert len(list(second.search("RefreshToken"))) == 2
+
+
+def test_persistent_cache_keeps_changes_when_save_fails(tmp_path, mocker):
+    cache = PersistentTokenCache(tmp_path / "msal_cache.bin")
+    cache.load()
+    cache.modify("RefreshToken", _refresh_token("a"), {"secret": "rt-a"})
+    mocker.patch.object(azure_ad_auth, "atomic_write_text", side_effect=OSError("full"))
+
+    with pytest.raises(OSError):
+        cache.save()
+    assert cache.has_state_changed
+
+
+def test_merge_state_applies_our_removals_only():
+    base = {"RefreshToken": {"a": 1, "b": 2}}
+    ours = {"RefreshToken": {"b": 2}}
+    theirs = {"RefreshToken": {"a": 1, "b": 2, "c": 3}}
+    assert merge_state(base, ours, theirs) == {"RefreshToken": {"b": 2, "c": 3}}
+
+
+def test_prune_state_drops_expired_tokens_and_orphaned_accounts():
+    now = time.time()
+    state = {
+        "RefreshToken": {"a": _refresh_token("a")},
+        "AccessToken": {
+            "a": _access_token("a", now - 10),
+            "b": _access_token("b", now - 10),
+            "c": _access_token("c", now + 600),
+        },
+        "Account": {k: {"home_account_id": k} for k in "abc"},
+        "IdToken": {k: {"home_account_id": k} for k in "abc"},
+    }
+    prune_state(state, now)
+    assert set(state["AccessToken"]) == {"c"}
+    assert set(state["Account"]) == {"a", "c"}
+    assert set(state["IdToken"]) == {"a", "c"}
+
+
+def test_acquire_token_persists_cache(mocker):
+    mock_app = mocker.Mock()
+    mock_app.get_accounts.return_value = []
+    mock_app.acquire_token_interactive.return_value = {"id_token": "jwt"}
+    mock_app.token_cache = mocker.Mock(spec=PersistentTokenCache)
+
+    acquire_token(mock_app, ["email"])
+
+    mock_app.token_cache.save.assert_called_once()
+
+
+def test_acquire_token_silent_without_id_token_forces_refresh(mocker, azure_config):
+    mock_app = mocker.Mock()
+    mock_app.get_accounts.return_value = [{"username": "user@test.com"}]
+    mock_app.acquire_token_silent.side_effect = [
+        {"access_token": "at-from-cache"},
+        {"id_token": "jwt-from-refresh-token"},
+    ]
+
+    assert acquire_token(mock_app, azure_config.scopes) == "jwt-from-refresh-token"
+    assert mock_app.acquire_token_silent.call_args.kwargs["force_refresh"] is True
+    mock_app.acquire_token_interactive.assert_not_called()
+
+
+def test_exit_save_registered_once(tmp_path, mocker):
+    mocker.patch.object(azure_ad_auth, "CACHE_FILE", tmp_path / "msal_cache.bin")
+    mocker.patch.object(azure_ad_auth, "_exit_cache", None)
+    register = mocker.patch("atexit.register")
+    save = mocker.patch.object(PersistentTokenCache, "save", autospec=True)
+
+    azure_ad_auth._load_cache()
+    newest = azure_ad_auth._load_cache()
+
+    register.assert_called_once()
+    register.call_args.args[0]()
+    save.assert_called_once_with(newest)
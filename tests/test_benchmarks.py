@@ -0,0 +1,31 @@
+"""Tests for the auth path benchmark's summary and regression check."""
+
+from benchmarks.auth_paths import compare, summarize
+
+
+def test_summarize():
+    assert summarize([30.0, 10.0, 20.0]) == {
+        "runs": 3,
+        "median_ms": 20.0,
+        "p90_ms": 30.0,
+        "min_ms": 10.0,
+    }
+
+
+def test_compare_flags_regressions_past_threshold():
+    baseline = {"scenarios": {"cold": {"median_ms": 100.0}, "warm_file": {"median_ms": 10.0}}}
+    results = {
+        "scenarios": {
+            "cold": {"median_ms": 130.0},
+            "warm_file": {"median_ms": 14.0},  # within the absolute noise floor
+            "exchange": {"median_ms": 50.0},  # not in the baseline
+        }
+    }
+    failures = compare(results, baseline, threshold=0.2)
+    assert len(failures) == 1
+    assert failures[0].startswith("cold:")
+
+
+def test_compare_passes_within_threshold():
+    baseline = {"scenarios": {"cold": {"median_ms": 100.0}}}
+    assert compare({"scenarios": {"cold": {"median_ms": 115.0}}}, baseline, 0.2) == []
@@ -0,0 +1,59 @@
+"""Tests for credential_helper.circuit_breaker."""
+
+import pytest
+
+from credential_helper.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def outage(error: BaseException) -> bool:
+    return isinstance(error, ConnectionError)
+
+
+def fail(breaker: CircuitBreaker, error: Exception) -> None:
+    with pytest.raises(type(error)):
+        with breaker.guard(outage):
+            raise error
+
+
+def test_opens_after_threshold_and_fails_fast(tmp_path):
+    breaker = CircuitBreaker("https://x/oidc/v1/token", tmp_path / "cb.json", threshold=2)
+    fail(breaker, ConnectionError())
+    breaker.check()  # one failure: still closed
+    fail(breaker, ConnectionError())
+
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard(outage):
+            pytest.fail("open circuit must not call through")
+
+
+def test_state_is_shared_through_the_file(tmp_path):
+    path = tmp_path / "cb.json"
+    fail(CircuitBreaker("a", path, threshold=1), ConnectionError())
+    with pytest.raises(CircuitOpenError):
+        CircuitBreaker("a", path, threshold=1).check()
+    CircuitBreaker("b", path, threshold=1).check()
+
+
+def test_probe_after_backoff_and_success_closes(tmp_path):
+    breaker = CircuitBreaker("a", tmp_path / "cb.json", threshold=1, base_backoff=0.0)
+    fail(breaker, ConnectionError())
+    with breaker.guard(outage):
+        pass  # back-off elapsed: the probe goes through
+    assert breaker.state() == {}
+
+
+def test_backoff_grows_with_consecutive_failures(tmp_path, mocker):
+    mocker.patch("time.time", return_value=1000.0)
+    breaker = CircuitBreaker("a", tmp_path / "cb.json", threshold=1, base_backoff=10)
+    breaker.record_failure()
+    first = breaker.state()["retry_at"] - 1000.0
+    breaker.record_failure()
+    second = breaker.state()["retry_at"] - 1000.0
+    assert 5 <= first <= 10
+    assert 10 <= second <= 20
+
+
+def test_non_outage_errors_do_not_count(tmp_path):
+    breaker = CircuitBreaker("a", tmp_path / "cb.json", threshold=1)
+    fail(breaker, ValueError("invalid_grant"))
+    breaker.check()
@@ -90,3 +90,66 @@ def test_default_token_cache(tmp_path):
     config = load_config(str(path))
     assert config.token_cache.method == "keyring"
     assert config.token_cache.fallback == "file"
+
+
+def test_default_rate_limits(config_file):
+    config = load_config(str(config_file))
+    assert [(r.key, r.calls) for r in config.rate_limits] == [("endpoint", 100), ("user", 20)]
+
+
+def test_custom_rate_limits(tmp_path, sample_config_dict):
+    sample_config_dict["rate_limits"] = [{"key": "user", "calls": 5}]
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(sample_config_dict))
+    config = load_config(str(path))
+    assert len(config.rate_limits) == 1
+    assert config.rate_limits[0].renewal_period == "minute"
+
+
+def test_single_endpoint_default(config_file):
+    config = load_config(str(config_file))
+    (endpoint,) = config.serving_endpoints
+    assert endpoint.name == "claude-code-gateway"
+    assert endpoint.host == "https://e2-dogfood.staging.cloud.databricks.com"
+
+
+def test_multiple_endpoints(tmp_path, sample_config_dict):
+    sample_config_dict["endpoints"] = [
+        {"name": "claude-a"},
+        {"name": "claude-b", "host": "https://other.cloud.databricks.com/", "profile": "other"},
+    ]
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(sample_config_dict))
+    config = load_config(str(path))
+    a, b = config.serving_endpoints
+    assert a.host == "https://e2-dogfood.staging.cloud.databricks.com"
+    assert b.host == "https://other.cloud.databricks.com"
+    assert b.profile == "other"
+    assert config.for_endpoint(b).token_exchange_url == (
+        "https://other.cloud.databricks.com/oidc/v1/token"
+    )
+
+
+def test_endpoint_missing_name_raises(tmp_path, sample_config_dict):
+    sample_config_dict["endpoints"] = [{"host": "https://example.com"}]
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(sample_config_dict))
+    with pytest.raises(ValueError, match="Missing required endpoints field"):
+        load_config(str(path))
+
+
+def test_sticky_routing(tmp_path, config_file, sample_config_dict):
+    assert load_config(str(config_file)).sticky_routing is True
+    sample_config_dict["sticky_routing"] = False
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(sample_config_dict))
+    assert load_config(str(path)).sticky_routing is False
+
+
+def test_hedging_config(tmp_path, config_file, sample_config_dict):
+    assert load_config(str(config_file)).hedging.enabled is False
+    sample_config_dict["hedging"] = {"enabled": True, "budget_ratio": 0.1}
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(sample_config_dict))
+    hedging = load_config(str(path)).hedging
+    assert (hedging.enabled, hedging.percentile, hedging.budget_ratio) == (True, 0.95, 0.1)
@@ -0,0 +1,127 @@
+"""Tests for credential_helper.daemon."""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from credential_helper.daemon import TokenDaemon, TokenService, query_daemon
+from credential_helper.token_cache import CachedToken
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return tmp_path / "d.sock"
+
+
+@pytest.fixture
+def running_daemon(mocker, sample_config, socket_path):
+    token = CachedToken(access_token="daemon-token", expires_at=time.time() + 3600)
+    get_token = mocker.patch("credential_helper.provider.get_token", return_value=token)
+    server = TokenDaemon(socket_path, TokenService(sample_config))
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield get_token
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_returns_token(running_daemon, socket_path):
+    reply = query_daemon("get", socket_path=socket_path)
+    assert reply["token"] == "daemon-token"
+    assert reply["expires_at"] > time.time()
+
+
+def test_token_held_in_memory(running_daemon, socket_path):
+    query_daemon("get", socket_path=socket_path)
+    query_daemon("get", socket_path=socket_path)
+    running_daemon.assert_called_once()
+
+
+def test_check_uses_memory(running_daemon, socket_path):
+    query_daemon("get", socket_path=socket_path)
+    reply = query_daemon("check", socket_path=socket_path)
+    assert reply["valid"] is True
+
+
+def test_config_mismatch_falls_back(running_daemon, socket_path, config_file):
+    assert query_daemon("get", str(config_file), socket_path=socket_path) is None
+
+
+def test_no_daemon_returns_none(tmp_path):
+    assert query_daemon("get", socket_path=tmp_path / "missing.sock") is None
+
+
+def test_refresh_ahead_serves_current_token(mocker, sample_config):
+    now = time.time()
+    stale = CachedToken(access_token="old", expires_at=now + 3600, refresh_at=now - 1)
+    fresh = CachedToken(access_token="new", expires_at=now + 3600, refresh_at=now + 2700)
+    refresh = mocker.patch("credential_helper.provider.refresh_ahead", return_value=fresh)
+    service = TokenService(sample_config)
+    service._token = stale
+
+    assert service.get().access_token == "old"
+    with service._refreshing:
+        pass
+    refresh.assert_called_once_with(sample_config)
+    assert service.get().access_token == "new"
+
+
+def test_failed_refresh_ahead_is_not_retried_per_request(mocker, sample_config):
+    now = time.time()
+    stale = CachedToken(access_token="old", expires_at=now + 3600, refresh_at=now - 1)
+    refresh = mocker.patch(
+        "credential_helper.provider.refresh_ahead", side_effect=RuntimeError("interaction")
+    )
+    service = TokenService(sample_config)
+    service._token = stale
+
+    for _ in range(3):
+        assert service.get().access_token == "old"
+        with service._refreshing:
+            pass
+    # A fresh service (e.g. another process) shares the back-off through the file
+    other = TokenService(sample_config)
+    other._token = stale
+    assert other.get().access_token == "old"
+
+    refresh.assert_called_once()
+
+
+def test_key_follows_cwd_config(mocker, sample_config, socket_path, tmp_path, monkeypatch):
+    """Without --config, a CLI in a project with its own config.json is not served."""
+    daemon_dir, project_dir = tmp_path / "daemon", tmp_path / "project"
+    for directory in (daemon_dir, project_dir):
+        directory.mkdir()
+        (directory / "config.json").write_text("{}")
+    token = CachedToken(access_token="daemon-token", expires_at=time.time() + 3600)
+    mocker.patch("credential_helper.provider.get_token", return_value=token)
+    monkeypatch.chdir(daemon_dir)
+    server = TokenDaemon(socket_path, TokenService(sample_config))
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    try:
+        assert query_daemon("get", socket_path=socket_path)["token"] == "daemon-token"
+        monkeypatch.chdir(project_dir)
+        assert query_daemon("get", socket_path=socket_path) is None
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_malformed_reply_falls_back(tmp_path):
+    path = tmp_path / "bad.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(str(path))
+        listener.listen(1)
+
+        def reply():
+            conn, _ = listener.accept()
+            with conn:
+                conn.recv(4096)
+                conn.sendall(b"not json\n")
+
+        thread = threading.Thread(target=reply, daemon=True)
+        thread.start()
+        assert query_daemon("get", socket_path=path) is None
+        thread.join()
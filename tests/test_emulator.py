@@ -0,0 +1,101 @@
+"""End-to-end tests against the local emulator (no network access needed)."""
+
+import asyncio
+import json
+import ssl
+
+import pytest
+
+from config.settings import load_config
+from credential_helper import provider
+from credential_helper.proxy import GatewayProxy
+from credential_helper.token_cache import get_cached_token, token_key
+from emulator.server import Emulator, EmulatorSettings
+
+
+@pytest.fixture(scope="module")
+def running_emulator(tmp_path_factory):
+    settings = EmulatorSettings(
+        aad_latency_ms=0, exchange_latency_ms=0, first_token_latency_ms=0, output_tokens=5
+    )
+    with Emulator(tmp_path_factory.mktemp("emulator"), settings) as emu:
+        yield emu
+
+
+@pytest.fixture
+def emulator(running_emulator, tmp_path, monkeypatch):
+    """The shared emulator, with a fresh token and MSAL cache for each test."""
+    import credential_helper.azure_ad_auth as aad
+    import credential_helper.token_cache as tc
+
+    for name, value in running_emulator.env().items():
+        monkeypatch.setenv(name, value)
+    cache_dir = tmp_path / ".databricks-claude-gateway"
+    monkeypatch.setattr(tc, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(tc, "CACHE_FILE", cache_dir / "token_cache.json")
+    monkeypatch.setattr(tc, "LOCK_FILE", cache_dir / "refresh.lock")
+    monkeypatch.setattr(aad, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(aad, "CACHE_FILE", cache_dir / "msal_cache.bin")
+    return running_emulator
+
+
+def test_login_and_exchange(emulator, tmp_path):
+    config = load_config(str(emulator.write_config(tmp_path / "config.json")))
+    before = emulator.counters
+
+    token = provider.get_token(config)
+
+    assert token.access_token.startswith("dapi-emu-")
+    cached = get_cached_token(config.token_cache, token_key(config))
+    assert cached.access_token == token.access_token
+    after = emulator.counters
+    assert after["aad_authorize"] == before.get("aad_authorize", 0) + 1
+    assert after["token_exchange"] == before.get("token_exchange", 0) + 1
+    # Served from the cache the second time
+    assert provider.get_token(config).access_token == token.access_token
+    assert emulator.counters["token_exchange"] == after["token_exchange"]
+
+
+def test_streaming_through_proxy(emulator, tmp_path):
+    config = load_config(str(emulator.write_config(tmp_path / "config.json")))
+    provider.get_token(config)
+
+    async def run():
+        server = await GatewayProxy(config).start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({"model": "m", "stream": True, "messages": []}).encode()
+        writer.write(
+            b"POST /v1/messages HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+        )
+        response = await asyncio.wait_for(reader.read(), timeout=10)
+        writer.close()
+        server.close()
+        return response
+
+    response = asyncio.run(run())
+    assert response.startswith(b"HTTP/1.1 200")
+    assert b"event: message_start" in response
+    assert response.count(b"content_block_delta") == 10  # event name + type per delta
+    assert b"event: message_stop" in response
+
+
+def test_invocation_requires_issued_token(emulator):
+    import urllib.error
+    import urllib.request
+
+    context = ssl.create_default_context(cafile=str(emulator.cert_path))
+    request = urllib.request.Request(
+        f"{emulator.url}/serving-endpoints/ep/invocations",
+        data=b"{}",
+        headers={"Authorization": "Bearer forged"},
+    )
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        urllib.request.urlopen(request, context=context)
+    assert excinfo.value.code == 401
+
+
+def test_unknown_setting_rejected():
+    with pytest.raises(ValueError, match="Unknown emulator settings"):
+        EmulatorSettings.from_dict({"latency": 1})
@@ -0,0 +1,57 @@
+"""Tests for credential_helper.hedging."""
+
+import pytest
+
+from config.settings import HedgingConfig, RateLimit
+from credential_helper.hedging import MIN_SAMPLES, Hedger, hedgeable
+from credential_helper.rate_limit import RateLimiter
+
+
+@pytest.mark.parametrize(
+    ("method", "body", "expected"),
+    [
+        ("POST", b'{"messages": []}', True),
+        ("POST", b'{"messages": [], "stream": false}', True),
+        ("POST", b'{"messages": [], "stream": true}', False),
+        ("GET", b"", False),
+        ("POST", b"not json", False),
+    ],
+)
+def test_hedgeable(method, body, expected):
+    assert hedgeable(method, body) is expected
+
+
+def test_delay_is_a_recent_percentile_after_enough_samples():
+    hedger = Hedger(HedgingConfig(enabled=True, percentile=0.9))
+    for i in range(MIN_SAMPLES - 1):
+        hedger.observe("a", (i + 1) / 100)
+    assert hedger.delay("a") is None
+    hedger.observe("a", 0.2)
+    assert hedger.delay("a") == pytest.approx(0.18)
+    assert hedger.delay("b") is None
+
+
+def test_budget_caps_hedges_at_a_share_of_eligible_requests():
+    hedger = Hedger(HedgingConfig(enabled=True, budget_ratio=0.1))
+    limiter = RateLimiter([])
+    hedges = 0
+    for _ in range(100):
+        hedger.admit()
+        hedges += hedger.try_hedge(limiter)
+    assert hedges == hedger.stats.hedged == 10
+    assert hedger.stats.skipped_budget == 90
+
+
+def test_hedge_never_waits_for_the_rate_limiter():
+    hedger = Hedger(HedgingConfig(enabled=True, budget_ratio=1.0))
+    now = [0.0]
+    limiter = RateLimiter([RateLimit("endpoint", 1)], clock=lambda: now[0])
+    limiter.reserve()
+    hedger.admit()
+
+    assert not hedger.try_hedge(limiter)
+    assert hedger.stats.skipped_rate_limit == 1
+    assert hedger.credits == 1.0  # not spent
+    now[0] = 60.0
+    assert hedger.try_hedge(limiter)
+    assert limiter.stats.queued == 0
@@ -0,0 +1,58 @@
+"""Tests for credential_helper.http1."""
+
+import asyncio
+
+import pytest
+
+from credential_helper.http1 import encode_head, iter_body, read_body, read_head
+
+
+def _reader(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def _read(data: bytes, read):
+    """Run ``read(reader)`` on a fresh event loop over a reader holding ``data``."""
+
+    async def run():
+        return await read(_reader(data))
+
+    return asyncio.run(run())
+
+
+async def _chunks(reader, headers, **kwargs) -> list[bytes]:
+    return [chunk async for chunk in iter_body(reader, headers, **kwargs)]
+
+
+def test_head_round_trip():
+    head = encode_head("POST /x HTTP/1.1", [("Host", "h"), ("Content-Length", "2")])
+    assert _read(head + b"hi", read_head) == (
+        "POST /x HTTP/1.1",
+        [("Host", "h"), ("Content-Length", "2")],
+    )
+    assert _read(b"", read_head) is None
+
+
+def test_read_body_decodes_chunks():
+    chunked = [("Transfer-Encoding", "chunked")]
+
+    async def body_then_rest(reader):
+        return await read_body(reader, chunked), await reader.read()
+
+    data = b"3;ext\r\nabc\r\n2\r\nde\r\n0\r\nTrailer: x\r\n\r\nnext"
+    assert _read(data, body_then_rest) == (b"abcde", b"next")
+
+
+def test_iter_body_streams_content_length_and_eof():
+    length = [("Content-Length", "6")]
+    assert _read(b"abcdefX", lambda r: _chunks(r, length, chunk_bytes=4)) == [b"abcd", b"ef"]
+    assert _read(b"until close", lambda r: _chunks(r, [])) == [b"until close"]
+    with pytest.raises(asyncio.IncompleteReadError):
+        _read(b"abc", lambda r: _chunks(r, length))
+
+
+def test_read_body_without_framing_is_empty():
+    assert _read(b"ignored", lambda r: read_body(r, [])) == b""
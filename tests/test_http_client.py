@@ -0,0 +1,91 @@
+"""Tests for credential_helper.http_client."""
+
+import pytest
+import requests
+
+from credential_helper import http_client
+
+
+def _response(mocker, status_code, headers=None):
+    response = mocker.Mock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+@pytest.fixture
+def session(mocker):
+    session = mocker.Mock()
+    mocker.patch.object(http_client, "get_session", return_value=session)
+    return session
+
+
+@pytest.fixture
+def sleep(mocker):
+    return mocker.patch.object(http_client.time, "sleep")
+
+
+def test_success_no_retry(mocker, session, sleep):
+    session.request.return_value = _response(mocker, 200)
+
+    response = http_client.post("https://db.com/x", data={"a": 1})
+
+    assert response.status_code == 200
+    session.request.assert_called_once_with(
+        "POST", "https://db.com/x", timeout=http_client.DEFAULT_TIMEOUT, data={"a": 1}
+    )
+    sleep.assert_not_called()
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_retries_transient_status(mocker, session, sleep, status_code):
+    session.request.side_effect = [_response(mocker, status_code), _response(mocker, 200)]
+
+    assert http_client.post("https://db.com/x").status_code == 200
+    assert session.request.call_count == 2
+    sleep.assert_called_once()
+
+
+def test_honors_retry_after(mocker, session, sleep):
+    session.request.side_effect = [
+        _response(mocker, 429, {"Retry-After": "7"}),
+        _response(mocker, 200),
+    ]
+
+    http_client.put("https://db.com/x")
+
+    sleep.assert_called_once_with(7.0)
+
+
+def test_returns_last_response_when_exhausted(mocker, session, sleep):
+    session.request.return_value = _response(mocker, 500)
+
+    response = http_client.post("https://db.com/x", max_retries=2)
+
+    assert response.status_code == 500
+    assert session.request.call_count == 3
+
+
+def test_client_error_not_retried(mocker, session, sleep):
+    session.request.return_value = _response(mocker, 401)
+
+    assert http_client.post("https://db.com/x").status_code == 401
+    session.request.assert_called_once()
+
+
+def test_connection_error_retried_then_raised(session, sleep):
+    session.request.side_effect = requests.ConnectionError("boom")
+
+    with pytest.raises(requests.ConnectionError):
+        http_client.post("https://db.com/x", max_retries=1)
+    assert session.request.call_count == 2
+
+
+def test_backoff_is_capped(mocker):
+    mocker.patch.object(http_client.random, "uniform", side_effect=lambda lo, hi: hi)
+    assert http_client._backoff(0) == http_client.BACKOFF_BASE_SECONDS
+    assert http_client._backoff(20) == http_client.BACKOFF_MAX_SECONDS
+
+
+def test_session_is_shared():
+    assert http_client.get_session() is http_client.get_session()
@@ -0,0 +1,76 @@
+"""Tests for credential_helper.id_token."""
+
+import base64
+import json
+import time
+
+import pytest
+
+from config.settings import AzureAdConfig
+from credential_helper import id_token
+from credential_helper.id_token import (
+    ID_TOKEN_MIN_REMAINING_SECONDS,
+    clear_id_token,
+    decode_claims,
+    get_fresh_id_token,
+    save_id_token,
+)
+
+
+def make_jwt(**claims) -> str:
+    def part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    return f"{part({'alg': 'RS256'})}.{part(claims)}.signature"
+
+
+@pytest.fixture
+def azure_config():
+    return AzureAdConfig(tenant_id="test-tenant", client_id="test-client", scopes=["email"])
+
+
+def test_decode_claims_without_padding():
+    assert decode_claims(make_jwt(aud="a", exp=123)) == {"aud": "a", "exp": 123}
+
+
+@pytest.mark.parametrize("jwt", ["", "not-a-jwt", "a.!!!.c", "a.bnVsbA.c"])
+def test_decode_claims_malformed(jwt):
+    assert decode_claims(jwt) == {}
+
+
+def test_fresh_token_round_trip(azure_config):
+    jwt = make_jwt(aud="test-client", exp=time.time() + 3600)
+    save_id_token(azure_config, jwt)
+    assert get_fresh_id_token(azure_config) == jwt
+
+
+def test_token_inside_expiry_margin_is_not_fresh(azure_config):
+    save_id_token(
+        azure_config,
+        make_jwt(aud="test-client", exp=time.time() + ID_TOKEN_MIN_REMAINING_SECONDS - 10),
+    )
+    assert get_fresh_id_token(azure_config) is None
+
+
+def test_token_for_other_audience_is_not_fresh(azure_config):
+    save_id_token(azure_config, make_jwt(aud="other-client", exp=time.time() + 3600))
+    assert get_fresh_id_token(azure_config) is None
+
+
+def test_tokens_are_keyed_by_authority_and_client(azure_config):
+    save_id_token(azure_config, make_jwt(aud="test-client", exp=time.time() + 3600))
+    other = AzureAdConfig(tenant_id="other-tenant", client_id="test-client", scopes=["email"])
+    assert get_fresh_id_token(other) is None
+
+
+def test_save_drops_expired_tokens(azure_config):
+    other = AzureAdConfig(tenant_id="other-tenant", client_id="test-client", scopes=["email"])
+    save_id_token(other, make_jwt(aud="test-client", exp=time.time() - 1))
+    save_id_token(azure_config, make_jwt(aud="test-client", exp=time.time() + 3600))
+    assert len(json.loads(id_token.ID_TOKEN_FILE.read_text())) == 1
+
+
+def test_clear_id_token(azure_config):
+    save_id_token(azure_config, make_jwt(aud="test-client", exp=time.time() + 3600))
+    clear_id_token(azure_config)
+    assert get_fresh_id_token(azure_config) is None
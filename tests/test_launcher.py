@@ -0,0 +1,69 @@
+"""Tests for the in-process Python launcher."""
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from credential_helper.token_cache import CachedToken
+from launcher import launch_claude
+
+
+@pytest.fixture
+def launch(mocker, sample_config):
+    mocker.patch.object(launch_claude, "load_config", return_value=sample_config)
+    mocker.patch.object(
+        launch_claude,
+        "get_token",
+        return_value=CachedToken(access_token="dapi-token", expires_at=time.time() + 3600),
+    )
+    mocker.patch("shutil.which", return_value="/usr/bin/claude")
+    mocker.patch.object(launch_claude, "_spawn_proxy")
+    mocker.patch.object(launch_claude, "_proxy_url", return_value="http://127.0.0.1:5000")
+    mocker.patch("sys.argv", ["launch_claude.py", "--resume"])
+    return mocker.patch("os.execvpe")
+
+
+def test_execs_claude_with_proxy_env(launch, sample_config):
+    launch_claude.main()
+    path, argv, env = launch.call_args.args
+    assert path == "/usr/bin/claude"
+    assert argv == ["/usr/bin/claude", "--resume"]
+    assert env["ANTHROPIC_BASE_URL"] == "http://127.0.0.1:5000"
+    assert env["ANTHROPIC_MODEL"] == sample_config.model
+    # Claude gets the proxy's session secret, never the Databricks token
+    secret = env["ANTHROPIC_AUTH_TOKEN"]
+    assert secret != "dapi-token" and len(secret) >= 32
+    assert launch_claude._spawn_proxy.call_args.args[1] == secret
+
+
+def test_exits_when_token_fetch_fails(launch, mocker):
+    mocker.patch.object(launch_claude, "get_token", side_effect=RuntimeError("login failed"))
+    with pytest.raises(SystemExit):
+        launch_claude.main()
+    launch.assert_not_called()
+    launch_claude._spawn_proxy.return_value.terminate.assert_called_once()
+
+
+def test_exits_when_claude_missing(launch, mocker):
+    mocker.patch("shutil.which", return_value=None)
+    with pytest.raises(SystemExit):
+        launch_claude.main()
+    launch.assert_not_called()
+
+
+def test_exits_when_proxy_fails_to_start(launch, mocker):
+    mocker.patch.object(launch_claude, "_proxy_url", return_value=None)
+    with pytest.raises(SystemExit):
+        launch_claude.main()
+    launch.assert_not_called()
+
+
+def test_proxy_url_is_the_first_line_the_proxy_prints():
+    proxy = subprocess.Popen(
+        [sys.executable, "-c", "print('http://127.0.0.1:5000', flush=True)"],
+        stdout=subprocess.PIPE,
+    )
+    assert launch_claude._proxy_url(proxy) == "http://127.0.0.1:5000"
+    proxy.wait()
@@ -0,0 +1,129 @@
+"""Tests for benchmarks.load."""
+
+import asyncio
+import csv
+import json
+import subprocess
+import time
+
+import pytest
+
+from benchmarks.load import (
+    CSV_FIELDS,
+    HelperToken,
+    RequestShape,
+    Sample,
+    csv_rows,
+    histogram,
+    percentile,
+    run_load,
+    summarize,
+    write_csv,
+)
+from config.settings import load_config
+from credential_helper.daemon import TokenService
+from emulator.server import Emulator, EmulatorSettings
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([7.0], 0.99) == 7.0
+    assert percentile([], 0.5) is None
+
+
+def test_histogram_buckets():
+    counts = histogram([10, 25, 26, 99999])
+    assert counts["<=25"] == 2
+    assert counts["<=50"] == 1
+    assert counts[">60000"] == 1
+    assert sum(counts.values()) == 4
+
+
+def test_summarize_rates_exclude_failures_from_latency():
+    samples = [
+        Sample("a", 200, 100.0, ttft_ms=40.0, output_tokens=10),
+        Sample("a", 200, 300.0, ttft_ms=60.0, output_tokens=30),
+        Sample("a", 429, 5.0),
+        Sample("a", 0, 1.0, error="ConnectionResetError"),
+    ]
+
+    summary = summarize(samples, elapsed_seconds=2.0)
+
+    assert (summary["ok"], summary["throttled"], summary["errors"]) == (2, 1, 1)
+    assert summary["rate_429"] == 0.25
+    assert summary["requests_per_second"] == 2.0
+    assert summary["output_tokens_per_second"] == 20.0
+    assert summary["latency"]["p50_ms"] == 100.0
+    assert summary["ttft"]["max_ms"] == 60.0
+    assert summary["statuses"] == {"200": 2, "429": 1, "0": 1}
+
+
+
+def test_helper_token_runs_the_helper_once_for_concurrent_workers(mocker):
+    def run(*args, **kwargs):
+        time.sleep(0.05)
+        output = json.dumps({"token": "dapi-1", "expires_in": 3600})
+        return subprocess.CompletedProcess(args, 0, stdout=output, stderr="")
+
+    helper = mocker.patch("benchmarks.load.subprocess.run", side_effect=run)
+    source = HelperToken()
+
+    async def workers():
+        return await asyncio.gather(*(asyncio.to_thread(source.get) for _ in range(8)))
+
+    tokens = asyncio.run(workers())
+    assert {token.access_token for token in tokens} == {"dapi-1"}
+    helper.assert_called_once()
+
+
+@pytest.fixture
+def emulator(tmp_path, monkeypatch):
+    import credential_helper.azure_ad_auth as aad
+    import credential_helper.token_cache as tc
+
+    settings = EmulatorSettings(
+        aad_latency_ms=0,
+        exchange_latency_ms=0,
+        first_token_latency_ms=20,
+        output_tokens=5,
+        stream_tokens_per_second=1000,
+        invocation_throttle_rate=0.25,
+    )
+    cache_dir = tmp_path / ".databricks-claude-gateway"
+    monkeypatch.setattr(tc, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(tc, "CACHE_FILE", cache_dir / "token_cache.json")
+    monkeypatch.setattr(tc, "LOCK_FILE", cache_dir / "refresh.lock")
+    monkeypatch.setattr(aad, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(aad, "CACHE_FILE", cache_dir / "msal_cache.bin")
+    with Emulator(tmp_path / "emulator", settings) as emu:
+        for name, value in emu.env().items():
+            monkeypatch.setenv(name, value)
+        yield emu
+
+
+def test_load_against_emulator(emulator, tmp_path):
+    config = load_config(str(emulator.write_config(tmp_path / "config.json")))
+    shapes = [RequestShape("stream", stream=True), RequestShape("plain", stream=False)]
+
+    results = asyncio.run(
+        run_load(config, TokenService(config), shapes, [1, 4], duration=5, max_requests=40)
+    )
+
+    assert [level["concurrency"] for level in results["levels"]] == [1, 4]
+    overall = results["levels"][1]["overall"]
+    assert overall["requests"] == 40
+    assert overall["errors"] == 0
+    assert 0 < overall["throttled"] < 40
+    assert overall["output_tokens_per_second"] > 0
+    stream = results["levels"][1]["shapes"]["stream"]
+    assert stream["ttft"]["p50_ms"] <= stream["latency"]["p50_ms"]
+    assert results["levels"][1]["shapes"]["plain"]["ttft"]["p50_ms"] is None
+
+    path = tmp_path / "load.csv"
+    write_csv(str(path), results)
+    rows = list(csv.DictReader(path.open()))
+    assert len(rows) == len(csv_rows(results)) == 6
+    assert list(rows[0]) == list(CSV_FIELDS)
+    assert rows[0]["shape"] == "all"
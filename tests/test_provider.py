@@ -0,0 +1,162 @@
+"""Tests for credential_helper.provider."""
+
+import base64
+import json
+import time
+
+import pytest
+
+from credential_helper import provider
+from credential_helper.token_cache import CachedToken
+
+
+@pytest.fixture
+def lock_file(mocker, tmp_path):
+    import credential_helper.token_cache as tc
+
+    mocker.patch.object(tc, "LOCK_FILE", tmp_path / "refresh.lock")
+
+
+def test_get_token_cache_hit_skips_refresh(mocker, sample_config, lock_file):
+    token = CachedToken(access_token="cached", expires_at=time.time() + 3600)
+    mocker.patch.object(provider, "get_cached_token", return_value=token)
+    refresh = mocker.patch.object(provider, "refresh_token")
+
+    assert provider.get_token(sample_config) is token
+    refresh.assert_not_called()
+
+
+def test_get_token_rereads_cache_after_lock(mocker, sample_config, lock_file):
+    token = CachedToken(access_token="from-other-process", expires_at=time.time() + 3600)
+    mocker.patch.object(provider, "get_cached_token", side_effect=[None, token])
+    refresh = mocker.patch.object(provider, "refresh_token")
+
+    assert provider.get_token(sample_config) is token
+    refresh.assert_not_called()
+
+
+def test_get_token_refreshes_on_miss(mocker, sample_config, lock_file):
+    token = CachedToken(access_token="fresh", expires_at=time.time() + 3600)
+    mocker.patch.object(provider, "get_cached_token", return_value=None)
+    refresh = mocker.patch.object(provider, "refresh_token", return_value=token)
+
+    assert provider.get_token(sample_config) is token
+    refresh.assert_called_once_with(sample_config, interactive=True)
+
+
+def test_refresh_ahead_skips_when_locked(mocker, sample_config, tmp_path, lock_file):
+    from credential_helper.token_cache import refresh_lock
+
+    refresh = mocker.patch.object(provider, "refresh_token")
+    with refresh_lock(lock_file=tmp_path / "refresh.lock"):
+        assert provider.refresh_ahead(sample_config) is None
+    refresh.assert_not_called()
+
+
+def test_refresh_ahead_is_non_interactive(mocker, sample_config, lock_file):
+    now = time.time()
+    stale = CachedToken(access_token="old", expires_at=now + 3600, refresh_at=now - 1)
+    mocker.patch.object(provider, "get_cached_token", return_value=stale)
+    refresh = mocker.patch.object(provider, "refresh_token")
+
+    provider.refresh_ahead(sample_config)
+    refresh.assert_called_once_with(sample_config, interactive=False)
+
+
+def _stale_token() -> CachedToken:
+    # Inside the expiry buffer, but Databricks still accepts it for a few minutes
+    return CachedToken(access_token="stale", expires_at=time.time() + 120, refresh_at=0)
+
+
+def test_get_token_serves_stale_when_refresh_misses_deadline(mocker, sample_config, lock_file):
+    sample_config.token_cache.refresh_deadline_seconds = 0.05
+    mocker.patch.object(provider, "get_cached_token", return_value=_stale_token())
+    mocker.patch.object(provider, "refresh_token", side_effect=lambda *a, **k: time.sleep(1))
+
+    start = time.monotonic()
+    token = provider.get_token(sample_config)
+    assert time.monotonic() - start < 0.5
+    assert token.access_token == "stale"
+    assert token.stale is True
+    assert token.needs_refresh is True
+
+
+def test_get_token_serves_stale_when_refresh_fails(mocker, sample_config, lock_file):
+    from credential_helper.circuit_breaker import CircuitOpenError
+
+    mocker.patch.object(provider, "get_cached_token", return_value=_stale_token())
+    mocker.patch.object(
+        provider, "refresh_token", side_effect=CircuitOpenError("token endpoint", time.time())
+    )
+
+    assert provider.get_token(sample_config).stale is True
+
+
+def test_get_token_refreshes_stale_within_deadline(mocker, sample_config, lock_file):
+    fresh = CachedToken(access_token="fresh", expires_at=time.time() + 3600)
+    mocker.patch.object(provider, "get_cached_token", side_effect=[_stale_token(), None])
+    refresh = mocker.patch.object(provider, "refresh_token", return_value=fresh)
+
+    assert provider.get_token(sample_config) is fresh
+    refresh.assert_called_once_with(sample_config, interactive=False)
+
+
+def test_refresh_token_fails_fast_when_exchange_circuit_open(mocker, sample_config):
+    from credential_helper.circuit_breaker import (
+        FAILURE_THRESHOLD,
+        CircuitBreaker,
+        CircuitOpenError,
+    )
+
+    mocker.patch("credential_helper.azure_ad_auth.create_msal_app")
+    mocker.patch("credential_helper.azure_ad_auth.acquire_token", return_value="jwt")
+    exchange = mocker.patch("credential_helper.token_exchange.exchange_token")
+    breaker = CircuitBreaker(sample_config.token_exchange_url)
+    for _ in range(FAILURE_THRESHOLD):
+        breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        provider.refresh_token(sample_config)
+    exchange.assert_not_called()
+
+
+def _fresh_jwt(client_id: str) -> str:
+    claims = json.dumps({"aud": client_id, "exp": time.time() + 3600}).encode()
+    return f"header.{base64.urlsafe_b64encode(claims).decode().rstrip('=')}.signature"
+
+
+def test_refresh_token_exchanges_cached_id_token_without_msal(mocker, sample_config):
+    from credential_helper.id_token import save_id_token
+    from credential_helper.token_exchange import DatabricksToken
+
+    jwt = _fresh_jwt(sample_config.azure_ad.client_id)
+    save_id_token(sample_config.azure_ad, jwt)
+    acquire = mocker.patch.object(provider, "_acquire_jwt")
+    exchange = mocker.patch(
+        "credential_helper.token_exchange.exchange_token",
+        return_value=DatabricksToken("db", 3600, "Bearer"),
+    )
+    mocker.patch.object(provider, "save_token")
+
+    assert provider.refresh_token(sample_config).access_token == "db"
+    exchange.assert_called_once_with(sample_config.token_exchange_url, jwt)
+    acquire.assert_not_called()
+
+
+def test_refresh_token_rejected_id_token_falls_back_to_msal(mocker, sample_config):
+    from credential_helper.id_token import get_fresh_id_token, save_id_token
+    from credential_helper.token_exchange import DatabricksToken, TokenExchangeError
+
+    save_id_token(sample_config.azure_ad, _fresh_jwt(sample_config.azure_ad.client_id))
+    mocker.patch("credential_helper.azure_ad_auth.create_msal_app")
+    mocker.patch("credential_helper.azure_ad_auth.acquire_token", return_value="new-jwt")
+    exchange = mocker.patch(
+        "credential_helper.token_exchange.exchange_token",
+        side_effect=[TokenExchangeError(401, "revoked"), DatabricksToken("db", 3600, "Bearer")],
+    )
+    mocker.patch.object(provider, "save_token")
+
+    provider.refresh_token(sample_config)
+    assert exchange.call_args.args == (sample_config.token_exchange_url, "new-jwt")
+    # "new-jwt" is not a decodable JWT, so nothing fresh is left behind
+    assert get_fresh_id_token(sample_config.azure_ad) is None
@@ -0,0 +1,225 @@
+"""Tests for admin.provision."""
+
+import json
+import threading
+
+import pytest
+
+from admin import provision
+from admin.configure_gateway import gateway_config
+from admin.provision import (
+    Change,
+    EndpointSpec,
+    FederationSpec,
+    ProvisionSpec,
+    WorkspaceSpec,
+    apply,
+    diff,
+    load_spec,
+    plan,
+    spec_from_config,
+)
+from admin.setup_endpoint import endpoint_config
+from admin.setup_federation import federation_policy
+from config.settings import RateLimit
+
+HOST = "https://a.cloud.databricks.com"
+CREDENTIALS = {"a": (HOST, "token-a"), "acct": ("https://accounts.example.com", "token-acct")}
+
+
+def _response(mocker, status_code, data=None):
+    response = mocker.Mock()
+    response.status_code = status_code
+    response.json.return_value = data
+    response.text = json.dumps(data)
+    return response
+
+
+@pytest.fixture
+def server(mocker):
+    """Current state by URL; GETs of anything else are 404s."""
+    state: dict[str, dict] = {}
+
+    def get(url, **kwargs):
+        if url in state:
+            return _response(mocker, 200, state[url])
+        return _response(mocker, 404, {"error_code": "RESOURCE_DOES_NOT_EXIST"})
+
+    mocker.patch.object(provision.http_client, "get", side_effect=get)
+    return state
+
+
+def _spec(**endpoint_overrides) -> ProvisionSpec:
+    endpoint = EndpointSpec(name="gw", model="claude-sonnet-4", **endpoint_overrides)
+    return ProvisionSpec(workspaces=[WorkspaceSpec(profile="a", endpoints=[endpoint])])
+
+
+def _deployed(model: str = "claude-sonnet-4", rate_limits=None) -> dict:
+    config = endpoint_config("gw", model)
+    # The API redacts secrets and adds fields of its own
+    config["served_entities"][0]["external_model"]["anthropic_config"] = {}
+    config["served_entities"][0]["entity_version"] = "1"
+    return {
+        "name": "gw",
+        "state": {"ready": "READY"},
+        "config": config,
+        "ai_gateway": gateway_config(rate_limits),
+    }
+
+
+def test_diff_ignores_extra_keys_and_secrets():
+    desired = {"a": 1, "b": {"anthropic_api_key": "{{secrets/x}}", "c": [1, 2]}}
+    current = {"a": 1, "b": {"c": [1, 2], "d": 4}, "id": "x"}
+    assert diff(desired, current) == []
+
+
+def test_diff_reports_changed_paths():
+    desired = {"a": 1, "b": {"c": [1, 2]}, "e": [{"f": 1}]}
+    current = {"a": 2, "b": {"c": [1]}, "e": [{"f": 3}]}
+    assert diff(desired, current) == ["a", "b.c", "e[0].f"]
+
+
+def test_plan_creates_missing_endpoint_with_gateway(server):
+    result = plan(_spec(), CREDENTIALS)
+
+    assert result.errors == {}
+    [change] = result.changes
+    assert (change.action, change.method) == ("create", "POST")
+    assert change.url == f"{HOST}/api/2.0/serving-endpoints"
+    assert change.payload["ai_gateway"] == gateway_config()
+
+
+def test_plan_up_to_date_endpoint_has_no_changes(server):
+    server[f"{HOST}/api/2.0/serving-endpoints/gw"] = _deployed()
+    assert plan(_spec(), CREDENTIALS).changes == []
+
+
+def test_plan_updates_only_drifted_settings(server):
+    server[f"{HOST}/api/2.0/serving-endpoints/gw"] = _deployed()
+    limits = [RateLimit(key="endpoint", calls=500), RateLimit(key="user", calls=20)]
+
+    [change] = plan(_spec(rate_limits=limits), CREDENTIALS).changes
+
+    assert change.url == f"{HOST}/api/2.0/serving-endpoints/gw/ai-gateway"
+    assert change.fields == ["ai_gateway.rate_limits[0].calls"]
+
+
+def test_plan_compares_against_pending_config(server):
+    deployed = _deployed(model="old-model")
+    deployed["pending_config"] = _deployed()["config"]
+    server[f"{HOST}/api/2.0/serving-endpoints/gw"] = deployed
+    assert plan(_spec(), CREDENTIALS).changes == []
+
+
+def test_plan_federation_policy(server):
+    spec = ProvisionSpec(
+        federation_policies=[FederationSpec("acc", "tenant", "client", profile="acct")]
+    )
+    base = "https://accounts.example.com/api/2.0/accounts/acc/federation-policies"
+
+    [change] = plan(spec, CREDENTIALS).changes
+    assert (change.action, change.url) == ("create", f"{base}?policy_id=azure-ad-claude-gateway")
+    assert "name" not in change.payload
+
+    # The API returns the full resource path as the name; it is not a difference
+    current = {
+        **federation_policy("tenant", "client"),
+        "name": "accounts/acc/federationPolicies/azure-ad-claude-gateway",
+        "create_time": "2025-01-01",
+    }
+    server[f"{base}/azure-ad-claude-gateway"] = current
+    assert plan(spec, CREDENTIALS).changes == []
+
+    current["oidc_policy"] = {**current["oidc_policy"], "audiences": ["other-client"]}
+    [change] = plan(spec, CREDENTIALS).changes
+    assert (change.method, change.fields) == ("PATCH", ["oidc_policy.audiences[0]"])
+    assert change.url == f"{base}/azure-ad-claude-gateway?update_mask=oidc_policy"
+
+
+def test_plan_reads_concurrently_and_records_errors(mocker):
+    barrier = threading.Barrier(3, timeout=5)
+
+    def get(url, **kwargs):
+        barrier.wait()
+        if url.endswith("/broken"):
+            return _response(mocker, 403, {"message": "denied"})
+        return _response(mocker, 404, {})
+
+    mocker.patch.object(provision.http_client, "get", side_effect=get)
+    endpoints = [EndpointSpec(name=n, model="m") for n in ("x", "y", "broken")]
+    spec = ProvisionSpec(workspaces=[WorkspaceSpec(profile="a", endpoints=endpoints)])
+
+    result = plan(spec, CREDENTIALS, max_workers=3)
+
+    assert [c.resource for c in result.changes] == [f"endpoint {HOST}/x", f"endpoint {HOST}/y"]
+    assert "HTTP 403" in result.errors[f"endpoint {HOST}/broken"]
+
+
+def test_apply_orders_changes_per_resource_and_runs_resources_in_parallel(mocker):
+    barrier = threading.Barrier(2, timeout=5)
+    sent = []
+
+    def request(method, url, **kwargs):
+        if url.endswith("/config"):
+            barrier.wait()  # only returns if the other resource is being applied at once
+        sent.append(url)
+        return _response(mocker, 200, {})
+
+    mocker.patch.object(provision.http_client, "request", side_effect=request)
+    changes = [
+        Change("endpoint x", "update", "PUT", f"{HOST}/x/config", {}, "a"),
+        Change("endpoint x", "update", "PUT", f"{HOST}/x/ai-gateway", {}, "a"),
+        Change("endpoint y", "update", "PUT", f"{HOST}/y/config", {}, "a"),
+    ]
+
+    assert apply(changes, CREDENTIALS, max_workers=2) == {}
+    assert sent.index(f"{HOST}/x/config") < sent.index(f"{HOST}/x/ai-gateway")
+
+
+def test_apply_failure_skips_rest_of_resource(mocker):
+    request = mocker.patch.object(
+        provision.http_client, "request", return_value=_response(mocker, 409, {})
+    )
+    changes = [
+        Change("endpoint x", "update", "PUT", f"{HOST}/x/config", {}, "a"),
+        Change("endpoint x", "update", "PUT", f"{HOST}/x/ai-gateway", {}, "a"),
+    ]
+
+    errors = apply(changes, CREDENTIALS)
+
+    assert "HTTP 409" in errors["endpoint x"]
+    request.assert_called_once()
+
+
+def test_load_spec_applies_top_level_defaults(tmp_path):
+    path = tmp_path / "spec.json"
+    path.write_text(
+        json.dumps(
+            {
+                "model": "claude-sonnet-4",
+                "rate_limits": [{"key": "user", "calls": 5}],
+                "azure_ad": {"tenant_id": "t", "client_id": "c"},
+                "workspaces": [
+                    {"profile": "a", "endpoints": [{"name": "gw"}, {"name": "b", "model": "m"}]}
+                ],
+                "federation_policies": [{"account_id": "acc"}],
+            }
+        )
+    )
+
+    spec = load_spec(str(path))
+
+    first, second = spec.workspaces[0].endpoints
+    assert (first.model, first.rate_limits) == ("claude-sonnet-4", [RateLimit("user", 5)])
+    assert second.model == "m"
+    assert spec.federation_policies == [FederationSpec("acc", "t", "c")]
+    assert spec.profiles == {"a", "dogfood"}
+
+
+def test_spec_from_config_groups_endpoints_by_workspace(sample_config):
+    spec = spec_from_config(sample_config, account_id="acc")
+
+    [workspace] = spec.workspaces
+    assert (workspace.host, workspace.profile) == (sample_config.host, "dogfood")
+    assert [e.name for e in workspace.endpoints] == [sample_config.endpoint_name]
+    assert spec.federation_policies[0].client_id == sample_config.azure_ad.client_id
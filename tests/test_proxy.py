@@ -0,0 +1,481 @@
+"""Tests for credential_helper.proxy."""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from config.settings import (
+    AzureAdConfig,
+    EndpointConfig,
+    GatewayConfig,
+    HedgingConfig,
+    RateLimit,
+    ResponseCacheConfig,
+)
+from credential_helper.hedging import MIN_SAMPLES
+from credential_helper.proxy import GatewayProxy, _wait_for_parent_exit, main
+from credential_helper.token_cache import CachedToken
+
+SSE_EVENTS = [b"event: a\ndata: 1\n\n", b"event: b\ndata: 2\n\n"]
+
+
+class FakeService:
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    def get(self) -> CachedToken:
+        self.calls += 1
+        time.sleep(self.delay)
+        return CachedToken(access_token=f"tok-{self.calls}", expires_at=time.time() + 3600)
+
+
+class FakeUpstream:
+    """Minimal HTTP/1.1 upstream recording requests; /stream replies with chunked SSE."""
+
+    def __init__(self, status: bytes = b"200 OK", delay: float = 0.0):
+        self.status = status
+        self.delay = delay
+        self.requests: list[tuple[str, dict, bytes]] = []
+        self.connections = 0
+        self.release_second_event = asyncio.Event()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while line := await reader.readline():
+            headers = {}
+            while (h := await reader.readline()) not in (b"\r\n", b""):
+                k, _, v = h.decode().partition(":")
+                headers[k.strip().lower()] = v.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            path = line.decode().split(" ")[1]
+            self.requests.append((path, headers, body))
+            if path.endswith("/stream"):
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                    b"Transfer-Encoding: chunked\r\n\r\n"
+                )
+                for i, event in enumerate(SSE_EVENTS):
+                    if i:
+                        await self.release_second_event.wait()
+                    writer.write(b"%x\r\n%s\r\n" % (len(event), event))
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+            else:
+                await asyncio.sleep(self.delay)
+                writer.write(b"HTTP/1.1 %s\r\nContent-Length: 2\r\n\r\nok" % self.status)
+            await writer.drain()
+        writer.close()
+
+
+async def _with_proxy(test, secret=None, **config):
+    upstream = FakeUpstream()
+    upstream_server = await asyncio.start_server(upstream.handle, "127.0.0.1", 0)
+    port = upstream_server.sockets[0].getsockname()[1]
+    config = GatewayConfig(
+        databricks_host=f"http://127.0.0.1:{port}",
+        endpoint_name="ep",
+        model="m",
+        azure_ad=AzureAdConfig(tenant_id="t", client_id="c"),
+        **config,
+    )
+    service = FakeService()
+    proxy_server = await GatewayProxy(config, service, secret).start("127.0.0.1", 0)
+    proxy_port = proxy_server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", proxy_port)
+    try:
+        await test(upstream, service, reader, writer)
+    finally:
+        writer.close()
+        proxy_server.close()
+        upstream_server.close()
+
+
+async def _read_response(reader) -> bytes:
+    head = await reader.readuntil(b"\r\n\r\n")
+    return head + await reader.readexactly(2)
+
+
+def _post(path: str, body: bytes = b"{}") -> bytes:
+    return (
+        b"POST %s HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer placeholder\r\n"
+        b"x-api-key: placeholder\r\nContent-Length: %d\r\n\r\n%s" % (path.encode(), len(body), body)
+    )
+
+
+def test_injects_token_and_prefixes_path():
+    async def test(upstream, service, reader, writer):
+        writer.write(_post("/v1/messages", b'{"a": 1}'))
+        response = await _read_response(reader)
+        assert response.endswith(b"ok")
+        path, headers, body = upstream.requests[0]
+        assert path == "/serving-endpoints/ep/invocations/v1/messages"
+        assert headers["authorization"] == "Bearer tok-1"
+        assert "x-api-key" not in headers
+        assert body == b'{"a": 1}'
+
+    asyncio.run(_with_proxy(test))
+
+
+def test_reuses_upstream_connection_with_fresh_token():
+    async def test(upstream, service, reader, writer):
+        for _ in range(2):
+            writer.write(_post("/v1/messages"))
+            await _read_response(reader)
+        assert upstream.connections == 1
+        assert [h["authorization"] for _, h, _ in upstream.requests] == [
+            "Bearer tok-1",
+            "Bearer tok-2",
+        ]
+
+    asyncio.run(_with_proxy(test))
+
+
+def test_streams_sse_without_buffering():
+    async def test(upstream, service, reader, writer):
+        writer.write(_post("/v1/stream"))
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert b"Transfer-Encoding: chunked" in head
+        # The first event arrives while the upstream is still holding back the second
+        first = await asyncio.wait_for(reader.readuntil(b"data: 1\n\n\r\n"), timeout=2)
+        assert SSE_EVENTS[0] in first
+        upstream.release_second_event.set()
+        rest = await asyncio.wait_for(reader.readuntil(b"0\r\n\r\n"), timeout=2)
+        assert SSE_EVENTS[1] in rest
+
+    asyncio.run(_with_proxy(test))
+
+
+def test_token_failure_returns_503():
+    async def test(upstream, service, reader, writer):
+        def fail():
+            raise RuntimeError("login required")
+
+        service.get = fail
+        writer.write(_post("/v1/messages"))
+        response = await reader.read()
+        assert response.startswith(b"HTTP/1.1 503")
+        assert b"login required" in response
+        assert upstream.requests == []
+
+    asyncio.run(_with_proxy(test))
+
+
+@pytest.mark.parametrize("path", ["/v1/messages", "/v1/messages?beta=true"])
+def test_query_string_preserved(path):
+    async def test(upstream, service, reader, writer):
+        writer.write(_post(path))
+        await _read_response(reader)
+        assert upstream.requests[0][0] == "/serving-endpoints/ep/invocations" + path
+
+    asyncio.run(_with_proxy(test))
+
+
+def _status(response: bytes) -> bytes:
+    return response.split(b"\r\n", 1)[0]
+
+
+@pytest.mark.parametrize(
+    "credentials, status",
+    [
+        (b"Authorization: Bearer placeholder\r\n", b"HTTP/1.1 401 Unauthorized"),
+        (b"", b"HTTP/1.1 401 Unauthorized"),
+        (b"Authorization: Bearer s3cret\r\n", b"HTTP/1.1 200 OK"),
+        (b"x-api-key: s3cret\r\n", b"HTTP/1.1 200 OK"),
+    ],
+)
+def test_requires_session_secret(credentials, status):
+    async def test(upstream, service, reader, writer):
+        writer.write(
+            b"POST /v1/messages HTTP/1.1\r\nHost: localhost\r\n%s"
+            b"Content-Length: 2\r\n\r\n{}" % credentials
+        )
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert _status(head) == status
+        assert len(upstream.requests) == (1 if status.endswith(b"OK") else 0)
+        if upstream.requests:
+            assert upstream.requests[0][1]["authorization"] == "Bearer tok-1"
+
+    asyncio.run(_with_proxy(test, secret="s3cret"))
+
+
+@pytest.mark.parametrize("target", ["/../../api/2.0/tokens", "/v1/%2e%2e/x", "v1/messages"])
+def test_rejects_targets_outside_endpoint(target):
+    async def test(upstream, service, reader, writer):
+        writer.write(_post(target))
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert _status(head) == b"HTTP/1.1 400 Bad Request"
+        assert upstream.requests == []
+
+    asyncio.run(_with_proxy(test))
+
+
+def test_refuses_non_loopback_host_without_secret(monkeypatch):
+    monkeypatch.delenv("GATEWAY_PROXY_SECRET", raising=False)
+    monkeypatch.setattr("sys.argv", ["proxy", "--host", "0.0.0.0"])
+    with pytest.raises(SystemExit) as excinfo:
+        main()
+    assert excinfo.value.code == 2
+
+
+def test_waits_until_reparented(monkeypatch):
+    parents = iter([100, 100, 1])
+    monkeypatch.setattr("os.getppid", lambda: next(parents))
+    monkeypatch.setattr("credential_helper.proxy.PARENT_POLL_SECONDS", 0)
+    asyncio.run(_wait_for_parent_exit(100))
+    assert next(parents, None) is None
+
+
+def test_rejects_with_429_instead_of_queueing_too_long():
+    async def test(upstream, service, reader, writer):
+        writer.write(_post("/v1/messages"))
+        assert (await _read_response(reader)).endswith(b"ok")
+        writer.write(_post("/v1/messages"))
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert _status(head) == b"HTTP/1.1 429 Too Many Requests"
+        assert b"Retry-After: 3600" in head
+        assert len(upstream.requests) == 1
+
+    limits = [RateLimit(key="user", calls=1, renewal_period="hour")]
+    asyncio.run(_with_proxy(test, rate_limits=limits))
+
+
+def test_stats_endpoint_not_forwarded():
+    async def test(upstream, service, reader, writer):
+        writer.write(_post("/v1/messages"))
+        await _read_response(reader)
+        writer.write(b"GET /_gateway/stats HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        stats = json.loads(await reader.readexactly(length))
+        (limiter,) = stats["rate_limit"].values()
+        assert limiter["admitted"] == 1
+        assert len(upstream.requests) == 1
+
+    asyncio.run(_with_proxy(test))
+
+
+def test_stats_endpoint_requires_session_secret():
+    async def test(upstream, service, reader, writer):
+        writer.write(b"GET /_gateway/stats HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        head = await reader.readuntil(b"\r\n\r\n")
+        assert _status(head) == b"HTTP/1.1 401 Unauthorized"
+
+    asyncio.run(_with_proxy(test, secret="s3cret"))
+
+
+def test_fails_over_to_next_endpoint():
+    async def run():
+        failing, healthy = FakeUpstream(b"503 Service Unavailable"), FakeUpstream()
+        servers = [
+            await asyncio.start_server(u.handle, "127.0.0.1", 0) for u in (failing, healthy)
+        ]
+        hosts = [f"http://127.0.0.1:{s.sockets[0].getsockname()[1]}" for s in servers]
+        config = GatewayConfig(
+            databricks_host=hosts[0],
+            endpoint_name="a",
+            model="m",
+            azure_ad=AzureAdConfig(tenant_id="t", client_id="c"),
+            endpoints=[EndpointConfig(name="a"), EndpointConfig(name="b", host=hosts[1])],
+        )
+        proxy = GatewayProxy(config, FakeService())
+        for upstream in proxy.upstreams.values():
+            upstream.service = FakeService()
+        proxy_server = await proxy.start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", proxy_server.sockets[0].getsockname()[1]
+        )
+        try:
+            for _ in range(2):
+                writer.write(_post("/v1/messages"))
+                response = await _read_response(reader)
+                assert response.startswith(b"HTTP/1.1 200")
+            # The failing endpoint is cooling down, so the second request skips it
+            assert len(failing.requests) == 1
+            assert len(healthy.requests) == 2
+            assert healthy.requests[0][0] == "/serving-endpoints/b/invocations/v1/messages"
+        finally:
+            writer.close()
+            proxy_server.close()
+            for server in servers:
+                server.close()
+
+    asyncio.run(run())
+
+
+DETERMINISTIC = b'{"model": "m", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}'
+
+
+async def _read_stream_response(reader) -> bytes:
+    head = await reader.readuntil(b"\r\n\r\n")
+    if b"Content-Length" in head:
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        return head + await reader.readexactly(length)
+    return head + await reader.readuntil(b"0\r\n\r\n")
+
+
+def test_response_cache_serves_repeats_without_upstream():
+    async def test(upstream, service, reader, writer):
+        writer.write(_post("/v1/messages", DETERMINISTIC))
+        first = await _read_response(reader)
+        # Key order and metadata do not matter; a different temperature is not cached
+        same = json.dumps({**json.loads(DETERMINISTIC), "metadata": {"user_id": "x"}})
+        writer.write(_post("/v1/messages", same.encode()))
+        second = await _read_response(reader)
+        warm = DETERMINISTIC.replace(b'"temperature": 0', b'"temperature": 1')
+        writer.write(_post("/v1/messages", warm))
+        await _read_response(reader)
+
+        assert first.endswith(b"ok") and second.endswith(b"ok")
+        assert b"X-Gateway-Cache: hit" in second
+        assert len(upstream.requests) == 2
+        assert service.calls == 2
+
+    asyncio.run(_with_proxy(test, response_cache=ResponseCacheConfig(enabled=True)))
+
+
+def test_response_cache_coalesces_concurrent_streams():
+    async def test(upstream, service, reader, writer):
+        port = writer.get_extra_info("peername")[1]
+        others = [await asyncio.open_connection("127.0.0.1", port) for _ in range(2)]
+        for w in [writer] + [w for _, w in others]:
+            w.write(_post("/v1/stream", DETERMINISTIC))
+        # The first event is relayed to the first client while the others wait on it
+        await asyncio.wait_for(reader.readuntil(b"data: 1\n\n\r\n"), timeout=2)
+        await asyncio.sleep(0.05)
+        upstream.release_second_event.set()
+        await asyncio.wait_for(reader.readuntil(b"0\r\n\r\n"), timeout=2)
+        for r, w in others:
+            response = await asyncio.wait_for(_read_stream_response(r), timeout=2)
+            assert b"X-Gateway-Cache: hit" in response
+            assert response.endswith(b"".join(SSE_EVENTS))
+            w.close()
+        assert len(upstream.requests) == 1
+
+    asyncio.run(_with_proxy(test, response_cache=ResponseCacheConfig(enabled=True)))
+
+
+def test_conversation_sticks_to_one_endpoint():
+    async def run():
+        upstreams = [FakeUpstream(), FakeUpstream()]
+        servers = [await asyncio.start_server(u.handle, "127.0.0.1", 0) for u in upstreams]
+        hosts = [f"http://127.0.0.1:{s.sockets[0].getsockname()[1]}" for s in servers]
+        config = GatewayConfig(
+            databricks_host=hosts[0],
+            endpoint_name="a",
+            model="m",
+            azure_ad=AzureAdConfig(tenant_id="t", client_id="c"),
+            endpoints=[EndpointConfig(name="a"), EndpointConfig(name="b", host=hosts[1])],
+        )
+        proxy = GatewayProxy(config, FakeService())
+        for upstream in proxy.upstreams.values():
+            upstream.service = FakeService()
+        proxy_server = await proxy.start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", proxy_server.sockets[0].getsockname()[1]
+        )
+        try:
+            messages = [{"role": "user", "content": "task"}]
+            for turn in range(4):
+                body = json.dumps({"model": "m", "system": "s", "messages": messages})
+                writer.write(_post("/v1/messages", body.encode()))
+                await _read_response(reader)
+                messages = messages + [{"role": "assistant", "content": f"turn {turn}"}]
+            assert sorted(len(u.requests) for u in upstreams) == [0, 4]
+            assert proxy.stats()["sticky"] == {"pinned": 4, "rebalanced": 0}
+        finally:
+            writer.close()
+            proxy_server.close()
+            for server in servers:
+                server.close()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("budget_ratio", [1.0, 0.0])
+def test_hedges_a_stalled_request_to_the_next_endpoint(budget_ratio):
+    async def run():
+        stalled, healthy = FakeUpstream(delay=0.5), FakeUpstream()
+        servers = [await asyncio.start_server(u.handle, "127.0.0.1", 0) for u in (stalled, healthy)]
+        hosts = [f"http://127.0.0.1:{s.sockets[0].getsockname()[1]}" for s in servers]
+        config = GatewayConfig(
+            databricks_host=hosts[0],
+            endpoint_name="a",
+            model="m",
+            azure_ad=AzureAdConfig(tenant_id="t", client_id="c"),
+            endpoints=[EndpointConfig(name="a"), EndpointConfig(name="b", host=hosts[1])],
+            hedging=HedgingConfig(enabled=True, budget_ratio=budget_ratio),
+        )
+        proxy = GatewayProxy(config, FakeService())
+        for upstream in proxy.upstreams.values():
+            upstream.service = FakeService()
+            for _ in range(MIN_SAMPLES):
+                proxy.hedger.observe(upstream.key, 0.02)
+        proxy_server = await proxy.start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", proxy_server.sockets[0].getsockname()[1]
+        )
+        try:
+            started = time.monotonic()
+            writer.write(_post("/v1/messages", b'{"messages": []}'))
+            response = await asyncio.wait_for(_read_response(reader), timeout=2)
+            elapsed = time.monotonic() - started
+            assert response.startswith(b"HTTP/1.1 200") and response.endswith(b"ok")
+            hedging = proxy.stats()["hedging"]
+            if budget_ratio:
+                # The copy on "b" answered first; the stalled attempt was abandoned
+                assert elapsed < 0.4
+                assert (hedging["hedged"], hedging["hedge_wins"]) == (1, 1)
+                assert len(healthy.requests) == 1
+            else:
+                assert elapsed >= 0.5
+                assert (hedging["hedged"], hedging["skipped_budget"]) == (0, 1)
+                assert healthy.requests == []
+            assert len(stalled.requests) == 1
+        finally:
+            writer.close()
+            proxy_server.close()
+            for server in servers:
+                server.close()
+
+    asyncio.run(run())
+
+
+def test_hedge_delay_starts_when_the_request_is_sent():
+    async def run():
+        upstreams = [FakeUpstream(), FakeUpstream()]
+        servers = [await asyncio.start_server(u.handle, "127.0.0.1", 0) for u in upstreams]
+        hosts = [f"http://127.0.0.1:{s.sockets[0].getsockname()[1]}" for s in servers]
+        config = GatewayConfig(
+            databricks_host=hosts[0],
+            endpoint_name="a",
+            model="m",
+            azure_ad=AzureAdConfig(tenant_id="t", client_id="c"),
+            endpoints=[EndpointConfig(name="a"), EndpointConfig(name="b", host=hosts[1])],
+            hedging=HedgingConfig(enabled=True, budget_ratio=1.0),
+        )
+        proxy = GatewayProxy(config, FakeService())
+        for upstream in proxy.upstreams.values():
+            # A token fetch far slower than the hedge delay is not upstream latency
+            upstream.service = FakeService(delay=0.3)
+            for _ in range(MIN_SAMPLES):
+                proxy.hedger.observe(upstream.key, 0.02)
+        proxy_server = await proxy.start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", proxy_server.sockets[0].getsockname()[1]
+        )
+        try:
+            writer.write(_post("/v1/messages", b'{"messages": []}'))
+            response = await asyncio.wait_for(_read_response(reader), timeout=2)
+            assert response.startswith(b"HTTP/1.1 200")
+            assert proxy.stats()["hedging"]["hedged"] == 0
+            assert sorted(len(u.requests) for u in upstreams) == [0, 1]
+        finally:
+            writer.close()
+            proxy_server.close()
+            for server in servers:
+                server.close()
+
+    asyncio.run(run())
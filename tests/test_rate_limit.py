@@ -0,0 +1,99 @@
+"""Tests for credential_helper.rate_limit."""
+
+import asyncio
+
+import pytest
+
+from config.settings import RateLimit
+from credential_helper.rate_limit import QueueFullError, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_bucket_allows_burst_up_to_capacity(clock):
+    bucket = TokenBucket(calls=3, period_seconds=60, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(20.0)
+
+
+def test_bucket_queues_in_fifo_order(clock):
+    bucket = TokenBucket(calls=1, period_seconds=10, clock=clock)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(10.0)
+    assert bucket.reserve() == pytest.approx(20.0)
+
+
+def test_bucket_refills_over_time(clock):
+    bucket = TokenBucket(calls=2, period_seconds=60, clock=clock)
+    bucket.reserve()
+    bucket.reserve()
+    clock.now = 30.0
+    assert bucket.reserve() == 0.0
+
+
+def test_limiter_waits_for_slowest_bucket(clock):
+    limiter = RateLimiter(
+        [RateLimit(key="endpoint", calls=100), RateLimit(key="user", calls=2)], clock=clock
+    )
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() == pytest.approx(30.0)
+    assert limiter.stats.admitted == 3
+    assert limiter.stats.queued == 1
+    assert limiter.stats.max_wait_seconds == pytest.approx(30.0)
+
+
+def test_acquire_sleeps_when_queued(mocker, clock):
+    sleep = mocker.patch("credential_helper.rate_limit.asyncio.sleep", mocker.AsyncMock())
+    limiter = RateLimiter([RateLimit(key="user", calls=1)], clock=clock)
+
+    async def run():
+        await limiter.acquire()
+        return await limiter.acquire()
+
+    assert asyncio.run(run()) == pytest.approx(60.0)
+    sleep.assert_awaited_once()
+
+
+def test_acquire_rejects_beyond_max_wait(mocker, clock):
+    mocker.patch("credential_helper.rate_limit.asyncio.sleep", mocker.AsyncMock())
+    limiter = RateLimiter([RateLimit(key="user", calls=2)], clock=clock, max_wait=45.0)
+
+    async def run():
+        waits = [await limiter.acquire() for _ in range(3)]
+        with pytest.raises(QueueFullError) as excinfo:
+            await limiter.acquire()
+        return waits, excinfo.value.wait
+
+    waits, rejected_wait = asyncio.run(run())
+    assert waits == [0.0, 0.0, pytest.approx(30.0)]
+    assert rejected_wait == pytest.approx(60.0)
+    assert (limiter.stats.admitted, limiter.stats.rejected) == (3, 1)
+
+
+def test_cancelled_waiter_refunds_its_slot(clock):
+    limiter = RateLimiter([RateLimit(key="user", calls=1)], clock=clock)
+
+    async def run():
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
+    # Without the refund the next request would queue behind the abandoned one
+    assert limiter.buckets["user"].wait() == pytest.approx(60.0)
+    assert limiter.stats.cancelled == 1
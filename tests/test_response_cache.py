@@ -0,0 +1,146 @@
+"""Tests for credential_helper.response_cache."""
+
+import asyncio
+import json
+
+import pytest
+
+from config.settings import ResponseCacheConfig
+from credential_helper import response_cache
+from credential_helper.response_cache import CachedResponse, ResponseCache, ResponseCapture
+
+BODY = {"model": "m", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _cache(tmp_path, clock=None, **config) -> ResponseCache:
+    return ResponseCache(
+        ResponseCacheConfig(enabled=True, **config),
+        "ep",
+        "m",
+        directory=tmp_path / "responses",
+        clock=clock or Clock(),
+    )
+
+
+def _key(cache, body=BODY, target="/v1/messages", headers=None, method="POST"):
+    return cache.key(method, target, headers or [], json.dumps(body).encode())
+
+
+def _response(body: bytes = b"ok", created: float = 1000.0) -> CachedResponse:
+    return CachedResponse("HTTP/1.1 200 OK", [("Content-Type", "text/plain")], body, created)
+
+
+def test_key_is_canonical_and_covers_what_changes_the_response(tmp_path):
+    cache = _cache(tmp_path)
+    key = _key(cache)
+
+    reordered = dict(reversed(list(BODY.items())))
+    assert _key(cache, {**reordered, "metadata": {"user_id": "session-2"}}) == key
+    assert _key(cache, {**BODY, "temperature": 0.0}) == key
+    assert _key(cache, {**BODY, "max_tokens": 5}) != key
+    assert _key(cache, target="/v1/messages/count_tokens") != key
+    assert _key(cache, headers=[("Anthropic-Beta", "x")]) != key
+    assert _cache(tmp_path).key("POST", "/v1/messages", [], json.dumps(BODY).encode()) == key
+    other_endpoint = ResponseCache(ResponseCacheConfig(), "other", "m", tmp_path)
+    assert _key(other_endpoint) != key
+
+
+@pytest.mark.parametrize(
+    ("method", "body"),
+    [
+        ("GET", BODY),
+        ("POST", {**BODY, "temperature": 1}),
+        ("POST", {k: v for k, v in BODY.items() if k != "temperature"}),
+        ("POST", [BODY]),
+    ],
+)
+def test_nondeterministic_requests_are_not_cached(tmp_path, method, body):
+    assert _key(_cache(tmp_path), body, method=method) is None
+    assert _cache(tmp_path).key("POST", "/v1/messages", [], b"not json") is None
+
+
+def test_memory_then_disk_then_expiry(tmp_path):
+    clock = Clock()
+
+    async def run():
+        cache = _cache(tmp_path, clock, memory_entries=1, ttl_seconds=60)
+        assert await cache.begin("a") == (None, True)
+        cache.finish("a", _response(b"A", clock.now))
+        await cache.store("a", _response(b"A", clock.now))
+        assert (await cache.begin("a"))[0].body == b"A"
+
+        # A new proxy process finds it on disk
+        fresh = _cache(tmp_path, clock, ttl_seconds=60)
+        assert (await fresh.begin("a"))[0].body == b"A"
+        assert (fresh.stats.disk_hits, cache.stats.memory_hits) == (1, 1)
+
+        clock.now += 61
+        assert await _cache(tmp_path, clock, ttl_seconds=60).begin("a") == (None, True)
+        assert not (tmp_path / "responses" / "a.bin").exists()
+
+    asyncio.run(run())
+
+
+def test_disk_tier_evicts_oldest_past_size_bound(tmp_path):
+    clock = Clock()
+    size = len(_response(b"x" * 100).encode())
+
+    async def run():
+        cache = _cache(tmp_path, clock, max_disk_bytes=2 * size)
+        for key in ("a", "b", "c"):
+            clock.now += 1
+            await cache.store(key, _response(b"x" * 100, clock.now))
+        names = sorted(p.name for p in (tmp_path / "responses").iterdir())
+        assert names == ["b.bin", "c.bin"]
+        assert cache.stats.evicted == 1
+
+    asyncio.run(run())
+
+
+def test_waiters_share_the_leaders_response(tmp_path):
+    async def run():
+        cache = _cache(tmp_path)
+        assert await cache.begin("k") == (None, True)
+        waiters = [asyncio.ensure_future(cache.begin("k")) for _ in range(3)]
+        await asyncio.sleep(0)
+        cache.finish("k", _response(b"shared"))
+        results = await asyncio.gather(*waiters)
+        assert [(r.body, leader) for r, leader in results] == [(b"shared", False)] * 3
+        assert cache.stats.coalesced == 3
+
+        # When the leader's response is not cacheable, waiters go upstream themselves
+        assert await cache.begin("j") == (None, True)
+        waiter = asyncio.ensure_future(cache.begin("j"))
+        await asyncio.sleep(0)
+        cache.finish("j", None)
+        assert await waiter == (None, False)
+
+    asyncio.run(run())
+
+
+def test_capture_keeps_only_complete_small_successes(monkeypatch):
+    capture = ResponseCapture()
+    capture.status, capture.headers = "HTTP/1.1 200 OK", [("Date", "x"), ("Content-Type", "a")]
+    capture.add(b"o")
+    assert capture.response() is None  # not complete yet
+    capture.add(b"k")
+    capture.complete = True
+    assert capture.response().body == b"ok"
+    assert capture.response().headers == [("Content-Type", "a")]
+
+    capture.status = "HTTP/1.1 429 Too Many Requests"
+    assert capture.response() is None
+
+    monkeypatch.setattr(response_cache, "MAX_ENTRY_BYTES", 4)
+    big = ResponseCapture()
+    big.status, big.complete = "HTTP/1.1 200 OK", True
+    big.add(b"12345")
+    assert big.response() is None
@@ -0,0 +1,116 @@
+"""Tests for credential_helper.routing."""
+
+import json
+
+import pytest
+
+from credential_helper.routing import COOLDOWN_SECONDS, Router, prefix_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_unsampled_endpoints_tried_first(clock):
+    router = Router(["a", "b"], clock=clock)
+    router.record("a", 0.5, ok=True)
+    assert router.ranked() == ["b", "a"]
+
+
+def test_ranks_by_ewma_latency(clock):
+    router = Router(["a", "b"], clock=clock)
+    router.record("a", 0.5, ok=True)
+    router.record("b", 0.1, ok=True)
+    assert router.ranked() == ["b", "a"]
+    for _ in range(20):
+        router.record("b", 1.0, ok=True)
+    assert router.ranked() == ["a", "b"]
+
+
+def test_failure_cools_endpoint_down(clock):
+    router = Router(["a", "b"], clock=clock)
+    router.record("a", 0.1, ok=True)
+    router.record("b", 0.5, ok=True)
+    router.record("a", 0.1, ok=False)
+    assert router.ranked() == ["b", "a"]
+    assert router.stats["a"].failures == 1
+
+
+def test_retry_after_sets_cooldown(clock):
+    router = Router(["a", "b"], clock=clock)
+    router.record("b", 1.0, ok=True)
+    router.record("a", 0.1, ok=False, retry_after=30)
+    clock.now = COOLDOWN_SECONDS + 1
+    assert router.ranked()[0] == "b"
+    clock.now = 31
+    router.stats["a"].error_rate = 0.0
+    assert router.ranked()[0] == "a"
+
+
+def test_error_rate_penalizes_score(clock):
+    router = Router(["a", "b"], clock=clock)
+    router.record("a", 0.1, ok=True)
+    router.record("a", 0.1, ok=False)
+    router.record("b", 0.3, ok=True)
+    clock.now = 100
+    assert router.ranked() == ["b", "a"]
+
+
+def _body(system: str, first: str, *later: str) -> bytes:
+    messages = [{"role": "user", "content": first}]
+    messages += [{"role": "assistant", "content": text} for text in later]
+    return json.dumps({"model": "m", "system": system, "messages": messages}).encode()
+
+
+def test_prefix_key_follows_the_conversation_prefix():
+    key = prefix_key(_body("sys", "task"))
+    assert key == prefix_key(_body("sys", "task", "reply", "more"))
+    assert key != prefix_key(_body("other sys", "task"))
+    assert key != prefix_key(_body("sys", "other task"))
+    assert prefix_key(b'{"messages": []}') is None
+    assert prefix_key(b"not json") is None
+
+
+def test_affinity_pins_conversation_regardless_of_latency(clock):
+    router = Router(["a", "b", "c"], clock=clock)
+    affinity = prefix_key(_body("sys", "task"))
+    pinned = router.ranked(affinity)[0]
+    router.record(pinned, 5.0, ok=True)
+    for other in {"a", "b", "c"} - {pinned}:
+        router.record(other, 0.01, ok=True)
+    assert router.ranked(affinity)[0] == pinned
+    assert router.pinned == 2
+
+
+def test_affinity_spreads_conversations_and_moves_only_from_unhealthy(clock):
+    router = Router(["a", "b", "c"], clock=clock)
+    affinities = [prefix_key(_body("sys", f"task {i}")) for i in range(300)]
+    before = {a: router.ranked(a)[0] for a in affinities}
+    assert all(list(before.values()).count(k) > 50 for k in "abc")
+
+    router.record("a", 0.1, ok=False)
+    during = {a: router.ranked(a)[0] for a in affinities}
+    assert all(during[a] != "a" for a in affinities)
+    assert all(during[a] == before[a] for a in affinities if before[a] != "a")
+    assert router.rebalanced == sum(1 for a in affinities if before[a] == "a")
+
+    clock.now = COOLDOWN_SECONDS + 1
+    assert {a: router.ranked(a)[0] for a in affinities} == before
+
+
+def test_adding_an_endpoint_moves_only_its_share(clock):
+    affinities = [prefix_key(_body("sys", f"task {i}")) for i in range(300)]
+    two = Router(["a", "b"], clock=clock)
+    three = Router(["a", "b", "c"], clock=clock)
+    moved = [a for a in affinities if two.ranked(a)[0] != three.ranked(a)[0]]
+    assert all(three.ranked(a)[0] == "c" for a in moved)
+    assert len(moved) < 150
@@ -0,0 +1,146 @@
+"""Tests for admin.simulate_rate_limits."""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from admin.simulate_rate_limits import (  # noqa: E402
+    candidates,
+    load_trace,
+    make_trace,
+    queue_waits,
+    simulate,
+    simulate_rejections,
+    synthetic_trace,
+)
+from config.settings import RateLimit  # noqa: E402
+from credential_helper.rate_limit import RateLimiter, TokenBucket  # noqa: E402
+
+LIMITS = [RateLimit("endpoint", 6), RateLimit("user", 3)]
+
+
+@pytest.fixture
+def trace():
+    rng = np.random.default_rng(1)
+    times = np.cumsum(rng.exponential(2.0, 400))
+    users = rng.choice(["a", "a", "a", "b", "c"], 400)
+    return make_trace(times, users)
+
+
+def test_queue_waits_match_rate_limiter(trace):
+    """The closed form gives the same waits as stepping the proxy's limiters."""
+    now = [0.0]
+    endpoint = RateLimiter([LIMITS[0]], clock=lambda: now[0])
+    users = {name: RateLimiter([LIMITS[1]], clock=lambda: now[0]) for name in trace.user_names}
+    expected = []
+    for when, user in zip(trace.times, trace.users):
+        now[0] = when
+        expected.append(max(endpoint.reserve(), users[trace.user_names[user]].reserve()))
+
+    waits = queue_waits(trace, LIMITS)
+
+    assert max(expected) > 10
+    np.testing.assert_allclose(waits, expected, atol=1e-6)
+
+
+def _reference_rejections(trace, limits):
+    """One scalar simulation: admit only if every bucket has a whole token."""
+    now = [0.0]
+
+    def bucket(key):
+        limit = next((x for x in limits if x.key == key), None)
+        return TokenBucket(limit.calls, 60, lambda: now[0]) if limit else None
+
+    endpoint = bucket("endpoint")
+    users = {}
+    rejected = np.zeros(len(trace.user_names), dtype=np.int64)
+    for when, user in zip(trace.times, trace.users):
+        now[0] = when
+        if user not in users:
+            users[user] = bucket("user")
+        buckets = [b for b in (endpoint, users[user]) if b is not None]
+        for b in buckets:  # refill without taking a token
+            b.reserve()
+            b._tokens += 1
+        if all(b._tokens >= 1 for b in buckets):
+            for b in buckets:
+                b._tokens -= 1
+        else:
+            rejected[user] += 1
+    return rejected
+
+
+def test_rejections_match_scalar_reference_for_every_candidate(trace):
+    configs = candidates([0, 4, 6, 20], [0, 2, 3])
+
+    rejected = simulate_rejections(trace, configs)
+
+    assert rejected.shape == (len(configs), len(trace.user_names))
+    for limits, row in zip(configs, rejected):
+        np.testing.assert_array_equal(row, _reference_rejections(trace, limits))
+    assert rejected[0].sum() == 0  # no limits at all
+    assert rejected.sum() > 0
+
+
+def test_rejections_match_reference_across_quiet_gaps(monkeypatch):
+    """Bursts separated by more than the renewal period are stepped side by side."""
+    monkeypatch.setattr("admin.simulate_rate_limits.REFILL_BLOCK", 32)
+    rng = np.random.default_rng(2)
+    sizes = [150, 40, 300, 5]
+    times = np.concatenate(
+        [1000.0 * i + np.cumsum(rng.exponential(0.5, n)) for i, n in enumerate(sizes)]
+    )
+    trace = make_trace(times, rng.choice(["a", "a", "b", "c"], len(times)))
+    configs = candidates([0, 10, 30, 10_000], [0, 4, 10_000])
+
+    rejected = simulate_rejections(trace, configs)
+
+    for limits, row in zip(configs, rejected):
+        np.testing.assert_array_equal(row, _reference_rejections(trace, limits))
+    assert rejected[-1].sum() == 0  # never short of a token: skipped, not simulated
+    assert rejected.sum() > 0
+
+
+def test_simulate_reports_rejections_fairness_and_waits(trace):
+    unlimited, tight = simulate(trace, [[], LIMITS])
+
+    assert (unlimited["rejected"], unlimited["max_wait_seconds"]) == (0, 0.0)
+    assert unlimited["fairness"] == 1.0
+    assert tight["label"] == "endpoint=6/minute, user=3/minute"
+    assert 0 < tight["rejection_rate"] < 1
+    # The heaviest user ("a") loses the most, so acceptance is uneven across users
+    assert tight["fairness"] < 1.0
+    assert tight["worst_user_rejection_rate"] > tight["rejection_rate"]
+    assert 0 < tight["p50_wait_seconds"] <= tight["p99_wait_seconds"] <= tight["max_wait_seconds"]
+
+
+def test_synthetic_trace_is_sorted_bursty_and_seeded():
+    trace = synthetic_trace(users=10, days=7, seed=3)
+
+    assert len(trace) > 100
+    assert np.all(np.diff(trace.times) >= 0)
+    assert trace.user_names[0] == "user-000"
+    hours = (trace.times % 86400) // 3600
+    assert hours.min() >= 9
+    np.testing.assert_array_equal(synthetic_trace(users=10, days=7, seed=3).times, trace.times)
+
+
+def test_load_trace_from_inference_export(tmp_path):
+    path = tmp_path / "export.jsonl"
+    rows = [
+        {"request_time": "2025-03-01T10:00:01Z", "requester": "b", "endpoint_name": "gw"},
+        {"request_time": "2025-03-01T10:00:00Z", "requester": "a", "endpoint_name": "gw"},
+        {"request_time": "2025-03-01T10:00:02Z", "endpoint_name": "other"},
+        {"requester": "c", "endpoint_name": "gw"},
+    ]
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n")
+    pytest.importorskip("pyarrow")
+
+    trace = load_trace([path])
+    assert trace.user_names == ["a", "b", "unknown"]
+    assert trace.times.tolist() == [1740823200.0, 1740823201.0, 1740823202.0]
+
+    trace = load_trace([path], endpoint="gw")
+    assert [trace.user_names[u] for u in trace.users] == ["a", "b"]
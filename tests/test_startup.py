@@ -0,0 +1,23 @@
+"""Tests for the credential helper's import-free cache-hit path."""
+
+import pytest
+
+from benchmarks.startup import FORBIDDEN_MODULES, parse_importtime, prepare_home, run_once
+
+
+@pytest.mark.parametrize("check", [False, True])
+def test_cache_hit_imports_only_stdlib(tmp_path, check):
+    config_path = prepare_home(tmp_path)
+    _, modules = run_once(config_path, tmp_path, check)
+    assert "credential_helper.provider" in modules
+    heavy = [m for m in modules if m.split(".")[0] in FORBIDDEN_MODULES]
+    assert heavy == []
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |   _json\n"
+        "import time:       200 |        300 | json\n"
+    )
+    assert parse_importtime(stderr) == {"_json": (1, 100), "json": (0, 300)}
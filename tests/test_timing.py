@@ -0,0 +1,111 @@
+"""Tests for phase timing, the metrics file and the per-phase summary."""
+
+import json
+
+import pytest
+
+from credential_helper import timing
+
+
+def test_spans_are_recorded_only_inside_collect():
+    with timing.span("outside"):
+        pass
+    with timing.collect(command="get") as collector:
+        with timing.span("load_config"):
+            pass
+        with timing.span("keyring_get"):
+            pass
+        with timing.span("keyring_get"):
+            pass
+        timing.annotate(outcome="cache_hit")
+    record = collector.record()
+    assert list(record["phases"]) == ["load_config", "keyring_get"]
+    assert record["command"] == "get"
+    assert record["outcome"] == "cache_hit"
+    assert record["total_ms"] >= sum(record["phases"].values())
+
+
+def test_span_records_errors():
+    with timing.collect() as collector:
+        try:
+            with timing.span("token_exchange"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+    assert collector.spans[0].error == "RuntimeError"
+
+
+def test_write_record_rotates(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    for i in range(5):
+        timing.write_record({"i": i}, path, max_bytes=1, backups=2)
+    assert json.loads(path.read_text()) == {"i": 4}
+    assert json.loads((tmp_path / "metrics.jsonl.1").read_text()) == {"i": 3}
+    assert json.loads((tmp_path / "metrics.jsonl.2").read_text()) == {"i": 2}
+    assert not (tmp_path / "metrics.jsonl.3").exists()
+
+
+def test_emit_spools_otlp_without_network(tmp_path, mocker, monkeypatch):
+    mocker.patch.object(timing, "METRICS_FILE", tmp_path / "metrics.jsonl")
+    mocker.patch.object(timing, "OTLP_SPOOL_FILE", tmp_path / "otlp_spool.jsonl")
+    monkeypatch.setenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://collector:4318/")
+    post = mocker.patch.object(timing, "post_otlp")
+    with timing.collect(command="get") as collector:
+        with timing.span("load_config"):
+            pass
+    timing.emit(collector)
+    record = json.loads((tmp_path / "metrics.jsonl").read_text())
+    assert "load_config" in record["phases"]
+    post.assert_not_called()
+    assert timing.otlp_url() == "http://collector:4318/v1/traces"
+    (spooled,) = timing.read_records([tmp_path / "otlp_spool.jsonl"])
+    assert spooled["resourceSpans"][0]["scopeSpans"][0]["spans"][1]["name"] == "load_config"
+
+
+def test_export_spool_batches_and_keeps_failed_batches(tmp_path, mocker):
+    spool = tmp_path / "otlp_spool.jsonl"
+    for name in ("a", "b"):
+        timing.write_record({"resourceSpans": [{"name": name}]}, spool)
+    post = mocker.patch.object(timing, "post_otlp", side_effect=OSError("down"))
+    with pytest.raises(OSError):
+        timing.export_spool("http://c/v1/traces", spool)
+
+    timing.write_record({"resourceSpans": [{"name": "c"}]}, spool)
+    post.side_effect = None
+    assert timing.export_spool("http://c/v1/traces", spool) == 3
+    batches = [call.args[0]["resourceSpans"] for call in post.call_args_list[1:]]
+    assert batches == [[{"name": "a"}, {"name": "b"}], [{"name": "c"}]]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_export_spool_sends_rotated_backup_first(tmp_path, mocker):
+    spool = tmp_path / "otlp_spool.jsonl"
+    timing.write_record({"resourceSpans": [{"name": "old"}]}, spool)
+    timing.write_record({"resourceSpans": [{"name": "new"}]}, spool, max_bytes=0, backups=1)
+    post = mocker.patch.object(timing, "post_otlp")
+
+    assert timing.export_spool("http://c/v1/traces", spool) == 2
+    batches = [call.args[0]["resourceSpans"] for call in post.call_args_list]
+    assert batches == [[{"name": "old"}], [{"name": "new"}]]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_otlp_payload_parents_phase_spans():
+    with timing.collect(command="get") as collector:
+        with timing.span("token_exchange"):
+            pass
+    spans = timing._otlp_payload(collector)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, phase = spans
+    assert phase["name"] == "token_exchange"
+    assert phase["parentSpanId"] == root["spanId"]
+    assert phase["traceId"] == root["traceId"]
+
+
+def test_summarize_percentiles(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    for ms in range(1, 101):
+        timing.write_record({"total_ms": ms, "phases": {"keyring_get": ms}}, path)
+    path.open("a").write("{torn\n")
+    summary = timing.summarize(timing.read_records([path]))
+    assert summary["keyring_get"] == {"count": 100, "p50_ms": 50, "p99_ms": 99}
+    assert summary["total"]["count"] == 100
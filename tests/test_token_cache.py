@@ -1,6 +1,7 @@
 """Tests for credential_helper.token_cache."""
 
 import json
+import os
 import time
 
 import pytest
@@ -9,17 +10,51 @@ from config.settings import TokenCacheConfig
 from credential_helper.token_cache import (
     EXPIRY_BUFFER_SECONDS,
     CachedToken,
+    REFRESH_RETRY_SECONDS,
+    TokenStore,
+    atomic_write_text,
+    claim_refresh_attempt,
     clear_cache,
+    compute_refresh_at,
+    refresh_lock,
     get_cached_token,
     save_token,
+    token_key,
 )
 
+KEY = "https://a.com|tenant|client|email"
+
 
 @pytest.fixture
 def file_config():
     return TokenCacheConfig(method="file", fallback="file")
 
 
+@pytest.fixture
+def cache_file(mocker, tmp_path):
+    import credential_helper.token_cache as tc
+
+    path = tmp_path / "token_cache.json"
+    mocker.patch.object(tc, "CACHE_DIR", tmp_path)
+    mocker.patch.object(tc, "CACHE_FILE", path)
+    mocker.patch.object(tc, "_file_store", None)
+    return path
+
+
+class FakeKeyring:
+    def __init__(self):
+        self.secrets: dict[str, str] = {}
+
+    def get_password(self, service, username):
+        return self.secrets.get(username)
+
+    def set_password(self, service, username, password):
+        self.secrets[username] = password
+
+    def delete_password(self, service, username):
+        del self.secrets[username]
+
+
 @pytest.fixture
 def valid_token():
     return CachedToken(
@@ -59,56 +94,227 @@ def test_cached_token_near_expiry(near_expiry_token):
     assert near_expiry_token.is_valid is False
 
 
-def test_file_save_and_get(mocker, file_config, valid_token):
+def test_file_save_and_get(cache_file, file_config, valid_token):
+    save_token(file_config, valid_token, KEY)
+    assert [p.name for p in cache_file.parent.iterdir()] == ["token_cache.json"]
+
+    result = get_cached_token(file_config, KEY)
+    assert result is not None
+    assert result.access_token == "valid-token"
+
+
+def test_get_cached_token_expired_returns_none(cache_file, file_config, expired_token):
+    save_token(file_config, expired_token, KEY)
+    assert get_cached_token(file_config, KEY) is None
+
+
+def test_clear_cache_deletes_file(cache_file, file_config, valid_token):
+    save_token(file_config, valid_token, KEY)
+    clear_cache(file_config)
+    assert not cache_file.exists()
+    assert get_cached_token(file_config, KEY) is None
+
+
+def test_clear_cache_single_key(cache_file, file_config, valid_token):
+    save_token(file_config, valid_token, KEY)
+    save_token(file_config, valid_token, "other")
+    clear_cache(file_config, KEY)
+    assert get_cached_token(file_config, KEY) is None
+    assert get_cached_token(file_config, "other") is not None
+
+
+def test_to_dict_roundtrip(valid_token):
+    data = valid_token.to_dict()
+    restored = CachedToken.from_dict(data)
+    assert restored.access_token == valid_token.access_token
+    assert restored.expires_at == valid_token.expires_at
+    assert restored.token_type == valid_token.token_type
+
+
+def test_needs_refresh_after_refresh_at():
+    token = CachedToken(
+        access_token="t", expires_at=time.time() + 3600, refresh_at=time.time() - 1
+    )
+    assert token.is_valid is True
+    assert token.needs_refresh is True
+
+
+def test_needs_refresh_false_without_refresh_at(valid_token):
+    assert valid_token.needs_refresh is False
+
+
+def test_compute_refresh_at_within_jitter_window():
+    for _ in range(50):
+        refresh_at = compute_refresh_at(1000.0, 3600, ratio=0.75, jitter_ratio=0.1)
+        assert 1000.0 + 3600 * 0.65 <= refresh_at <= 1000.0 + 3600 * 0.75
+
+
+def test_compute_refresh_at_before_expiry_buffer():
+    refresh_at = compute_refresh_at(0.0, 3600, ratio=1.0, jitter_ratio=0.0)
+    assert refresh_at == 3600 - EXPIRY_BUFFER_SECONDS
+
+
+def test_refresh_lock_no_wait_when_held(tmp_path):
+    lock_file = tmp_path / "refresh.lock"
+    with refresh_lock(lock_file=lock_file) as held:
+        assert held is True
+        # flock is per open file description, so a second open contends like another process
+        with refresh_lock(wait=False, lock_file=lock_file) as other:
+            assert other is False
+    with refresh_lock(wait=False, lock_file=lock_file) as held:
+        assert held is True
+
+
+def test_refresh_lock_times_out(tmp_path):
+    lock_file = tmp_path / "refresh.lock"
+    with refresh_lock(lock_file=lock_file):
+        with pytest.raises(TimeoutError):
+            with refresh_lock(timeout=0.2, lock_file=lock_file):
+                pass
+
+
+def test_refresh_attempt_backs_off_per_key(mocker):
+    now = time.time()
+    clock = mocker.patch("credential_helper.token_cache.time.time", return_value=now)
+    assert claim_refresh_attempt(KEY) is True
+    assert claim_refresh_attempt(KEY) is False
+    assert claim_refresh_attempt("other") is True
+    clock.return_value = now + REFRESH_RETRY_SECONDS / 2 - 1
+    assert claim_refresh_attempt(KEY) is False
+    clock.return_value = now + REFRESH_RETRY_SECONDS
+    assert claim_refresh_attempt(KEY) is True
+
+
+def test_tokens_for_different_keys_coexist(cache_file, file_config):
+    a = CachedToken(access_token="a", expires_at=time.time() + 3600)
+    b = CachedToken(access_token="b", expires_at=time.time() + 3600)
+    save_token(file_config, a, "https://a.com|t|c|email")
+    save_token(file_config, b, "https://b.com|t|c|email")
+
+    assert get_cached_token(file_config, "https://a.com|t|c|email").access_token == "a"
+    assert get_cached_token(file_config, "https://b.com|t|c|email").access_token == "b"
+    assert get_cached_token(file_config, "https://c.com|t|c|email") is None
+
+
+def test_file_store_evicts_least_recently_refreshed(cache_file, valid_token):
+    config = TokenCacheConfig(method="file", fallback="file", capacity=2)
+    for key in ("a", "b", "c"):
+        save_token(config, valid_token, key)
+
+    assert get_cached_token(config, "a") is None
+    assert list(json.loads(cache_file.read_text())["tokens"]) == ["b", "c"]
+
+
+def test_file_store_ignores_legacy_single_token_file(cache_file, file_config, valid_token):
+    cache_file.write_text(json.dumps(valid_token.to_dict()))
+    assert get_cached_token(file_config, KEY) is None
+
+
+def test_file_store_sees_rename_within_same_mtime(cache_file, file_config, valid_token):
+    save_token(file_config, valid_token, KEY)
+    mtime = cache_file.stat().st_mtime_ns
+    # Another process renames its write into place within the same timestamp tick
+    other = TokenStore(8)
+    other.put(KEY, CachedToken(access_token="other", expires_at=time.time() + 3600))
+    atomic_write_text(cache_file, json.dumps(other.to_dict()))
+    os.utime(cache_file, ns=(mtime, mtime))
+
+    assert get_cached_token(file_config, KEY).access_token == "other"
+
+
+def test_token_store_lookup_refreshes_recency(valid_token):
+    store = TokenStore(capacity=2)
+    store.put("a", valid_token)
+    store.put("b", valid_token)
+    store.get("a")
+    assert store.put("c", valid_token) == ["b"]
+    assert store.keys() == ["a", "c"]
+
+
+def test_token_key_covers_host_tenant_client_and_scopes(sample_config):
+    key = token_key(sample_config)
+    assert key.startswith(sample_config.host + "|")
+    assert sample_config.azure_ad.tenant_id in key
+    assert sample_config.azure_ad.client_id in key
+    assert token_key(sample_config.for_endpoint(sample_config.serving_endpoints[0])) == key
+
+
+def test_keyring_store_keeps_compact_lru_index(mocker, valid_token):
     import credential_helper.token_cache as tc
 
-    fake_dir = mocker.MagicMock()
-    mocker.patch.object(tc, "CACHE_DIR", fake_dir)
+    fake = FakeKeyring()
+    mocker.patch.dict("sys.modules", {"keyring": fake})
+    config = TokenCacheConfig(method="keyring", fallback="none", capacity=2)
+    for key in ("a", "b", "c"):
+        save_token(config, valid_token, key)
 
-    fake_file = mocker.MagicMock()
-    fake_file.exists.return_value = False
-    mocker.patch.object(tc, "CACHE_FILE", fake_file)
+    index = json.loads(fake.secrets[tc.KEYRING_INDEX_KEY])
+    assert index == [tc._keyring_slot("b"), tc._keyring_slot("c")]
+    assert set(fake.secrets) == {tc.KEYRING_INDEX_KEY, *index}
+    assert get_cached_token(config, "c").access_token == "valid-token"
+    assert get_cached_token(config, "a") is None
 
-    # Save
-    save_token(file_config, valid_token)
-    fake_file.write_text.assert_called_once()
+    clear_cache(config)
+    assert fake.secrets == {}
 
-    # Simulate read back
-    written_data = fake_file.write_text.call_args[0][0]
-    fake_file.exists.return_value = True
-    fake_file.read_text.return_value = written_data
 
-    result = get_cached_token(file_config)
-    assert result is not None
-    assert result.access_token == "valid-token"
+class SlowKeyring(FakeKeyring):
+    def __init__(self, delay: float = 0.0, error: Exception | None = None):
+        super().__init__()
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def get_password(self, service, username):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        time.sleep(self.delay)
+        return super().get_password(service, username)
 
 
-def test_get_cached_token_expired_returns_none(mocker, file_config, expired_token):
+def test_slow_keyring_times_out_and_is_skipped(mocker, cache_file, valid_token):
     import credential_helper.token_cache as tc
 
-    fake_file = mocker.MagicMock()
-    fake_file.exists.return_value = True
-    fake_file.read_text.return_value = json.dumps(expired_token.to_dict())
-    mocker.patch.object(tc, "CACHE_FILE", fake_file)
+    slow = SlowKeyring(delay=0.5)
+    mocker.patch.dict("sys.modules", {"keyring": slow})
+    config = TokenCacheConfig(method="keyring", fallback="file", keyring_timeout_seconds=0.05)
+    tc._file_set(KEY, valid_token, config.capacity)
+
+    start = time.monotonic()
+    assert get_cached_token(config, KEY).access_token == "valid-token"  # from the file
+    assert time.monotonic() - start < 0.4
+    assert json.loads(tc.KEYRING_HEALTH_FILE.read_text())["status"] == "slow"
 
-    result = get_cached_token(file_config)
-    assert result is None
+    get_cached_token(config, KEY)
+    assert slow.calls == 1
 
 
-def test_clear_cache_deletes_file(mocker, file_config):
+def test_broken_keyring_is_memoized_until_ttl(mocker, cache_file):
     import credential_helper.token_cache as tc
 
-    fake_file = mocker.MagicMock()
-    fake_file.exists.return_value = True
-    mocker.patch.object(tc, "CACHE_FILE", fake_file)
+    broken = SlowKeyring(error=RuntimeError("no Secret Service"))
+    mocker.patch.dict("sys.modules", {"keyring": broken})
+    config = TokenCacheConfig(method="keyring", fallback="file")
 
-    clear_cache(file_config)
-    fake_file.unlink.assert_called_once()
+    get_cached_token(config, KEY)
+    get_cached_token(config, KEY)
+    assert broken.calls == 1
+    assert tc.keyring_health()["status"] == "broken"
 
+    tc._keyring_health["checked_at"] -= tc.KEYRING_HEALTH_TTL_SECONDS + 1
+    get_cached_token(config, KEY)
+    assert broken.calls == 2
 
-def test_to_dict_roundtrip(valid_token):
-    data = valid_token.to_dict()
-    restored = CachedToken.from_dict(data)
-    assert restored.access_token == valid_token.access_token
-    assert restored.expires_at == valid_token.expires_at
-    assert restored.token_type == valid_token.token_type
+
+def test_available_keyring_health_written_once(mocker, cache_file):
+    import credential_helper.token_cache as tc
+
+    mocker.patch.dict("sys.modules", {"keyring": FakeKeyring()})
+    write = mocker.spy(tc, "atomic_write_text")
+    config = TokenCacheConfig(method="keyring", fallback="none")
+
+    get_cached_token(config, KEY)
+    get_cached_token(config, KEY)
+    assert write.call_count == 1
+    assert tc.keyring_health()["status"] == "available"
@@ -13,7 +13,7 @@ def test_exchange_token_success(mocker):
         "expires_in": 3600,
         "token_type": "Bearer",
     }
-    mocker.patch("credential_helper.token_exchange.requests.post", return_value=mock_response)
+    mocker.patch("credential_helper.http_client.post", return_value=mock_response)
 
     result = exchange_token("https://db.com/oidc/v1/token", "jwt-abc")
 
@@ -32,7 +32,7 @@ def test_exchange_token_correct_params(mocker):
         "token_type": "Bearer",
     }
     mock_post = mocker.patch(
-        "credential_helper.token_exchange.requests.post", return_value=mock_response
+        "credential_helper.http_client.post", return_value=mock_response
     )
 
     exchange_token("https://db.com/oidc/v1/token", "my-jwt")
@@ -54,7 +54,7 @@ def test_exchange_token_error(mocker, status_code):
     mock_response = mocker.Mock()
     mock_response.status_code = status_code
     mock_response.text = "error body"
-    mocker.patch("credential_helper.token_exchange.requests.post", return_value=mock_response)
+    mocker.patch("credential_helper.http_client.post", return_value=mock_response)
 
     with pytest.raises(RuntimeError, match=f"HTTP {status_code}"):
         exchange_token("https://db.com/oidc/v1/token", "jwt")
@@ -0,0 +1,119 @@
+"""Tests for admin.wait_ready, against the emulator's serving endpoints API."""
+
+import asyncio
+import time
+
+import pytest
+
+from admin import provision
+from admin.wait_ready import ReadinessTarget, _Client, endpoint_status, wait_for_ready
+from credential_helper import http_client
+from emulator.server import Emulator, EmulatorSettings
+
+READY_SECONDS = 0.3
+FAST = {"initial_interval": 0.02, "max_interval": 0.1}
+
+
+@pytest.fixture(scope="module")
+def running_emulator(tmp_path_factory):
+    settings = EmulatorSettings(endpoint_ready_seconds=READY_SECONDS)
+    with Emulator(tmp_path_factory.mktemp("emulator"), settings) as emu:
+        yield emu
+
+
+@pytest.fixture
+def emulator(running_emulator, monkeypatch):
+    for name, value in running_emulator.env().items():
+        monkeypatch.setenv(name, value)
+    return running_emulator
+
+
+def _create(emulator: Emulator, name: str) -> ReadinessTarget:
+    since = time.monotonic()
+    response = http_client.post(
+        f"{emulator.url}/api/2.0/serving-endpoints", json={"name": name, "config": {}}
+    )
+    assert response.status_code == 200
+    return ReadinessTarget(emulator.url, name, "admin-token", since=since)
+
+
+@pytest.mark.parametrize(
+    ("state", "status"),
+    [
+        ({"ready": "READY", "config_update": "NOT_UPDATING"}, "ready"),
+        ({"ready": "READY", "config_update": "IN_PROGRESS"}, "pending"),
+        ({"ready": "NOT_READY", "config_update": "IN_PROGRESS"}, "pending"),
+        ({"ready": "NOT_READY", "config_update": "UPDATE_FAILED"}, "failed"),
+    ],
+)
+def test_endpoint_status(state, status):
+    assert endpoint_status({"state": state}) == status
+
+
+def test_waits_for_many_endpoints_concurrently(emulator):
+    targets = [_create(emulator, f"concurrent-{i}") for i in range(5)]
+    start = time.monotonic()
+
+    results = wait_for_ready(targets, timeout=5, **FAST)
+
+    assert all(r.ready for r in results)
+    assert [r.name for r in results] == [t.name for t in targets]
+    assert all(r.seconds >= READY_SECONDS and r.polls > 1 for r in results)
+    # Polled side by side, not one endpoint after another
+    assert time.monotonic() - start < 2 * READY_SECONDS + 0.5
+
+
+def test_deadline_reports_timeout(emulator):
+    target = _create(emulator, "slow")
+
+    [result] = wait_for_ready([target], timeout=0.1, **FAST)
+
+    assert result.status == "timeout"
+    assert "IN_PROGRESS" in result.detail
+
+
+def test_missing_endpoint_fails_without_retrying(emulator):
+    target = ReadinessTarget(emulator.url, "does-not-exist", "admin-token")
+
+    [result] = wait_for_ready([target], timeout=5, **FAST)
+
+    assert (result.status, result.polls) == ("failed", 1)
+    assert "HTTP 404" in result.detail
+
+
+def test_truncated_response_keeps_polling(mocker):
+    ready = {"state": {"ready": "READY", "config_update": "NOT_UPDATING"}}
+    mocker.patch.object(
+        _Client,
+        "get_json",
+        side_effect=[asyncio.IncompleteReadError(b"{", 10), (200, ready)],
+    )
+
+    [result] = wait_for_ready([ReadinessTarget("http://h", "e", "t")], timeout=5, **FAST)
+
+    assert (result.status, result.polls) == ("ready", 2)
+
+
+def test_provision_updates_gateway_before_config(emulator):
+    credentials = {"a": (emulator.url, "admin-token")}
+    spec = provision.ProvisionSpec(
+        workspaces=[
+            provision.WorkspaceSpec(
+                profile="a", endpoints=[provision.EndpointSpec(name="prov", model="m1")]
+            )
+        ]
+    )
+    [create] = provision.plan(spec, credentials).changes
+    assert provision.apply([create], credentials) == {}
+    [ready] = wait_for_ready([ReadinessTarget(*create.deploys, "admin-token")], **FAST)
+    assert ready.ready
+
+    spec.workspaces[0].endpoints[0].model = "m2"
+    spec.workspaces[0].endpoints[0].rate_limits[0].calls += 1
+    changes = provision.plan(spec, credentials).changes
+
+    assert [c.url.rsplit("/", 1)[1] for c in changes] == ["ai-gateway", "config"]
+    assert provision.apply(changes, credentials) == {}
+    [ready] = wait_for_ready([ReadinessTarget(*changes[1].deploys, "admin-token")], **FAST)
+    assert ready.ready
+    assert provision.plan(spec, credentials).changes == []